@@ -7,12 +7,15 @@ import talib
 import numpy as np
 import random
 from indicators.base_indicator import BaseIndicator
+from indicators.incremental import IncrementalADX
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
 class ADX(BaseIndicator):
+    inputs = ('high_prices', 'low_prices', 'closing_prices')
+
     def __init__(self, timeperiod=14, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -28,9 +31,9 @@ class ADX(BaseIndicator):
         high_prices = data.get('high_prices')
         low_prices = data.get('low_prices')
         closing_prices = data.get('closing_prices')
-        np_high_prices = np.array(high_prices)
-        np_low_prices = np.array(low_prices)
-        np_close_prices = np.array(closing_prices)
+        np_high_prices = np.asarray(high_prices, dtype=np.float64)
+        np_low_prices = np.asarray(low_prices, dtype=np.float64)
+        np_close_prices = np.asarray(closing_prices, dtype=np.float64)
 
         start_time = time.perf_counter()
         self.logger.info("Calculating Average Directional Index (ADX)...")
@@ -50,6 +53,12 @@ class ADX(BaseIndicator):
         self.logger.info("Average Directional Index (ADX) calculation finished in {:0.4f} seconds".format(elapsed_time))
         return adx
 
+    def incremental(self):
+        return IncrementalADX(self.timeperiod)
+
+    def signal_inputs(self, calculations):
+        return {"adx": calculations}
+
     def decide_signal(self, **data):
         adx = data.get("adx", "")
         if adx is None or len(adx) < 2:
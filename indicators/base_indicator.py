@@ -2,11 +2,53 @@
 
 
 class BaseIndicator:
+    # Market data keys (see MarketSnapshot.as_dict) and names of other indicators whose results
+    # this indicator reads. IndicatorGraph runs an indicator after the indicators it reads
+    inputs = ()
+
     def __init__(self, args):
         self.args = args
 
+    @property
+    def name(self):
+        return type(self).__name__
+
+    @property
+    def outputs(self):
+        """ Returns: Keys other indicators find this indicator's results under """
+        return (self.name,)
+
+    @property
+    def min_bars(self):
+        """ Returns: Bars the indicator needs for its first value, or None if it doesn't say """
+        return None
+
     def calculate(self, **data):
+        """ Input: Market data as keyword arguments (see MarketSnapshot.as_dict).
+                   Price and volume series are float64 views, use np.asarray instead of np.array to avoid copies.
+        """
         raise NotImplementedError()
 
+    def calculate_batch(self, rows, **data):
+        """ Input: Market data of each symbol as calculate gets it, and the same data stacked (see
+                   IndicatorGraph.run_batch): series of shape (symbols, n) with the timestamps (n) they share,
+                   latest values and current prices of shape (symbols), intermediates on the stacked series.
+            Returns: List of what calculate returns for each of the rows, in order.
+                     Indicators with a vectorized kernel override this to run it once over the whole matrix
+        """
+        return [self.calculate(**row) for row in rows]
+
     def decide_signal(self, **data):
-        raise NotImplementedError()
\ No newline at end of file
+        raise NotImplementedError()
+
+    def incremental(self):
+        """ Returns: An IncrementalIndicator (see indicators/incremental.py) with the same parameters,
+                     updated one bar at a time, or None if this indicator has none
+        """
+        return None
+
+    def signal_inputs(self, calculations):
+        """ Returns: Extra keyword arguments decide_signal needs for this indicator's own calculations """
+        if isinstance(calculations, dict):
+            return calculations
+        return {}
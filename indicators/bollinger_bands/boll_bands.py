@@ -6,12 +6,30 @@ import time
 import numpy as np
 import random
 from indicators.base_indicator import BaseIndicator
+from indicators.incremental import IncrementalBollingerBands
+from indicators.intermediates import Intermediates
+from indicators.kernels import rolling_mean_var
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
+def bollinger_kernel(closing_prices, window_size=20, num_std=2, intermediates=None):
+    """ Input: Closing prices, (n) or (symbols, n)
+        Returns: {"upper_band", "middle_band", "lower_band"} arrays of the same shape: mean plus/minus num_std
+                 population standard deviations of the trailing window_size closes, NaN for the first window_size - 1
+    """
+    if intermediates is not None:
+        mean, variance = intermediates.rolling_mean_var("closing_prices", window_size)
+    else:
+        mean, variance = rolling_mean_var(closing_prices, window_size)
+    std = np.sqrt(variance)
+    return {"upper_band": mean + num_std * std, "middle_band": mean, "lower_band": mean - num_std * std}
+
+
 class BollingerBands(BaseIndicator):
+    inputs = ('closing_prices', 'closing_price')
+
     def __init__(self,  window_size=20, num_std=2, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -26,24 +44,21 @@ class BollingerBands(BaseIndicator):
 
     def calculate(self, **data):
         closing_prices = data.get('closing_prices')
-        np_closing_prices = np.array(closing_prices)
+        np_closing_prices = np.asarray(closing_prices, dtype=np.float64)
         if len(np_closing_prices) < self.window_size:
             raise ValueError("Not enough data points to calculate Bollinger Bands")
         start_time = time.perf_counter()
         self.logger.info("Calculating Bollinger Bands...")
-        self.logger.info("Closing prices: {}".format(",".join(map(str, np_closing_prices))))
+        self.logger.info("Closing prices: {} bars".format(len(np_closing_prices)))
         self.logger.info("Window size: {}".format(self.window_size))
         self.logger.info("Number of STD: {}".format(self.num_std))
-        result = {}
-        rolling_mean = np.mean(np_closing_prices[-self.window_size:])
-        self.logger.info("Rolling mean: {}".format(rolling_mean))
-        rolling_std = np.std(np_closing_prices[-self.window_size:])
-        self.logger.info("Rolling STD: {}".format(rolling_std))
-        result["upper_band"] = rolling_mean + self.num_std * rolling_std
+        bands = bollinger_kernel(np_closing_prices, self.window_size, self.num_std,
+                                 intermediates=Intermediates.from_data(data))
+        # Latest values for decide_signal, full series under the plural keys
+        result = {key: bands[key][-1] for key in ("upper_band", "middle_band", "lower_band")}
+        result.update({key + "s": value for key, value in bands.items()})
         self.logger.info("Upper Band: {}".format(result["upper_band"]))
-        result["middle_band"] = rolling_mean
         self.logger.info("Middle Band: {}".format(result["middle_band"]))
-        result["lower_band"] = rolling_mean - self.num_std * rolling_std
         self.logger.info("Lower Band: {}".format(result["lower_band"]))
 
         end_time = time.perf_counter()
@@ -52,6 +67,32 @@ class BollingerBands(BaseIndicator):
 
         return result
 
+    def calculate_batch(self, rows, **data):
+        closing_prices = np.asarray(data.get('closing_prices'), dtype=np.float64)
+        if closing_prices.shape[-1] < self.window_size:
+            raise ValueError("Not enough data points to calculate Bollinger Bands")
+        start_time = time.perf_counter()
+        self.logger.info("Calculating Bollinger Bands of {} symbols, {} bars each...".format(
+            len(rows), closing_prices.shape[-1]))
+        bands = bollinger_kernel(closing_prices, self.window_size, self.num_std,
+                                 intermediates=Intermediates.from_data(data))
+        latest = {key: bands[key][:, -1] for key in ("upper_band", "middle_band", "lower_band")}
+        results = []
+        for i in range(len(rows)):
+            result = {key: values[i] for key, values in latest.items()}
+            result.update({key + "s": value[i] for key, value in bands.items()})
+            results.append(result)
+
+        end_time = time.perf_counter()
+        elapsed_time = end_time - start_time
+        self.logger.info("Bollinger Bands calculation of {} symbols finished in {:0.4f} seconds".format(
+            len(rows), elapsed_time))
+
+        return results
+
+    def incremental(self):
+        return IncrementalBollingerBands(self.window_size, self.num_std)
+
     def decide_signal(self, **data):
         closing_price = data.get('closing_price')
         upper = data.get('upper_band')
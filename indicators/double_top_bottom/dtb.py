@@ -6,109 +6,79 @@ import time
 import numpy as np
 import random
 from indicators.base_indicator import BaseIndicator
+from indicators.intermediates import Intermediates
+from indicators.pivots import HIGH, LOW, find_double_extremes, latest_confirmed
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
 class DoubleTopBottom(BaseIndicator):
+    inputs = ('closing_prices',)
+
     def __init__(self, is_test=True,
-                 timestamp=get_timestamp(precision="day", separator="-")):
+                 timestamp=get_timestamp(precision="day", separator="-"),
+                 window_size=Constants.DEFAULT_PIVOT_WINDOW,
+                 tolerance=Constants.DOUBLE_TOP_BOTTOM_TOLERANCE,
+                 max_age=Constants.DOUBLE_TOP_BOTTOM_MAX_AGE):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
         self.logger = setup_logger(name=log_name,
                                    is_test=is_test,
                                    timestamp=timestamp,
                                    )
+        self.window_size = window_size
+        self.tolerance = tolerance
+        self.max_age = max_age
         self.logger.debug("Timestamp: {}".format(timestamp))
         self.logger.debug("Is test: {}".format(is_test))
 
     def calculate(self, **data):
-        closing_prices = data.get('closing_prices')
-        double_top = self.check_double_top(closing_prices)
-        double_bottom = self.check_double_bottom(closing_prices)
-        return {'double_top': double_top, 'double_bottom': double_bottom}
+        """ Returns: Bar index of the second top (bottom) of the latest double top (bottom) that formed within the
+                     last max_age bars and whose neckline a later close has broken, or -1 if there is none,
+                     and the bar indices of the second top (bottom) of every occurrence in the history
+        """
+        closing_prices = np.asarray(data.get('closing_prices'), dtype=np.float64)
+        swings = Intermediates.from_data(data).swings(self.window_size)
+        double_tops = self.check_double_top(swings)
+        double_bottoms = self.check_double_bottom(swings)
+        return {'double_top': self.confirmed(closing_prices, double_tops, HIGH),
+                'double_bottom': self.confirmed(closing_prices, double_bottoms, LOW),
+                'double_tops': [pattern.second.index for pattern in double_tops],
+                'double_bottoms': [pattern.second.index for pattern in double_bottoms]}
+
+    def confirmed(self, closing_prices, patterns, kind):
+        """ Returns: Bar index of the second top (bottom) of the latest recent pattern with a broken neckline, or -1 """
+        pattern = latest_confirmed(closing_prices, patterns, kind, self.max_age)
+        return pattern.second.index if pattern is not None else -1
 
-    def check_double_top(self, closing_prices):
+    def check_double_top(self, swings):
         start_time = time.perf_counter()
         self.logger.info("Calculating Double Top...")
-        self.logger.info("Finding highest close in the first half of the array...")
-        first_peak = np.argmax(closing_prices[:len(closing_prices)//2])
-        self.logger.info(f"First peak index: {first_peak}")
-        self.logger.info(f"Second half of closing_prices: {closing_prices[first_peak:len(closing_prices)]}")
-        if first_peak == len(closing_prices)//2 - 1:
-            self.logger.info("First peak is the last element in the first half of closing_prices. No valid double top pattern.")
-            return -1
-        self.logger.info("Finding highest closing price in the second half of the array...")
-        second_peak = np.argmax(closing_prices[first_peak:]) + first_peak
-        self.logger.info(f"Second peak index: {second_peak}")
-        self.logger.info(f"Remaining closing_prices after second peak: {closing_prices[second_peak:]}")
-        # Check if there is a valley between the two peaks
-        self.logger.info("Checking if there is a valley between the two peaks...")
-        if first_peak >= second_peak:
-            self.logger.info("First peak is not before the second peak. No valid double top pattern.")
-            return -1
-        if second_peak < len(closing_prices) - 1:
-            if (np.min(closing_prices[first_peak:second_peak]) < np.min(closing_prices[:first_peak]) and
-                np.min(closing_prices[first_peak:second_peak]) < np.min(closing_prices[second_peak:])):
-                double_top = second_peak
-            else:
-                double_top = -1
-        else:
-            self.logger.info("Second peak is the last element in closing_prices. No valid double top pattern.")
-            double_top = -1
-        
-        self.logger.info("Double Top: {}".format(double_top))
-        end_time = time.perf_counter()
-        elapsed_time = end_time - start_time
+        double_tops = find_double_extremes(swings, self.tolerance, HIGH)
+        self.logger.info("Double Tops: {}".format([pattern.second.index for pattern in double_tops]))
+        elapsed_time = time.perf_counter() - start_time
         self.logger.info("Double Top calculation finished in {:0.4f} seconds".format(elapsed_time))
+        return double_tops
 
-        return double_top
-    
-    def check_double_bottom(self, closing_prices):
+    def check_double_bottom(self, swings):
         start_time = time.perf_counter()
         self.logger.info("Calculating Double Bottom...")
-        self.logger.info("Finding the lowest close in the first half of the array...")
-        first_valley = np.argmin(closing_prices[:len(closing_prices)//2])
-        self.logger.info(f"First valley index: {first_valley}")
-        self.logger.info(f"Second half of closing_prices: {closing_prices[first_valley:len(closing_prices)]}")
-        if first_valley == len(closing_prices)//2 - 1:
-            self.logger.info("First valley is the last element in the first half of closing_prices. No valid double bottom pattern.")
-            return -1
-        self.logger.info("Finding the lowest closing_prices in the second half of the array...")
-        second_valley = np.argmin(closing_prices[first_valley:]) + first_valley
-        self.logger.info(f"Second valley index: {second_valley}")
-        self.logger.info(f"Remaining closing_prices after second valley: {closing_prices[second_valley:]}")
-        # Check if there is a peak between the two valleys
-        self.logger.info("Checking if there is a peak between the two valleys...")
-        if first_valley >= second_valley:
-            self.logger.info("First valley is not before the second valley. No valid double bottom pattern.")
-            return -1
-        if second_valley < len(closing_prices) - 1:
-            if (np.max(closing_prices[first_valley:second_valley]) > np.max(closing_prices[:first_valley]) and
-                np.max(closing_prices[first_valley:second_valley]) > np.max(closing_prices[second_valley:])):
-                double_bottom = second_valley
-            else:
-                double_bottom = -1
-        else:
-            self.logger.info("Second valley is the last element in closing_prices. No valid double bottom pattern.")
-            double_bottom = -1
-        
-        self.logger.info("Double Bottom: {}".format(double_bottom))
-        end_time = time.perf_counter()
-        elapsed_time = end_time - start_time
+        double_bottoms = find_double_extremes(swings, self.tolerance, LOW)
+        self.logger.info("Double Bottoms: {}".format([pattern.second.index for pattern in double_bottoms]))
+        elapsed_time = time.perf_counter() - start_time
         self.logger.info("Double Bottom calculation finished in {:0.4f} seconds".format(elapsed_time))
-        
-        return double_bottom
+        return double_bottoms
 
     def decide_signal(self, **data):
         double_top = data.get('double_top')
         double_bottom = data.get('double_bottom')
-        if not double_top or not double_bottom:
+        if double_top is None or double_bottom is None:
             self.logger.error("Missing required data. Cannot decide signal.")
             return Constants.UNKNOWN_SIGNAL
         
         self.logger.info("Deciding Double Top/Bottom buy/sell/hold signal...")
-        if double_bottom != -1:
+        # Both are -1 unless the pattern is recent and confirmed. If both are, the later one wins
+        if double_bottom != -1 and double_bottom > double_top:
             signal = Constants.BUY_SIGNAL
         elif double_top != -1:
             signal = Constants.SELL_SIGNAL
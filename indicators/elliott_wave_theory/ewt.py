@@ -4,15 +4,17 @@ import os
 import argparse
 import time
 import numpy as np
-import talib
 import random
 from indicators.base_indicator import BaseIndicator
+from indicators.intermediates import Intermediates
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
 class EWT(BaseIndicator):
+    inputs = ('closing_prices', 'RSI')
+
     def __init__(self, timeperiod1=20, timeperiod2=50, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -51,8 +53,9 @@ class EWT(BaseIndicator):
             ew_pattern = 0
         self.logger.info("Elliott wave patterns: {}".format(ew_pattern))
         
-        sma1 = talib.SMA(np.array(closing_prices), timeperiod=self.timeperiod1)
-        sma2 = talib.SMA(np.array(closing_prices), timeperiod=self.timeperiod2)
+        intermediates = Intermediates.from_data(data)
+        sma1 = intermediates.sma(self.timeperiod1)
+        sma2 = intermediates.sma(self.timeperiod2)
         
         result = {
             "ew_pattern": ew_pattern,
@@ -72,7 +75,7 @@ class EWT(BaseIndicator):
         ew_pattern = data.get('ew_pattern', '')
         sma1 = data.get('sma1', '')
         sma2 = data.get('sma2', '')
-        if (not closing_prices or rsi is None or len(rsi) < 2 or not ew_pattern
+        if (len(closing_prices) == 0 or rsi is None or len(rsi) < 2 or not ew_pattern
             or sma1 is None or sma2 is None):
             self.logger.error("Missing required data. Cannot decide signal.")
             return Constants.UNKNOWN_SIGNAL
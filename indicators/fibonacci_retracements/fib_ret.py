@@ -4,6 +4,7 @@ import os
 import argparse
 import time
 import random
+import numpy as np
 from indicators.base_indicator import BaseIndicator
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
@@ -14,6 +15,8 @@ DEFAULT_FIB_LEVELS = [0, 0.236, 0.382, 0.5, 0.618, 0.786, 1]
 
 
 class FibonacciRetracements(BaseIndicator):
+    inputs = ('high_prices', 'low_prices', 'closing_prices')
+
     def __init__(self, fib_levels=DEFAULT_FIB_LEVELS, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -26,19 +29,18 @@ class FibonacciRetracements(BaseIndicator):
         self.fib_levels = [float(level) for level in fib_levels] if fib_levels else DEFAULT_FIB_LEVELS
     
     def calculate(self, **data):
-        high_prices = data.get("high_prices", [])
-        low_prices = data.get("low_prices", [])
-        prices = high_prices + low_prices
-        if not prices:
+        high_prices = np.asarray(data.get("high_prices", []), dtype=np.float64)
+        low_prices = np.asarray(data.get("low_prices", []), dtype=np.float64)
+        if len(high_prices) == 0 or len(low_prices) == 0:
             self.logger.error("No prices. No Fibonacci retracement")
             return []
         start_time = time.perf_counter()
         self.logger.info("Calculating Fibonacci retracement levels...")
         self.logger.info("Fibonacci levels: {}".format(", ".join(map(str, self.fib_levels))))
 
-        max_price = max(prices)
+        max_price = high_prices.max()
         self.logger.info("Max Price: {}".format(max_price))
-        min_price = min(prices)
+        min_price = low_prices.min()
         self.logger.info("Min Price: {}".format(min_price))
         diff = max_price - min_price
         self.logger.info("Diff: {}".format(diff))
@@ -55,7 +57,7 @@ class FibonacciRetracements(BaseIndicator):
         fib_levels = data.get("FibonacciRetracements", {}).get("calculations", [])
         closing_prices = data.get("closing_prices", [])
         
-        if not fib_levels or not closing_prices:
+        if not fib_levels or len(closing_prices) == 0:
             self.logger.error("Missing required data. Cannot decide signal.")
             return None
         
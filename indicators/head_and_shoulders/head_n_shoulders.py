@@ -4,78 +4,87 @@ import os
 import argparse
 import time
 import random
-import pandas as pd
+import numpy as np
 from indicators.base_indicator import BaseIndicator
+from indicators.intermediates import Intermediates
+from indicators.pivots import HIGH, LOW, find_head_and_shoulders_patterns, latest_confirmed
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
 class HeadAndShoulders(BaseIndicator):
+    inputs = ('closing_prices',)
+
     def __init__(self, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-"),
-                 window_size=5):
+                 window_size=Constants.DEFAULT_PIVOT_WINDOW,
+                 tolerance=Constants.HEAD_SHOULDERS_TOLERANCE,
+                 max_age=Constants.HEAD_SHOULDERS_MAX_AGE):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
         self.logger = setup_logger(name=log_name,
                                    is_test=is_test,
                                    timestamp=timestamp,
                                    )
         self.window_size = window_size
+        self.tolerance = tolerance
+        self.max_age = max_age
         self.logger.debug("Timestamp: {}".format(timestamp))
         self.logger.debug("Is test: {}".format(is_test))
 
-    def find_head_and_shoulders(self, data):
-        maxima = data[data == data.rolling(window=self.window_size, center=True).max()]
-        minima = data[data == data.rolling(window=self.window_size, center=True).min()]
-        maxima = maxima.dropna()
-        minima = minima.dropna()
-        pattern = []
-        for i in range(self.window_size, len(maxima) - self.window_size):
-            window = maxima.iloc[i - self.window_size: i + self.window_size]
-            if window.iloc[self.window_size] == window.max():
-                pattern.append(window.index[self.window_size])
-        return pattern
-
-    def find_inverted_head_and_shoulders(self, data):
-        maxima = data[data == data.rolling(window=self.window_size, center=True).max()]
-        minima = data[data == data.rolling(window=self.window_size, center=True).min()]
-        maxima = maxima.dropna()
-        minima = minima.dropna()
-        pattern = []
-        for i in range(self.window_size, len(minima) - self.window_size):
-            window = minima.iloc[i - self.window_size: i + self.window_size]
-            if window.iloc[self.window_size] == window.min():
-                pattern.append(window.index[self.window_size])
-        return pattern
+    def find_head_and_shoulders(self, swings):
+        """ Returns: [HeadShoulders] of every head and shoulders top in the zigzag `swings` """
+        return find_head_and_shoulders_patterns(swings, self.tolerance, HIGH)
+
+    def find_inverted_head_and_shoulders(self, swings):
+        """ Returns: [HeadShoulders] of every inverted head and shoulders in the zigzag `swings` """
+        return find_head_and_shoulders_patterns(swings, self.tolerance, LOW)
 
     def calculate(self, **data):
+        """ Returns: Bar index of the right shoulder of the latest head and shoulders top (inverted head and shoulders)
+                     that formed within the last max_age bars and whose neckline a later close has broken, or -1 if
+                     there is none, and the bar indices of the heads of every occurrence in the history
+        """
         start_time = time.perf_counter()
-        closing_prices = data.get("closing_prices", "")
         self.logger.info("Determining Head and Shoulders...")
-        cdl_head_shoulders = self.find_head_and_shoulders(pd.Series(closing_prices))
-        cdl_head_shoulders_inverted = self.find_inverted_head_and_shoulders(pd.Series(closing_prices))
-        self.logger.info(f"cdl_head_shoulders {cdl_head_shoulders}")
-        self.logger.info(f"cdl_head_shoulders_inverted {cdl_head_shoulders_inverted}")
+        closing_prices = np.asarray(data.get('closing_prices'), dtype=np.float64)
+        swings = Intermediates.from_data(data).swings(self.window_size)
+        cdl_head_shoulders = self.find_head_and_shoulders(swings)
+        cdl_head_shoulders_inverted = self.find_inverted_head_and_shoulders(swings)
+        self.logger.info("cdl_head_shoulders {}".format([pattern.head.index for pattern in cdl_head_shoulders]))
+        self.logger.info("cdl_head_shoulders_inverted {}".format(
+            [pattern.head.index for pattern in cdl_head_shoulders_inverted]))
         end_time = time.perf_counter()
         elapsed_time = end_time - start_time
         self.logger.info("Head and Shoulders calculation finished in {:0.4f} seconds".format(elapsed_time))
 
-        return cdl_head_shoulders, cdl_head_shoulders_inverted
+        return {'head_shoulders': self.confirmed(closing_prices, cdl_head_shoulders, HIGH),
+                'inverted_head_shoulders': self.confirmed(closing_prices, cdl_head_shoulders_inverted, LOW),
+                'heads': [pattern.head.index for pattern in cdl_head_shoulders],
+                'inverted_heads': [pattern.head.index for pattern in cdl_head_shoulders_inverted]}
+
+    def confirmed(self, closing_prices, patterns, kind):
+        """ Returns: Bar index of the right shoulder of the latest recent pattern with a broken neckline, or -1 """
+        pattern = latest_confirmed(closing_prices, patterns, kind, self.max_age)
+        return pattern.right.index if pattern is not None else -1
 
     def decide_signal(self, **data):
-        cdl_head_shoulders, cdl_head_shoulders_inverted = data.get("HeadAndShoulders", {}).get("calculations", [])
-        if not cdl_head_shoulders or not cdl_head_shoulders_inverted:
+        head_shoulders = data.get('head_shoulders')
+        inverted_head_shoulders = data.get('inverted_head_shoulders')
+        if head_shoulders is None or inverted_head_shoulders is None:
             self.logger.error("Missing required data. Cannot decide signal.")
             return Constants.UNKNOWN_SIGNAL
 
         self.logger.info("Deciding Head and Shoulders buy/sell/hold signal...")
-        if len(cdl_head_shoulders) > 0 and cdl_head_shoulders[-1] == max(cdl_head_shoulders):
+        # A top reverses an uptrend, an inverted one a downtrend. Both are -1 unless the pattern is recent and
+        # confirmed. If both are, the later one wins
+        if inverted_head_shoulders != -1 and inverted_head_shoulders > head_shoulders:
             signal = Constants.BUY_SIGNAL
-        elif len(cdl_head_shoulders_inverted) > 0 and cdl_head_shoulders_inverted[-1] == min(cdl_head_shoulders_inverted):
+        elif head_shoulders != -1:
             signal = Constants.SELL_SIGNAL
         else:
             signal = Constants.HOLD_SIGNAL
-        
+
         self.logger.info("Signal detected: {}".format(signal))
         return signal
 
@@ -94,8 +103,10 @@ if __name__ == "__main__":
     parser.add_argument('-L', '--low_prices', type=str,
                         help='Comma-separated list of lowest prices',
                         required=False)
-    parser.add_argument('-w', '--window_size', type=int, default=5,
+    parser.add_argument('-w', '--window_size', type=int, default=Constants.DEFAULT_PIVOT_WINDOW,
                         help='Window size')
+    parser.add_argument('-t', '--tolerance', type=float, default=Constants.HEAD_SHOULDERS_TOLERANCE,
+                        help='Max shoulder difference as a fraction of the head height')
     parser.add_argument('--use_mock', action='store_true', default=False,
                         help='Add this argument to run mock example',
                         required=False)
@@ -113,10 +124,10 @@ if __name__ == "__main__":
         low_prices = [float(price) for price in args.low_prices.split(',')]
         closing_prices = [float(price) for price in args.closing_prices.split(',')]
 
-    head_n_shoulders_api = HeadAndShoulders(window_size=args.window_size)
+    head_n_shoulders_api = HeadAndShoulders(window_size=args.window_size, tolerance=args.tolerance)
     calculations = head_n_shoulders_api.calculate(opening_prices=opening_prices,
                                                   high_prices=high_prices,
                                                   low_prices=low_prices,
                                                   closing_prices=closing_prices)
-    signal = head_n_shoulders_api.decide_signal(HeadAndShoulders={"calculations": calculations})
+    signal = head_n_shoulders_api.decide_signal(**calculations)
 
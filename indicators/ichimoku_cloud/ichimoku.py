@@ -7,12 +7,15 @@ import ta
 import random
 import pandas as pd
 from indicators.base_indicator import BaseIndicator
+from indicators.intermediates import Intermediates
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
 class IchimokuCloud(BaseIndicator):
+    inputs = ('high_prices', 'low_prices', 'current_price')
+
     def __init__(self, tenkan_sen_n1=9, kijun_sen_n2=26,
                  senkou_span_b_n2=52, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
@@ -29,16 +32,15 @@ class IchimokuCloud(BaseIndicator):
 
     def calculate(self, **data):
         start_time = time.perf_counter()
-        high_prices = pd.Series(data.get("high_prices", []))
-        low_prices = pd.Series(data.get("low_prices", []))
+        intermediates = Intermediates.from_data(data)
         self.logger.info("Calculating Ichimoku Cloud Values...")
-        tenkan_sen = (high_prices.rolling(window=self.tenkan_sen_n1).max() + 
-                    low_prices.rolling(window=self.tenkan_sen_n1).min()) / 2
-        kijun_sen = (high_prices.rolling(window=self.kijun_sen_n2).max() + 
-                    low_prices.rolling(window=self.kijun_sen_n2).min()) / 2
+        tenkan_sen = pd.Series((intermediates.rolling_max("high_prices", self.tenkan_sen_n1) +
+                                intermediates.rolling_min("low_prices", self.tenkan_sen_n1)) / 2)
+        kijun_sen = pd.Series((intermediates.rolling_max("high_prices", self.kijun_sen_n2) +
+                               intermediates.rolling_min("low_prices", self.kijun_sen_n2)) / 2)
         senkou_span_a = (tenkan_sen + kijun_sen) / 2
-        senkou_span_b = (high_prices.rolling(window=self.senkou_span_b_n2).max() + 
-                        low_prices.rolling(window=self.senkou_span_b_n2).min()) / 2
+        senkou_span_b = pd.Series((intermediates.rolling_max("high_prices", self.senkou_span_b_n2) +
+                                   intermediates.rolling_min("low_prices", self.senkou_span_b_n2)) / 2)
         end_time = time.perf_counter()
         elapsed_time = end_time - start_time
         self.logger.info(f"tenkan_sen: {tenkan_sen}")
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3.5
+
+import math
+import time
+import argparse
+from collections import deque
+import numpy as np
+from scripts.constants import Constants
+from scripts.resampler import bucket_open_times
+
+
+# Row of each field in the (5, n) OHLCV arrays of MarketSnapshot
+FIELDS = {'open': 0, 'high': 1, 'low': 2, 'close': 3, 'volume': 4}
+
+
+def _is_zero(value):
+    # TA-Lib's TA_IS_ZERO
+    return -1e-8 < value < 1e-8
+
+
+def _true_range(high, low, prev_close):
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class IncrementalIndicator:
+    """ Indicator updated one closed bar at a time with constant-size state, so the cost of a bar does not
+        depend on the length of the history. `update` takes the fields listed in `fields` and returns the
+        new value, or None while warming up. Subclasses implement `_update`. Values match the batch calculations (TA-Lib or the indicator's
+        `calculate`) at the same bar up to floating point rounding.
+    """
+    fields = ('close',)
+
+    def __init__(self):
+        self._value = None
+        self._started = False
+
+    def value(self):
+        return self._value
+
+    def update(self, *args):
+        """ Input: The `fields` of one closed bar. Bars before the first one without NaN fields are skipped, like
+                   the leading NaNs TA-Lib skips (e.g. the bars of a stacked array before a symbol's first)
+            Returns: Value after the bar
+        """
+        if not self._started:
+            if any(arg != arg for arg in args):
+                return self._value
+            self._started = True
+        return self._update(*args)
+
+    def _update(self, *args):
+        raise NotImplementedError
+
+    def update_bar(self, bar):
+        """ Input: One OHLCV column (open, high, low, close, volume) """
+        return self.update(*(bar[FIELDS[field]] for field in self.fields))
+
+    def extend(self, ohlcv):
+        """ Input: float64 (5, n) OHLCV array of consecutive closed bars
+            Returns: Value after the last bar
+        """
+        rows = [np.asarray(ohlcv[FIELDS[field]], dtype=np.float64).tolist() for field in self.fields]
+        for args in zip(*rows):
+            self.update(*args)
+        return self._value
+
+
+class IncrementalSMA(IncrementalIndicator):
+    """ talib.SMA """
+    def __init__(self, period):
+        super().__init__()
+        self.period = period
+        self._window = deque()
+        self._total = 0.0
+
+    def _update(self, close):
+        self._window.append(close)
+        self._total += close
+        if len(self._window) > self.period:
+            self._total -= self._window.popleft()
+        if len(self._window) == self.period:
+            self._value = self._total / self.period
+        return self._value
+
+
+class IncrementalEMA(IncrementalIndicator):
+    """ talib.EMA: seeded with the SMA of the first `period` values """
+    def __init__(self, period):
+        super().__init__()
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self._seed = IncrementalSMA(period)
+
+    def _update(self, close):
+        if self._value is None:
+            self._value = self._seed.update(close)
+        else:
+            self._value = (close - self._value) * self.k + self._value
+        return self._value
+
+
+class IncrementalRSI(IncrementalIndicator):
+    """ RSI of indicators/relative_strength_index/rsi.py, Wilder smoothed.
+        The batch version seeds with the first period + 1 price changes, so its first period + 1 values
+        already depend on later bars. Values are therefore produced from bar period + 1 on, matching the
+        batch values from there.
+    """
+    def __init__(self, period=14):
+        super().__init__()
+        self.period = period
+        self._seed = []
+        self._prev_close = None
+        self._up = self._down = None
+
+    def _step(self, delta):
+        up_value, down_value = (delta, 0.0) if delta > 0 else (0.0, -delta)
+        self._up = (self._up * (self.period - 1) + up_value) / self.period
+        self._down = (self._down * (self.period - 1) + down_value) / self.period
+        if self._down == 0:
+            self._value = float('nan') if self._up == 0 else 100.0
+        else:
+            self._value = 100.0 - 100.0 / (1.0 + self._up / self._down)
+
+    def _update(self, close):
+        prev_close, self._prev_close = self._prev_close, close
+        if prev_close is None:
+            return self._value
+        delta = close - prev_close
+        if self._up is None:
+            self._seed.append(delta)
+            if len(self._seed) == self.period + 1:
+                self._up = sum(d for d in self._seed if d >= 0) / self.period
+                self._down = -sum(d for d in self._seed if d < 0) / self.period
+                # Replays the batch loop up to this bar, which applies the last two seed changes once more
+                self._step(self._seed[-2])
+                self._step(self._seed[-1])
+                self._seed = None
+            return self._value
+        self._step(delta)
+        return self._value
+
+
+class IncrementalMACD(IncrementalIndicator):
+    """ talib.MACD. As in TA-Lib, the fast EMA is seeded at the first bar of the slow EMA, with the SMA of the
+        `fast_period` closes before it. Returns: (macd, signal, histogram)
+    """
+    def __init__(self, fast_period=12, slow_period=26, signal_period=9):
+        super().__init__()
+        if slow_period < fast_period:
+            fast_period, slow_period = slow_period, fast_period
+        self.fast_period = fast_period
+        self.slow_period = slow_period
+        self.signal_period = signal_period
+        self._recent = deque(maxlen=fast_period)
+        self._fast = None
+        self._slow = IncrementalEMA(slow_period)
+        self._signal = IncrementalEMA(signal_period)
+
+    def _update(self, close):
+        slow = self._slow.update(close)
+        if self._fast is None:
+            self._recent.append(close)
+            if slow is None:
+                return self._value
+            self._fast = IncrementalEMA(self.fast_period)
+            for recent_close in self._recent:
+                fast = self._fast.update(recent_close)
+            self._recent = None
+        else:
+            fast = self._fast.update(close)
+        macd = fast - slow
+        signal = self._signal.update(macd)
+        if signal is not None:
+            self._value = (macd, signal, macd - signal)
+        return self._value
+
+
+class IncrementalATR(IncrementalIndicator):
+    """ talib.ATR, Wilder smoothed true range """
+    fields = ('high', 'low', 'close')
+
+    def __init__(self, period=14):
+        super().__init__()
+        self.period = period
+        self._prev_close = None
+        self._seed = []
+
+    def _update(self, high, low, close):
+        prev_close, self._prev_close = self._prev_close, close
+        if prev_close is None:
+            return self._value
+        true_range = _true_range(high, low, prev_close)
+        if self.period == 1:
+            self._value = true_range
+        elif self._value is None:
+            self._seed.append(true_range)
+            if len(self._seed) == self.period:
+                self._value = sum(self._seed) / self.period
+                self._seed = None
+        else:
+            self._value = (self._value * (self.period - 1) + true_range) / self.period
+        return self._value
+
+
+class IncrementalADX(IncrementalIndicator):
+    """ talib.ADX: Wilder smoothed directional movement, first value at bar 2 * period - 1 """
+    fields = ('high', 'low', 'close')
+
+    def __init__(self, period=14):
+        super().__init__()
+        self.period = period
+        self._bars = 0
+        self._prev = None
+        self._plus_dm = self._minus_dm = self._tr = 0.0
+        self._sum_dx = 0.0
+
+    def _dx(self):
+        """ Returns: DX of the smoothed values, or None where TA-Lib skips the bar """
+        if _is_zero(self._tr):
+            return None
+        minus_di = 100.0 * (self._minus_dm / self._tr)
+        plus_di = 100.0 * (self._plus_dm / self._tr)
+        total = minus_di + plus_di
+        if _is_zero(total):
+            return None
+        return 100.0 * (abs(minus_di - plus_di) / total)
+
+    def _update(self, high, low, close):
+        if self._prev is None:
+            self._prev = (high, low, close)
+            return self._value
+        prev_high, prev_low, prev_close = self._prev
+        self._prev = (high, low, close)
+        self._bars += 1
+        diff_plus, diff_minus = high - prev_high, prev_low - low
+        true_range = _true_range(high, low, prev_close)
+        period = self.period
+
+        if self._bars >= period:
+            self._minus_dm -= self._minus_dm / period
+            self._plus_dm -= self._plus_dm / period
+        if diff_minus > 0 and diff_plus < diff_minus:
+            self._minus_dm += diff_minus
+        elif diff_plus > 0 and diff_plus > diff_minus:
+            self._plus_dm += diff_plus
+        if self._bars < period:
+            self._tr += true_range
+            return self._value
+        self._tr = self._tr - self._tr / period + true_range
+
+        dx = self._dx()
+        if self._bars < 2 * period - 1:
+            self._sum_dx += dx or 0.0
+        elif self._bars == 2 * period - 1:
+            self._value = (self._sum_dx + (dx or 0.0)) / period
+        elif dx is not None:
+            self._value = (self._value * (period - 1) + dx) / period
+        return self._value
+
+
+class IncrementalOBV(IncrementalIndicator):
+    """ On-balance volume of indicators/on_balance_volume/obv.py """
+    fields = ('close', 'volume')
+
+    def __init__(self):
+        super().__init__()
+        self._prev_close = None
+
+    def _update(self, close, volume):
+        prev_close, self._prev_close = self._prev_close, close
+        if prev_close is None:
+            self._value = 0.0
+        elif close > prev_close:
+            self._value += volume
+        elif close < prev_close:
+            self._value -= volume
+        return self._value
+
+
+class IncrementalVWAP(IncrementalIndicator):
+    """ VWAP of indicators/volume_weighted_average_price/vwap.py: running sums of close * volume and volume,
+        reset when a bar opens a new session, over the last `window` bars, from the `anchor` timestamp on or over
+        all bars seen. Sessions and anchors need the bars' open times, without them a session never resets and
+        the anchor is a bar index
+    """
+    fields = ('close', 'volume')
+
+    def __init__(self, mode=Constants.DEFAULT_VWAP_MODE, session=Constants.DEFAULT_VWAP_SESSION, window=None,
+                 anchor=None):
+        super().__init__()
+        self.mode = mode
+        self.session = session
+        self.window = window
+        self.anchor = anchor
+        self._total_value = 0.0
+        self._total_volume = 0.0
+        self._window = deque()
+        self._traded_bars = 0
+        self._session_start = None
+        self._bars = 0
+
+    def _update(self, close, volume, timestamp=None):
+        position = timestamp if timestamp is not None else self._bars
+        self._bars += 1
+        if self.mode == 'anchored' and position < self.anchor:
+            return self._value
+        if self.mode == 'session' and timestamp is not None:
+            session_start = int(bucket_open_times(timestamp, self.session))
+            if session_start != self._session_start:
+                self._session_start = session_start
+                self._total_value = 0.0
+                self._total_volume = 0.0
+        self._total_value += close * volume
+        self._total_volume += volume
+        if self.mode == 'rolling':
+            self._window.append((close * volume, volume))
+            self._traded_bars += volume != 0
+            if len(self._window) > self.window:
+                removed_value, removed_volume = self._window.popleft()
+                self._total_value -= removed_value
+                self._total_volume -= removed_volume
+                self._traded_bars -= removed_volume != 0
+            if not self._traded_bars:
+                # Subtracting leaves rounding residue, which would make a window without volume look traded
+                self._total_value = self._total_volume = 0.0
+            if len(self._window) < self.window:
+                return self._value
+        self._value = self._total_value / self._total_volume if self._total_volume else None
+        return self._value
+
+    def update_bar(self, bar, timestamp=None):
+        """ Input: One OHLCV column and its open time in ms """
+        return self.update(bar[FIELDS['close']], bar[FIELDS['volume']], timestamp)
+
+    def extend(self, ohlcv, timestamps=None):
+        """ Input: float64 (5, n) OHLCV array of consecutive closed bars and their open times in ms
+            Returns: Value after the last bar
+        """
+        closes = np.asarray(ohlcv[FIELDS['close']], dtype=np.float64).tolist()
+        volumes = np.asarray(ohlcv[FIELDS['volume']], dtype=np.float64).tolist()
+        timestamps = [None] * len(closes) if timestamps is None else np.asarray(timestamps, dtype=np.int64).tolist()
+        for close, volume, timestamp in zip(closes, volumes, timestamps):
+            self.update(close, volume, timestamp)
+        return self._value
+
+
+class IncrementalBollingerBands(IncrementalIndicator):
+    """ Bollinger Bands of indicators/bollinger_bands/boll_bands.py: mean and population standard deviation
+        of the last `window_size` closes. The variance is updated with Welford's method as bars enter and leave
+        the window, which avoids the cancellation of a running sum of squares.
+        Returns: {"upper_band", "middle_band", "lower_band"}
+    """
+    def __init__(self, window_size=20, num_std=2):
+        super().__init__()
+        self.window_size = window_size
+        self.num_std = num_std
+        self._window = deque()
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _update(self, close):
+        self._window.append(close)
+        if len(self._window) <= self.window_size:
+            delta = close - self._mean
+            self._mean += delta / len(self._window)
+            self._m2 += delta * (close - self._mean)
+        else:
+            removed = self._window.popleft()
+            prev_mean = self._mean
+            self._mean += (close - removed) / self.window_size
+            self._m2 += (close - removed) * (close - self._mean + removed - prev_mean)
+        if len(self._window) == self.window_size:
+            std = math.sqrt(max(self._m2, 0.0) / self.window_size)
+            self._value = {"upper_band": self._mean + self.num_std * std,
+                           "middle_band": self._mean,
+                           "lower_band": self._mean - self.num_std * std}
+        return self._value
+
+
+class IncrementalSupertrend(IncrementalIndicator):
+    """ Supertrend of indicators/supertrend_indicator/supertrend.py
+        Returns: {"atr", "upper_band", "lower_band", "in_uptrend"} of the latest bar
+    """
+    fields = ('high', 'low', 'close')
+
+    def __init__(self, lookback=10, multiplier=3):
+        super().__init__()
+        self.multiplier = multiplier
+        self._atr = IncrementalATR(lookback)
+        self._upper = self._lower = float('nan')
+        self._in_uptrend = True
+
+    def _update(self, high, low, close):
+        atr = self._atr.update(high, low, close)
+        atr = float('nan') if atr is None else atr
+        hl2 = (high + low) / 2
+        upper, lower = hl2 + self.multiplier * atr, hl2 - self.multiplier * atr
+        # Comparisons with the NaN bands of the warm-up bars are False, as in the batch version
+        if self._value is not None:
+            if close > self._upper:
+                self._in_uptrend = True
+            elif close < self._lower:
+                self._in_uptrend = False
+            else:
+                if self._in_uptrend and lower < self._lower:
+                    lower = self._lower
+                if not self._in_uptrend and upper > self._upper:
+                    upper = self._upper
+        self._upper, self._lower = upper, lower
+        self._value = {"atr": atr, "upper_band": upper, "lower_band": lower, "in_uptrend": self._in_uptrend}
+        return self._value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time incremental indicator updates for growing history lengths")
+    parser.add_argument('-n', '--bars', type=str, default="1000,10000,100000",
+                        help='Comma-separated history lengths',
+                        required=False)
+    parser.add_argument('-u', '--updates', type=int, default=1000,
+                        help='Bars to time after the history',
+                        required=False)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for bars in [int(n) for n in args.bars.split(',')]:
+        n = bars + args.updates
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        high = close + rng.random(n)
+        low = close - rng.random(n)
+        ohlcv = np.vstack([close, high, low, close, rng.random(n) * 100])
+        for indicator in (IncrementalRSI(), IncrementalMACD(), IncrementalADX(), IncrementalATR(), IncrementalOBV(),
+                          IncrementalVWAP(), IncrementalBollingerBands(), IncrementalSupertrend()):
+            indicator.extend(ohlcv[:, :bars])
+            start_time = time.perf_counter()
+            for i in range(bars, n):
+                indicator.update_bar(ohlcv[:, i])
+            elapsed_time = time.perf_counter() - start_time
+            print("{:>8} bars {:<26} {:8.2f} us/bar".format(bars, type(indicator).__name__,
+                                                            elapsed_time / args.updates * 1e6))
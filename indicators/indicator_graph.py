@@ -0,0 +1,216 @@
+#!/usr/bin/env python3.5
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from indicators.intermediates import Intermediates
+from scripts.market_snapshot import stack_snapshots
+from scripts.metrics import metrics
+
+
+class IndicatorGraph:
+    """ Runs indicators as a dependency graph.
+        An indicator depends on every other indicator whose output appears in its `inputs`
+        (e.g. EWT reads the RSI results). Indicators whose dependencies are done run concurrently
+        on a thread pool, and all indicators on the same timeframe share one Intermediates cache,
+        so series like ATR or rolling extrema are computed once per symbol per run.
+        run_batch runs many symbols at once on (symbols, n) arrays (see BaseIndicator.calculate_batch).
+    """
+    def __init__(self, indicators, logger, max_workers=None):
+        self.indicators = {}
+        for indicator in indicators:
+            if indicator.name in self.indicators:
+                logger.warning("Indicator '%s' is configured more than once. Using the last one.", indicator.name)
+            self.indicators[indicator.name] = indicator
+        indicators = list(self.indicators.values())
+        self.logger = logger
+        self.max_workers = max_workers
+        producers = {output: indicator.name for indicator in indicators for output in indicator.outputs}
+        self.dependencies = {
+            indicator.name: {producers[key] for key in indicator.inputs
+                             if key in producers and producers[key] != indicator.name}
+            for indicator in indicators
+        }
+        self.order = self.topological_order()
+
+    def topological_order(self):
+        """ Returns: Indicator names, every indicator after its dependencies
+            Raises: ValueError if the dependencies form a cycle
+        """
+        order, done = [], set()
+        remaining = dict(self.dependencies)
+        while remaining:
+            ready = [name for name, dependencies in remaining.items() if dependencies <= done]
+            if not ready:
+                raise ValueError("Indicator dependency cycle between: {}".format(", ".join(sorted(remaining))))
+            for name in ready:
+                order.append(name)
+                done.add(name)
+                del remaining[name]
+        return order
+
+    def interval_of(self, indicator, snapshot):
+        return getattr(indicator, "interval", None) or snapshot.interval
+
+    def check_history(self, indicator, snapshot, interval):
+        """ Logs a warning when the `interval` bars resampled from `snapshot` are fewer than the indicator needs """
+        if interval == snapshot.interval or not indicator.min_bars:
+            return
+        bars = len(snapshot.timeframe(interval))
+        if bars < indicator.min_bars:
+            self.logger.warning("Only {} {} bars resampled from the {} {} bars, {} needs {}. Set kline_start further "
+                                "back or use a shorter interval.".format(bars, interval, snapshot.symbol,
+                                                                         snapshot.interval, indicator.name,
+                                                                         indicator.min_bars))
+
+    def decide(self, indicator, inputs, calculations, dependencies):
+        """ Input: Indicator, its inputs and calculations, {dependency name: results} of the dependencies that succeeded
+            Returns: {"calculations": ..., "signal": ...}
+        """
+        name = indicator.name
+        signal_data = dict(inputs)
+        signal_data.update(dependencies)
+        signal_data[name] = {"calculations": calculations}
+        signal_data.update(indicator.signal_inputs(calculations))
+        with metrics.timer("indicator_seconds", indicator=name, stage="decide_signal"):
+            signal = indicator.decide_signal(**signal_data)
+        return {"calculations": calculations, "signal": signal}
+
+    def schedule(self, run_indicator):
+        """ Runs run_indicator(name, results) for every indicator on the thread pool, each one once its dependencies
+            are done. `results` holds what the finished indicators returned
+            Returns: {indicator name: result} of the indicators that didn't return None
+        """
+        results = {}
+        pending = {name: set(dependencies) for name, dependencies in self.dependencies.items()}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while pending or running:
+                for name in [name for name in self.order if name in pending and not pending[name]]:
+                    del pending[name]
+                    running[executor.submit(run_indicator, name, results)] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    result = future.result()
+                    if result is not None:
+                        results[name] = result
+                    # Dependents of a failed indicator still run, without its results
+                    for dependencies in pending.values():
+                        dependencies.discard(name)
+        return results
+
+    def run(self, snapshot):
+        """ Returns: {indicator name: {"calculations": ..., "signal": ...}} """
+        start_time = time.perf_counter()
+        inputs_by_interval = {}
+        inputs_lock = threading.Lock()
+
+        def inputs_for(interval):
+            with inputs_lock:
+                if interval not in inputs_by_interval:
+                    inputs = snapshot.timeframe(interval).as_dict()
+                    inputs["intermediates"] = Intermediates.from_data(inputs)
+                    inputs_by_interval[interval] = inputs
+                return inputs_by_interval[interval]
+
+        def run_indicator(name, results):
+            indicator = self.indicators[name]
+            try:
+                inputs = inputs_for(self.interval_of(indicator, snapshot))
+                self.check_history(indicator, snapshot, self.interval_of(indicator, snapshot))
+                with metrics.timer("indicator_seconds", indicator=name, stage="calculate"):
+                    calculations = indicator.calculate(**inputs)
+                return self.decide(indicator, inputs, calculations,
+                                   {dependency: results[dependency] for dependency in self.dependencies[name]
+                                    if dependency in results})
+            except Exception as e:
+                self.logger.error("Failed to calculate indicator '%s'. Error: %s", name, str(e))
+                return None
+
+        results = self.schedule(run_indicator)
+        elapsed_time = time.perf_counter() - start_time
+        self.logger.info("Calculated {} indicators in {:0.4f} seconds".format(len(results), elapsed_time))
+        return {name: results[name] for name in self.order if name in results}
+
+    def run_batch(self, snapshots):
+        """ Runs the indicators of many symbols. Symbols whose bars line up (same interval and open times) run together:
+            each indicator's calculate_batch gets their market data stacked into (symbols, n) arrays, so an indicator
+            with a vectorized kernel makes one call for all of them instead of one per symbol.
+            Signals are still decided symbol by symbol
+            Returns: [results of each snapshot, as run returns them] in the order of `snapshots`
+        """
+        start_time = time.perf_counter()
+        groups = {}
+        for i, snapshot in enumerate(snapshots):
+            groups.setdefault((snapshot.interval, snapshot.timestamps.tobytes()), []).append(i)
+        results = [None] * len(snapshots)
+        for indices in groups.values():
+            group = [snapshots[i] for i in indices]
+            if len(group) > 1 and len(group[0]):
+                group_results = self.run_group(group)
+            else:
+                group_results = [self.run(snapshot) for snapshot in group]
+            for i, result in zip(indices, group_results):
+                results[i] = result
+        elapsed_time = time.perf_counter() - start_time
+        self.logger.info("Calculated indicators for {} symbols in {} groups in {:0.4f} seconds".format(
+            len(snapshots), len(groups), elapsed_time))
+        return results
+
+    def run_group(self, snapshots):
+        """ Input: Snapshots with the same interval and open times
+            Returns: [results of each snapshot, as run returns them]. When an indicator's batch calculation fails,
+                     it is calculated symbol by symbol, so a bad symbol only fails its own results
+        """
+        inputs_by_interval = {}
+        inputs_lock = threading.Lock()
+
+        def inputs_for(interval):
+            with inputs_lock:
+                if interval not in inputs_by_interval:
+                    timeframes = [snapshot.timeframe(interval) for snapshot in snapshots]
+                    rows = [timeframe.as_dict() for timeframe in timeframes]
+                    for row in rows:
+                        row["intermediates"] = Intermediates.from_data(row)
+                    stacked = stack_snapshots(timeframes)
+                    stacked["intermediates"] = Intermediates.from_data(stacked)
+                    inputs_by_interval[interval] = rows, stacked
+                return inputs_by_interval[interval]
+
+        def run_indicator(name, results):
+            indicator = self.indicators[name]
+            try:
+                rows, stacked = inputs_for(self.interval_of(indicator, snapshots[0]))
+                self.check_history(indicator, snapshots[0], self.interval_of(indicator, snapshots[0]))
+            except Exception as e:
+                self.logger.error("Failed to calculate indicator '%s'. Error: %s", name, str(e))
+                return None
+            try:
+                with metrics.timer("indicator_seconds", indicator=name, stage="calculate_batch"):
+                    batch = indicator.calculate_batch(rows, **stacked)
+            except Exception as e:
+                self.logger.warning("Batch calculation of indicator '%s' failed, calculating symbol by symbol. "
+                                    "Error: %s", name, str(e))
+                batch = None
+            row_results = []
+            for i, row in enumerate(rows):
+                try:
+                    if batch is None:
+                        with metrics.timer("indicator_seconds", indicator=name, stage="calculate"):
+                            calculations = indicator.calculate(**row)
+                    else:
+                        calculations = batch[i]
+                    row_results.append(self.decide(indicator, row, calculations,
+                                                   {dependency: results[dependency][i]
+                                                    for dependency in self.dependencies[name]
+                                                    if dependency in results and results[dependency][i] is not None}))
+                except Exception as e:
+                    self.logger.error("Failed to calculate indicator '%s' for %s. Error: %s",
+                                      name, snapshots[i].symbol, str(e))
+                    row_results.append(None)
+            return row_results
+
+        results = self.schedule(run_indicator)
+        return [{name: results[name][i] for name in self.order if name in results and results[name][i] is not None}
+                for i in range(len(snapshots))]
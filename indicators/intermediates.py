@@ -0,0 +1,72 @@
+#!/usr/bin/env python3.5
+
+import threading
+import numpy as np
+from indicators import kernels
+from indicators.kernels import sliding_max, sliding_min, rolling_mean_var
+from indicators.pivots import find_pivots, zigzag
+
+
+class Intermediates:
+    """ Series several indicators build on (true range, ATR, moving averages, rolling extrema).
+        Each one is computed on first use and then shared by every indicator that runs on the
+        same market data, including indicators running concurrently on other threads.
+        The price series are (n), or (symbols, n) for the stacked data of IndicatorGraph.run_batch.
+    """
+    def __init__(self, high_prices, low_prices, closing_prices):
+        self.series = {
+            "high_prices": np.asarray(high_prices, dtype=np.float64),
+            "low_prices": np.asarray(low_prices, dtype=np.float64),
+            "closing_prices": np.asarray(closing_prices, dtype=np.float64),
+        }
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_data(cls, data):
+        """ Returns: The Intermediates passed in the indicator inputs, or new ones for standalone use """
+        intermediates = data.get("intermediates")
+        if intermediates is None:
+            intermediates = cls(data.get("high_prices", []), data.get("low_prices", []),
+                                data.get("closing_prices", []))
+        return intermediates
+
+    def _get(self, key, compute):
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        # Per key, so an indicator waiting for one series doesn't block the others
+        with lock:
+            if key not in self._values:
+                self._values[key] = compute()
+        return self._values[key]
+
+    def true_range(self):
+        return self._get(("trange",), lambda: kernels.true_range(self.series["high_prices"], self.series["low_prices"],
+                                                                 self.series["closing_prices"]))
+
+    def atr(self, period):
+        return self._get(("atr", period), lambda: kernels.atr(self.series["high_prices"], self.series["low_prices"],
+                                                              self.series["closing_prices"], period))
+
+    def sma(self, period, source="closing_prices"):
+        return self._get(("sma", source, period), lambda: kernels.sma(self.series[source], period))
+
+    def ema(self, period, source="closing_prices"):
+        return self._get(("ema", source, period), lambda: kernels.ema(self.series[source], period))
+
+    def rolling_max(self, source, window):
+        """ Returns: Max of `source` over the trailing `window` bars, NaN until `window` bars are available """
+        return self._get(("max", source, window), lambda: sliding_max(self.series[source], window))
+
+    def rolling_min(self, source, window):
+        """ Returns: Min of `source` over the trailing `window` bars, NaN until `window` bars are available """
+        return self._get(("min", source, window), lambda: sliding_min(self.series[source], window))
+
+    def rolling_mean_var(self, source, window):
+        """ Returns: (mean, population variance) of `source` over the trailing `window` bars """
+        return self._get(("mean_var", source, window), lambda: rolling_mean_var(self.series[source], window))
+
+    def swings(self, window, source="closing_prices"):
+        """ Returns: Zigzag of the swing highs and lows of `source` (see indicators/pivots.py) """
+        return self._get(("swings", source, window), lambda: zigzag(find_pivots(self.series[source], window)))
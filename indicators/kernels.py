@@ -0,0 +1,114 @@
+#!/usr/bin/env python3.5
+
+import numpy as np
+import talib
+
+# Kernels over contiguous float64 arrays, (n) or (..., n) with the bars on the last axis.
+# Windowed results are NaN until `window` bars are available, like the talib functions they run on.
+# The rolling kernels run in linear time with the TA-Lib C library 0.8 or later (talib.__ta_version__). With older
+# versions sliding_max and sliding_min are O(n * window) on a steady trend, see their docstrings
+
+# Exponential smoothing runs in blocks short enough that the scaled terms (up to this factor) cannot overflow
+SMOOTHING_BLOCK_SCALE = 1e100
+
+
+def _rows(function, *series, **parameters):
+    """ Returns: function, a talib function of one or more series, applied to every row of `series`.
+                 The rows are written into one preallocated result
+    """
+    series = [np.ascontiguousarray(values, dtype=np.float64) for values in series]
+    shape = series[0].shape
+    if len(shape) == 1:
+        return function(*series, **parameters)
+    rows = [values.reshape(-1, shape[-1]) for values in series]
+    result = np.empty(rows[0].shape)
+    for i, row in enumerate(zip(*rows)):
+        result[i] = function(*row, **parameters)
+    return result.reshape(shape)
+
+
+def sliding_max(values, window):
+    """ Returns: Max of the trailing `window` bars at every bar. Comparisons only, so the results are exact.
+                 The TA-Lib 0.4 C library rescans the window whenever its max leaves it, O(n * window) on a steady
+                 downtrend; 0.8 and later stay O(n)
+    """
+    if window == 1:
+        return np.array(values, dtype=np.float64)
+    return _rows(talib.MAX, values, timeperiod=window)
+
+
+def sliding_min(values, window):
+    """ Returns: Min of the trailing `window` bars at every bar, see sliding_max (O(n * window) on a steady uptrend
+                 with TA-Lib 0.4)
+    """
+    if window == 1:
+        return np.array(values, dtype=np.float64)
+    return _rows(talib.MIN, values, timeperiod=window)
+
+
+def rolling_mean_var(values, window, ddof=0):
+    """ Input: Values, window length, delta degrees of freedom of the variance (0 like np.std, 1 for the sample one)
+        Returns: (mean, variance) of the trailing `window` bars at every bar
+        The TA-Lib 0.4 C library, still the one most systems install, computes VAR from running sums of the values
+        and of their squares: O(n), but the variance is then a difference of two numbers of the order of x^2, off by
+        about 1e-16 * x^2 (a 60000 price keeps about 7 digits of a variance of 1). Every row is shifted by the mean
+        of its finite values first, which leaves the variance unchanged and bounds that error by the squared distance
+        from the mean instead of the squared price. Rounding can still leave a flat window a tiny variance, never a
+        negative one. A NaN makes the variance of every later window NaN
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    mean = _rows(talib.SMA, values, timeperiod=window)
+    finite = np.isfinite(values)
+    shift = np.where(finite, values, 0).sum(axis=-1, keepdims=True) / np.maximum(finite.sum(axis=-1, keepdims=True), 1)
+    variance = np.maximum(_rows(talib.VAR, values - shift, timeperiod=window, nbdev=1), 0)
+    if ddof:
+        variance *= window / (window - ddof)
+    return mean, variance
+
+
+def sma(values, period):
+    """ Returns: Mean of the trailing `period` values at every bar """
+    return _rows(talib.SMA, values, timeperiod=period)
+
+
+def ema(values, period):
+    """ Returns: EMA with alpha 2 / (period + 1) seeded with the mean of the first `period` values """
+    return _rows(talib.EMA, values, timeperiod=period)
+
+
+def true_range(high_prices, low_prices, closing_prices):
+    """ Returns: True range at every bar, NaN for the first one """
+    return _rows(talib.TRANGE, high_prices, low_prices, closing_prices)
+
+
+def atr(high_prices, low_prices, closing_prices, period):
+    """ Returns: Wilder's average true range, NaN for the first `period` bars """
+    return _rows(talib.ATR, high_prices, low_prices, closing_prices, timeperiod=period)
+
+
+def exponential_smooth(values, initial, decay):
+    """ Input: values (..., n), initial smoothed value (...) before the first of them, decay in [0, 1)
+        Returns: (..., n) with y[i] = decay * y[i - 1] + (1 - decay) * values[i].
+                 Inside a block y[k] = decay^(k+1) * y_start + decay^k * (1 - decay) * sum(values[j] * decay^-j),
+                 so each block is one cumulative sum over all rows at once. Blocks are chained through their last value
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty_like(values)
+    previous = np.asarray(initial, dtype=np.float64)
+    if decay == 0:
+        return values.copy()
+    block = max(int(np.log(SMOOTHING_BLOCK_SCALE) / -np.log(decay)), 1)
+    powers = decay ** np.arange(block + 1)
+    inverse_powers = 1 / powers[:-1]
+    for start in range(0, values.shape[-1], block):
+        chunk = values[..., start:start + block]
+        length = chunk.shape[-1]
+        sums = np.cumsum(chunk * inverse_powers[:length], axis=-1) * (1 - decay)
+        result[..., start:start + length] = powers[1:length + 1] * previous[..., None] + powers[:length] * sums
+        previous = result[..., start + length - 1]
+    return result
+
+
+def wilder_smooth(values, initial, period):
+    """ Returns: (..., n) with y[i] = (y[i - 1] * (period - 1) + values[i]) / period """
+    return exponential_smooth(values, initial, (period - 1) / period)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3.5
+
+import time
+import argparse
+from collections import deque
+import numpy as np
+import pandas as pd
+import talib
+from indicators.kernels import sliding_max, sliding_min, rolling_mean_var
+
+
+def sliding_max_deque(values, window):
+    """ Reference: the monotonic deque find_pivots used before sliding_max """
+    values = np.asarray(values, dtype=np.float64).tolist()
+    result = [float('nan')] * len(values)
+    candidates = deque()
+    for i, value in enumerate(values):
+        while candidates and values[candidates[-1]] <= value:
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        if i >= window - 1:
+            result[i] = values[candidates[0]]
+    return np.array(result)
+
+
+def stochastic_loop(high_prices, low_prices, closing_prices, k_period, d_period):
+    """ Reference: %K from the last rolling max/min and the %D loop StochasticOscillator.calculate used before the
+        rolling kernels, without the slice that came out empty for the last bar
+    """
+    highest_high = talib.MAX(high_prices, k_period)[-1]
+    lowest_low = talib.MIN(low_prices, k_period)[-1]
+    K = 100 * ((closing_prices[-1] - lowest_low) / (highest_high - lowest_low))
+    D_values = []
+    for i in range(len(closing_prices) - d_period, len(closing_prices)):
+        low_prices_slice = low_prices[i - k_period + 1:i + 1]
+        high_prices_slice = high_prices[i - k_period + 1:i + 1]
+        D_values.append(100 * ((closing_prices[i] - np.min(low_prices_slice)) /
+                               (np.max(high_prices_slice) - np.min(low_prices_slice))))
+    return K, np.mean(D_values)
+
+
+def stochastic_kernel(high_prices, low_prices, closing_prices, k_period, d_period):
+    highest_highs = sliding_max(high_prices, k_period)[-d_period:]
+    lowest_lows = sliding_min(low_prices, k_period)[-d_period:]
+    K_values = 100 * (closing_prices[-d_period:] - lowest_lows) / (highest_highs - lowest_lows)
+    return K_values[-1], np.mean(K_values)
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+
+def report(name, bars, reference_name, reference_time, kernel_time, difference):
+    print("{:>9} bars  {:<22} {:<18} {:9.4f} s  kernel {:9.4f} s  {:8.1f}x  max diff {:.2e}".format(
+        bars, name, reference_name, reference_time, kernel_time, reference_time / kernel_time, difference))
+
+
+def max_difference(result, expected):
+    return float(np.nanmax(np.abs(np.asarray(result) - np.asarray(expected))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the rolling window kernels with the code they replace")
+    parser.add_argument('-n', '--bars', type=str, default="1000,100000,1000000",
+                        help='Comma-separated numbers of bars',
+                        required=False)
+    parser.add_argument('-s', '--symbols', type=int, default=64,
+                        help='Rows of the (symbols, bars) run',
+                        required=False)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for bars in [int(n) for n in args.bars.split(',')]:
+        closing_prices = 30000 + np.cumsum(rng.normal(0, 10, bars))
+        high_prices = closing_prices + rng.random(bars) * 10
+        low_prices = closing_prices - rng.random(bars) * 10
+        high_series = pd.Series(high_prices)
+        low_series = pd.Series(low_prices)
+
+        def ichimoku_pandas():
+            return [(high_series.rolling(window).max() + low_series.rolling(window).min()) / 2
+                    for window in (9, 26, 52)]
+
+        def ichimoku_kernel():
+            return [(sliding_max(high_prices, window) + sliding_min(low_prices, window)) / 2
+                    for window in (9, 26, 52)]
+
+        expected, reference_time = timed(ichimoku_pandas)
+        result, kernel_time = timed(ichimoku_kernel)
+        report("Ichimoku lines", bars, "pandas rolling", reference_time, kernel_time,
+               max(max_difference(line, expected_line) for line, expected_line in zip(result, expected)))
+
+        expected, reference_time = timed(sliding_max_deque, closing_prices, 5)
+        result, kernel_time = timed(sliding_max, closing_prices, 5)
+        report("pivot window max", bars, "monotonic deque", reference_time, kernel_time,
+               max_difference(result, expected))
+
+        expected, reference_time = timed(lambda: pd.Series(closing_prices).rolling(20).std(ddof=0).to_numpy())
+        (means, variances), kernel_time = timed(rolling_mean_var, closing_prices, 20)
+        report("Bollinger std", bars, "pandas rolling", reference_time, kernel_time,
+               max_difference(np.sqrt(variances), expected))
+
+        expected, reference_time = timed(stochastic_loop, high_prices, low_prices, closing_prices, 14, 3)
+        result, kernel_time = timed(stochastic_kernel, high_prices, low_prices, closing_prices, 14, 3)
+        report("Stochastic %K, %D", bars, "slicing loop", reference_time, kernel_time,
+               max_difference(result, expected))
+
+        rows = 30000 + np.cumsum(rng.normal(0, 10, (args.symbols, bars)), axis=1)
+        expected, reference_time = timed(lambda: pd.DataFrame(rows.T).rolling(26).max().to_numpy().T)
+        result, kernel_time = timed(sliding_max, rows, 26)
+        report("{} symbols max".format(args.symbols), bars, "pandas rolling", reference_time, kernel_time,
+               max_difference(result, expected))
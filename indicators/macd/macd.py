@@ -8,12 +8,15 @@ import pandas as pd
 import talib
 import random
 from indicators.base_indicator import BaseIndicator
+from indicators.incremental import IncrementalMACD
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
 class MACD(BaseIndicator):
+    inputs = ('closing_prices',)
+
     def __init__(self, fast_period=12, slow_period=26, signal_period=9, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -35,7 +38,7 @@ class MACD(BaseIndicator):
         self.logger.info("Slow Period: {}".format(self.slow_period))
         self.logger.info("Signal Period: {}".format(self.signal_period))
 
-        macd_line, signal_line, histogram = talib.MACD(np.array(closing_prices),
+        macd_line, signal_line, histogram = talib.MACD(np.asarray(closing_prices, dtype=np.float64),
                     fastperiod=self.fast_period, slowperiod=self.slow_period,
                     signalperiod=self.signal_period)
         
@@ -45,6 +48,9 @@ class MACD(BaseIndicator):
  
         return macd_line, signal_line, histogram
 
+    def incremental(self):
+        return IncrementalMACD(self.fast_period, self.slow_period, self.signal_period)
+
     def decide_signal(self, **data):
         macd_line, signal_line, _ = data.get("MACD", {}).get("calculations", [])
         if macd_line.size == 0 or signal_line.size == 0:
@@ -4,14 +4,18 @@ import os
 import argparse
 import time
 import random
+import numpy as np
 import pandas as pd
 from indicators.base_indicator import BaseIndicator
+from indicators.incremental import IncrementalOBV
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
 class OBV(BaseIndicator):
+    inputs = ('closing_prices', 'volumes')
+
     def __init__(self, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -27,14 +31,14 @@ class OBV(BaseIndicator):
         self.logger.info("Calculating On-Balance Volume (OBV)...")
 
         closing_prices = data.get("closing_prices", [])
-        volume = data.get("volume", [])
+        volume = data.get("volumes", [])
 
         df = pd.DataFrame({
             'close': closing_prices,
             'volume': volume
         })
 
-        df['obv'] = 0
+        df['obv'] = 0.0
         df.loc[df['close'] > df['close'].shift(1), 'obv'] = df['volume']
         df.loc[df['close'] < df['close'].shift(1), 'obv'] = -df['volume']
         df['obv'] = df['obv'].cumsum()
@@ -44,7 +48,28 @@ class OBV(BaseIndicator):
         self.logger.info("Calculated On-Balance Volume (OBV) in {:0.4f} seconds".format(elapsed_time))
        
         return df['obv']
+
+    def calculate_batch(self, rows, **data):
+        start_time = time.perf_counter()
+        self.logger.info("Calculating On-Balance Volume (OBV) of {} symbols...".format(len(rows)))
+        closing_prices = np.asarray(data.get("closing_prices"), dtype=np.float64)
+        volumes = np.asarray(data.get("volumes"), dtype=np.float64)
+
+        # Volume counts up on a higher close, down on a lower one, not at all on the first bar
+        changes = np.diff(closing_prices, axis=-1)
+        signed_volumes = np.where(changes > 0, volumes[..., 1:], np.where(changes < 0, -volumes[..., 1:], 0.))
+        obv = np.zeros_like(closing_prices)
+        np.cumsum(signed_volumes, axis=-1, out=obv[..., 1:])
+        end_time = time.perf_counter()
+        elapsed_time = end_time - start_time
+        self.logger.info("Calculated On-Balance Volume (OBV) of {} symbols in {:0.4f} seconds".format(
+            len(rows), elapsed_time))
+
+        return [pd.Series(values, name='obv') for values in obv]
     
+    def incremental(self):
+        return IncrementalOBV()
+
     def decide_signal(self, **data):
         obv = data.get("OBV", {}).get("calculations", [])
         if obv.empty:
@@ -86,5 +111,5 @@ if __name__ == "__main__":
         volume = [float(vol) for vol in args.volume.split(',')]
 
     obv_api = OBV()
-    obv = obv_api.calculate(closing_prices=closing_prices, volume=volume)
+    obv = obv_api.calculate(closing_prices=closing_prices, volumes=volume)
     signal = obv_api.decide_signal(OBV={"calculations": obv})
\ No newline at end of file
@@ -4,15 +4,20 @@ import os
 import argparse
 import time
 import random
+import numpy as np
 from binance.client import Client
 from indicators.base_indicator import BaseIndicator
 from scripts.constants import Constants
+from scripts.order_book import LocalOrderBook, read_diff_file
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
 class OBA(BaseIndicator):
-    def __init__(self, is_test=True,
+    inputs = ('order_book',)
+
+    # depth=None uses every level of the order book, i.e. the `orderbook_depth` levels fetched
+    def __init__(self, depth=None, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
         self.logger = setup_logger(name=log_name,
@@ -21,6 +26,7 @@ class OBA(BaseIndicator):
                                    )
         self.logger.debug("Timestamp: {}".format(timestamp))
         self.logger.debug("Is test: {}".format(is_test))
+        self.depth = depth
 
     def calculate(self, **data):
         pass
@@ -32,12 +38,20 @@ class OBA(BaseIndicator):
             self.logger.error("Missing required data. Cannot decide signal.")
             return Constants.UNKNOWN_SIGNAL
 
+        if isinstance(order_book, LocalOrderBook) and not order_book.synced:
+            self.logger.error("{} order book is resyncing after a gap. Cannot decide signal.".format(order_book.symbol))
+            return Constants.UNKNOWN_SIGNAL
+
         self.logger.info("Deciding Order Book Analysis buy/sell/hold signal...")        
-        bids = order_book['bids']
-        asks = order_book['asks']
-        bid_sum = sum([float(bid[1]) for bid in bids])
+        if isinstance(order_book, LocalOrderBook):
+            _, bid_quantities = order_book.bids(self.depth)
+            _, ask_quantities = order_book.asks(self.depth)
+        else:
+            bid_quantities = np.asarray([bid[1] for bid in order_book['bids'][:self.depth]], dtype=np.float64)
+            ask_quantities = np.asarray([ask[1] for ask in order_book['asks'][:self.depth]], dtype=np.float64)
+        bid_sum = bid_quantities.sum()
         self.logger.info("Bid Sum: {}".format(bid_sum))
-        ask_sum = sum([float(ask[1]) for ask in asks])
+        ask_sum = ask_quantities.sum()
         self.logger.info("Ask Sum: {}".format(ask_sum))
 
         if bid_sum > ask_sum:
@@ -63,6 +77,9 @@ if __name__ == "__main__":
                         required=False)
     parser.add_argument("--depth", type=int, default=Constants.DEFAULT_ORDERBOOK_DEPTH,
                         help="Setting the depth to a higher number will include more price levels in the order book data, providing a more detailed view of the market. However, it can also increase the amount of data that needs to be processed, which may affect the performance of your script or application.")
+    parser.add_argument('--diffs', type=str,
+                        help='Path to recorded depth diff events to build a local order book from. Optional.',
+                        required=False)
     parser.add_argument('--use_mock', action='store_true', default=False,
                         help='Add this argument to run mock example',
                         required=False)
@@ -71,10 +88,14 @@ if __name__ == "__main__":
     if args.use_mock:
         order_book = {'bids': [[i, random.uniform(1, 10)] for i in range(10)],
                       'asks': [[i, random.uniform(1, 10)] for i in range(10)]}
+    elif args.diffs:
+        order_book = LocalOrderBook(args.symbol)
+        for event in read_diff_file(args.diffs):
+            order_book.process(event)
     else:
         if not args.symbol:
             raise ValueError("Missing required argument: symbol")
         order_book = Client().get_order_book(symbol=args.symbol, limit=args.depth)
 
-    oba_api = OBA()
+    oba_api = OBA(depth=args.depth)
     signal = oba_api.decide_signal(order_book=order_book)
\ No newline at end of file
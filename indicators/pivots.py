@@ -0,0 +1,134 @@
+#!/usr/bin/env python3.5
+
+from collections import namedtuple
+import numpy as np
+from indicators.kernels import sliding_max, sliding_min
+
+
+HIGH = 1
+LOW = -1
+
+# A swing high or low: bar index, price and HIGH or LOW
+Pivot = namedtuple('Pivot', ['index', 'price', 'kind'])
+
+
+class DoubleExtreme(namedtuple('DoubleExtreme', ['first', 'middle', 'second'])):
+    """ A double top or bottom: the two extreme Pivots and the opposite swing between them, the neckline """
+    __slots__ = ()
+
+    @property
+    def last(self):
+        return self.second
+
+    @property
+    def neckline(self):
+        return self.middle.price
+
+
+class HeadShoulders(namedtuple('HeadShoulders', ['left', 'head', 'right', 'neckline'])):
+    """ A head and shoulders top or bottom: the shoulder and head Pivots and the neckline price """
+    __slots__ = ()
+
+    @property
+    def last(self):
+        return self.right
+
+
+def find_pivots(values, window):
+    """ Input: Values, length of the centered window a pivot must be the extreme of (the rolling(window, center=True)
+               alignment of pandas: window // 2 bars before, the rest after)
+        Returns: [Pivot] in bar order. A bar that is both the max and the min of its window (a flat window) is skipped
+    """
+    values = np.asarray(values, dtype=np.float64)
+    before = window // 2
+    after = window - 1 - before
+    # The trailing extreme at i + after is the centered extreme at i
+    highs = sliding_max(values, window)[after:]
+    lows = sliding_min(values, window)[after:]
+    centers = values[:len(values) - after]
+    is_high = centers == highs
+    is_low = centers == lows
+    pivots = []
+    for index in np.flatnonzero(is_high ^ is_low).tolist():
+        pivots.append(Pivot(index, float(values[index]), HIGH if is_high[index] else LOW))
+    return pivots
+
+
+def zigzag(pivots):
+    """ Returns: Pivots alternating between highs and lows. Of consecutive pivots of the same kind, the most extreme
+                 one is kept (the first one on ties)
+    """
+    result = []
+    for pivot in pivots:
+        if result and result[-1].kind == pivot.kind:
+            if (pivot.price > result[-1].price) if pivot.kind == HIGH else (pivot.price < result[-1].price):
+                result[-1] = pivot
+        else:
+            result.append(pivot)
+    return result
+
+
+def find_head_and_shoulders(swings, tolerance, kind=HIGH):
+    """ Returns: Bar indices of the heads of every occurrence, see find_head_and_shoulders_patterns """
+    return [pattern.head.index for pattern in find_head_and_shoulders_patterns(swings, tolerance, kind)]
+
+
+def find_head_and_shoulders_patterns(swings, tolerance, kind=HIGH):
+    """ Input: Zigzag pivots, tolerance, HIGH for head and shoulders tops, LOW for inverted ones (bottoms)
+        Returns: [HeadShoulders] of every occurrence in bar order. An occurrence is five alternating swings
+                 shoulder, neckline, head, neckline, shoulder where both shoulders are beyond the neckline, the head
+                 is beyond both shoulders and the shoulders differ by at most `tolerance` times the head's height
+                 over the neckline. The neckline price is that of the neckline swing nearer to the head's price
+    """
+    sign = 1 if kind == HIGH else -1
+    patterns = []
+    for i in range(len(swings) - 4):
+        left, left_neck, head, right_neck, right = swings[i:i + 5]
+        if head.kind != kind:
+            continue
+        neckline = sign * max(sign * left_neck.price, sign * right_neck.price)
+        if sign * (left.price - left_neck.price) > 0 and sign * (right.price - right_neck.price) > 0 and \
+                sign * (head.price - left.price) > 0 and sign * (head.price - right.price) > 0 and \
+                abs(left.price - right.price) <= tolerance * sign * (head.price - neckline):
+            patterns.append(HeadShoulders(left, head, right, neckline))
+    return patterns
+
+
+def find_double_extremes(swings, tolerance, kind=HIGH):
+    """ Input: Zigzag pivots, tolerance, HIGH for double tops, LOW for double bottoms
+        Returns: [DoubleExtreme] of every occurrence: two swings of that kind with only the opposite swing between
+                 them, whose prices differ by at most `tolerance` times the swing height, the smaller of the two
+                 extremes' distances from the swing between them
+    """
+    sign = 1 if kind == HIGH else -1
+    patterns = []
+    for i in range(len(swings) - 2):
+        first, middle, second = swings[i:i + 3]
+        height = min(sign * (first.price - middle.price), sign * (second.price - middle.price))
+        if first.kind == kind and height > 0 and abs(second.price - first.price) <= tolerance * height:
+            patterns.append(DoubleExtreme(first, middle, second))
+    return patterns
+
+
+def neckline_break(values, pattern, kind=HIGH):
+    """ Input: Values the swings were found in, DoubleExtreme or HeadShoulders, HIGH for tops, LOW for bottoms
+        Returns: Index of the first bar after the pattern's last extreme closing beyond the neckline (below it for a
+                 top, above it for a bottom), or -1 if the pattern is not confirmed yet
+    """
+    sign = 1 if kind == HIGH else -1
+    after = np.asarray(values[pattern.last.index + 1:], dtype=np.float64)
+    breaks = np.flatnonzero(sign * (pattern.neckline - after) > 0)
+    return pattern.last.index + 1 + int(breaks[0]) if len(breaks) else -1
+
+
+def latest_confirmed(values, patterns, kind, max_age):
+    """ Input: Values the swings were found in, patterns in bar order, HIGH for tops, LOW for bottoms, max age in bars
+        Returns: The latest pattern whose last extreme is within the last max_age bars and whose neckline a later
+                 value has broken, or None
+    """
+    for pattern in reversed(patterns):
+        if pattern.last.index < len(values) - max_age:
+            break
+        if neckline_break(values, pattern, kind) != -1:
+            return pattern
+    return None
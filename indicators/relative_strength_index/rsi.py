@@ -6,11 +6,44 @@ import argparse
 import numpy as np
 import random
 from indicators.base_indicator import BaseIndicator
+from indicators.incremental import IncrementalRSI
+from indicators.kernels import wilder_smooth
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
+
+def rsi_kernel(closing_prices, period_length=Constants.DEFAULT_PERIOD_LENGTH):
+    """ Input: Closing prices, (n) or (symbols, n)
+        Returns: RSI of the same shape. The first period_length values hold the RSI of the seed, the average
+                 gain and loss of the first period_length + 1 price changes. Later values are Wilder smoothed.
+    """
+    closing_prices = np.asarray(closing_prices, dtype=np.float64)
+    deltas = np.diff(closing_prices, axis=-1)
+    seed = deltas[..., :period_length + 1]
+    up = np.where(seed >= 0, seed, 0).sum(axis=-1) / period_length
+    down = -np.where(seed < 0, seed, 0).sum(axis=-1) / period_length
+    # Bar i >= period_length is smoothed with the change into bar i
+    changes = deltas[..., period_length - 1:]
+    ups = np.concatenate([up[..., None], wilder_smooth(np.maximum(changes, 0), up, period_length)], axis=-1)
+    downs = np.concatenate([down[..., None], wilder_smooth(np.maximum(-changes, 0), down, period_length)], axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi_values = 100. - 100. / (1. + ups / downs)
+    rsi = np.empty_like(closing_prices)
+    rsi[..., :period_length] = rsi_values[..., :1]
+    rsi[..., period_length:] = rsi_values[..., 1:closing_prices.shape[-1] - period_length + 1]
+    return rsi
+
+
+def rsi_signals(rsi):
+    """ Returns: Array of buy/sell/hold signals for every RSI value, any shape """
+    return np.where(rsi < Constants.RSI_BUY_THRESHOLD, Constants.BUY_SIGNAL,
+                    np.where(rsi > Constants.RSI_SELL_THRESHOLD, Constants.SELL_SIGNAL, Constants.HOLD_SIGNAL))
+
+
 class RSI(BaseIndicator):
+    inputs = ('closing_prices',)
+
     def __init__(self, period_length=Constants.DEFAULT_PERIOD_LENGTH, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -26,38 +59,34 @@ class RSI(BaseIndicator):
         start_time = time.perf_counter()
         closing_prices = data.get("closing_prices", "")
         self.logger.info("Calculating RSI...")
-        self.logger.debug("Closing prices: {}".format(", ".join(map(str, closing_prices))))
+        self.logger.debug("Closing prices: {} bars".format(np.shape(closing_prices)[-1]))
         self.logger.debug("Period Length: {}".format(self.period_length))
 
-        deltas = np.diff(closing_prices)
-        seed = deltas[:self.period_length + 1]
-        up = seed[seed >= 0].sum() / self.period_length
-        down = -seed[seed < 0].sum() / self.period_length
-        rs = up / down
-        rsi = np.zeros_like(closing_prices)
-        rsi[:self.period_length] = 100. - 100. / (1. + rs)
-
-        for i in range(self.period_length, len(closing_prices)):
-            delta = deltas[i - 1]  # cause the diff is 1 shorter
-            if delta > 0:
-                upval = delta
-                downval = 0.
-            else:
-                upval = 0.
-                downval = -delta
-
-            up = (up * (self.period_length - 1) + upval) / self.period_length
-            down = (down * (self.period_length - 1) + downval) / self.period_length
-
-            rs = up / down
-            rsi[i] = 100. - 100. / (1. + rs)
-        
+        rsi = rsi_kernel(closing_prices, self.period_length)
+
         end_time = time.perf_counter()
         elapsed_time = end_time - start_time
         self.logger.info("RSI calculation finished in {:0.4f} seconds".format(elapsed_time))
         
         return rsi
 
+    def calculate_batch(self, rows, **data):
+        start_time = time.perf_counter()
+        self.logger.info("Calculating RSI of {} symbols...".format(len(rows)))
+        rsi = rsi_kernel(data.get("closing_prices"), self.period_length)
+
+        end_time = time.perf_counter()
+        elapsed_time = end_time - start_time
+        self.logger.info("RSI calculation of {} symbols finished in {:0.4f} seconds".format(len(rows), elapsed_time))
+
+        return list(rsi)
+
+    def incremental(self):
+        return IncrementalRSI(self.period_length)
+
+    def signal_inputs(self, calculations):
+        return {"rsi": calculations}
+
     def decide_signal(self, **data):
         rsi = data.get("rsi", "")
         if rsi is None or len(rsi) < 2:
@@ -65,22 +94,10 @@ class RSI(BaseIndicator):
             return Constants.UNKNOWN_SIGNAL
 
         self.logger.info("Deciding RSI buy/sell/hold signal...")
-        signals = []
-        for i in range(len(rsi)):
-            self.logger.info(f"RSI: {rsi[i]:.2f}")
-            if rsi[i] < Constants.RSI_BUY_THRESHOLD:
-                self.logger.info("Possible buy signal on period %s" % str(i))
-                signals.append(Constants.BUY_SIGNAL)
-            elif rsi[i] > Constants.RSI_SELL_THRESHOLD:
-                self.logger.info("Possible sell signal on period %s" % str(i))
-                signals.append(Constants.SELL_SIGNAL)
-            else:
-                self.logger.info("Possible hold signal on period %s" % str(i))
-                signals.append(Constants.HOLD_SIGNAL)
-        
-        self.logger.info("RSI signal at final period:")
+        signals = rsi_signals(rsi)
+        self.logger.info(f"RSI at final period: {rsi[-1]:.2f}")
         self.logger.info("Signal detected: {}".format(signals[-1]))
-        return signals
+        return signals.tolist()
 
 
 if __name__ == "__main__":
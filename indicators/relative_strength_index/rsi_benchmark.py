@@ -0,0 +1,82 @@
+#!/usr/bin/env python3.5
+
+import time
+import argparse
+import numpy as np
+from indicators.relative_strength_index.rsi import rsi_kernel, rsi_signals
+from scripts.constants import Constants
+
+
+def rsi_loop(closing_prices, period_length):
+    """ Reference: the per-bar loop RSI.calculate used before rsi_kernel """
+    deltas = np.diff(closing_prices)
+    seed = deltas[:period_length + 1]
+    up = seed[seed >= 0].sum() / period_length
+    down = -seed[seed < 0].sum() / period_length
+    rs = up / down
+    rsi = np.zeros_like(closing_prices)
+    rsi[:period_length] = 100. - 100. / (1. + rs)
+
+    for i in range(period_length, len(closing_prices)):
+        delta = deltas[i - 1]
+        if delta > 0:
+            upval = delta
+            downval = 0.
+        else:
+            upval = 0.
+            downval = -delta
+
+        up = (up * (period_length - 1) + upval) / period_length
+        down = (down * (period_length - 1) + downval) / period_length
+
+        rs = up / down
+        rsi[i] = 100. - 100. / (1. + rs)
+    return rsi
+
+
+def signals_loop(rsi):
+    """ Reference: the per-bar loop RSI.decide_signal used before rsi_signals, without its logging """
+    signals = []
+    for value in rsi:
+        if value < Constants.RSI_BUY_THRESHOLD:
+            signals.append(Constants.BUY_SIGNAL)
+        elif value > Constants.RSI_SELL_THRESHOLD:
+            signals.append(Constants.SELL_SIGNAL)
+        else:
+            signals.append(Constants.HOLD_SIGNAL)
+    return signals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the vectorized RSI kernel with the per-bar loop")
+    parser.add_argument('-n', '--bars', type=str, default="1000,10000,100000,1000000,10000000",
+                        help='Comma-separated numbers of bars',
+                        required=False)
+    parser.add_argument('-s', '--symbols', type=int, default=1,
+                        help='Symbols per kernel call. The loop runs once per symbol',
+                        required=False)
+    parser.add_argument('-p', '--period_length', type=int, default=Constants.DEFAULT_PERIOD_LENGTH,
+                        help='Length of period',
+                        required=False)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print("{:>10} {:>8} {:>12} {:>12} {:>9} {:>10}".format("bars", "symbols", "loop s", "kernel s", "speedup",
+                                                            "max diff"))
+    for bars in [int(n) for n in args.bars.split(',')]:
+        closing_prices = 100 + np.cumsum(rng.normal(0, 1, (args.symbols, bars)), axis=1)
+
+        start_time = time.perf_counter()
+        expected = [rsi_loop(prices, args.period_length) for prices in closing_prices]
+        expected_signals = [signals_loop(rsi) for rsi in expected]
+        loop_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        rsi = rsi_kernel(closing_prices, args.period_length)
+        signals = rsi_signals(rsi)
+        kernel_time = time.perf_counter() - start_time
+
+        assert all(list(row) == expected_row for row, expected_row in zip(signals, expected_signals))
+        print("{:>10} {:>8} {:>12.4f} {:>12.4f} {:>8.1f}x {:>10.2e}".format(
+            bars, args.symbols, loop_time, kernel_time, loop_time / kernel_time,
+            np.nanmax(np.abs(rsi - np.asarray(expected)))))
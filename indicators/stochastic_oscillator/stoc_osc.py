@@ -6,12 +6,39 @@ import time
 import numpy as np
 import random
 from indicators.base_indicator import BaseIndicator
+from indicators.intermediates import Intermediates
+from indicators.kernels import sliding_max, sliding_min
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
+def stochastic_kernel(high_prices, low_prices, closing_prices, k_period=14, d_period=3, intermediates=None):
+    """ Input: Price series, (n) or (symbols, n)
+        Returns: {"K", "D"} arrays of the same shape. %K = 100 * (close - lowest low) / (highest high - lowest low)
+                 over the trailing k_period bars, NaN where that range is 0. %D is the mean of the last d_period %K
+    """
+    closing_prices = np.asarray(closing_prices, dtype=np.float64)
+    if intermediates is not None:
+        highest_highs = intermediates.rolling_max("high_prices", k_period)
+        lowest_lows = intermediates.rolling_min("low_prices", k_period)
+    else:
+        highest_highs = sliding_max(high_prices, k_period)
+        lowest_lows = sliding_min(low_prices, k_period)
+    price_range = highest_highs - lowest_lows
+    with np.errstate(divide='ignore', invalid='ignore'):
+        K = np.where(price_range != 0, 100 * (closing_prices - lowest_lows) / price_range, np.nan)
+    D = np.full_like(K, np.nan)
+    count = K.shape[-1] - d_period + 1
+    if count > 0:
+        # A sum of shifted slices rather than a cumulative sum, so a NaN %K only affects the windows holding it
+        D[..., d_period - 1:] = sum(K[..., i:i + count] for i in range(d_period)) / d_period
+    return {"K": K, "D": D}
+
+
 class StochasticOscillator(BaseIndicator):
+    inputs = ('high_prices', 'low_prices', 'closing_prices')
+
     def __init__(self, interval="1d", k_period=14, d_period=3, threshold=20, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -26,6 +53,10 @@ class StochasticOscillator(BaseIndicator):
         self.d_period = d_period
         self.threshold = threshold / 100
 
+    @property
+    def min_bars(self):
+        return self.k_period + self.d_period - 1
+
     def calculate(self, **data):
         start_time = time.perf_counter()
         closing_prices = data.get('closing_prices')
@@ -36,39 +67,20 @@ class StochasticOscillator(BaseIndicator):
         self.logger.info("d_period {}".format(self.d_period))
 
         # Convert to numpy arrays
-        closing_prices = np.array(closing_prices)
-        high_prices = np.array(high_prices)
-        low_prices = np.array(low_prices)
+        closing_prices = np.asarray(closing_prices, dtype=np.float64)
+        high_prices = np.asarray(high_prices, dtype=np.float64)
+        low_prices = np.asarray(low_prices, dtype=np.float64)
 
-        # Calculate highest high and lowest low over the k_period
         if len(high_prices) < self.k_period or len(low_prices) < self.k_period:
             self.logger.error("Not enough data to calculate Stochastic Oscillator.")
-            return np.nan, np.nan
-
-        highest_high = np.max(high_prices[-self.k_period:])
-        lowest_low = np.min(low_prices[-self.k_period:])
+            return {"K": np.nan, "D": np.nan}
 
-        # Calculate %K
-        if highest_high != lowest_low:
-            K = 100 * ((closing_prices[-1] - lowest_low) / (highest_high - lowest_low))
-        else:
+        oscillator = stochastic_kernel(high_prices, low_prices, closing_prices, self.k_period, self.d_period,
+                                       intermediates=Intermediates.from_data(data))
+        K = oscillator["K"][-1]
+        D = oscillator["D"][-1]
+        if np.isnan(K):
             self.logger.error("Highest high and lowest low are equal. Cannot calculate %K.")
-            return np.nan, np.nan
-
-        # Calculate %D
-        if len(closing_prices) >= self.d_period:
-            D_values = []
-            for i in range(-self.d_period, 0):
-                if i-self.k_period+1 < i+1:
-                    low_prices_slice = low_prices[i-self.k_period+1:i+1]
-                    high_prices_slice = high_prices[i-self.k_period+1:i+1]
-                    if len(low_prices_slice) > 0 and len(high_prices_slice) > 0:
-                        D_value = 100 * ((closing_prices[i] - np.min(low_prices_slice)) / 
-                                        (np.max(high_prices_slice) - np.min(low_prices_slice)))
-                        D_values.append(D_value)
-            D = np.mean(D_values) if D_values else np.nan
-        else:
-            D = np.nan
 
         self.logger.info("K: {}".format(K))
         self.logger.info("D: {}".format(D))
@@ -77,10 +89,35 @@ class StochasticOscillator(BaseIndicator):
         elapsed_time = end_time - start_time
         self.logger.info("Calculated Stochastic Oscillator in {:0.4f} seconds".format(elapsed_time))
 
-        return K, D
+        # Latest values for decide_signal, full series under K_values and D_values
+        return {"K": K, "D": D, "K_values": oscillator["K"], "D_values": oscillator["D"]}
+
+    def calculate_batch(self, rows, **data):
+        high_prices = np.asarray(data.get('high_prices'), dtype=np.float64)
+        if high_prices.shape[-1] < self.k_period:
+            return super().calculate_batch(rows, **data)
+        start_time = time.perf_counter()
+        self.logger.info("Calculating Stochastic Oscillator of {} symbols...".format(len(rows)))
+        oscillator = stochastic_kernel(high_prices, data.get('low_prices'), data.get('closing_prices'),
+                                       self.k_period, self.d_period, intermediates=Intermediates.from_data(data))
+        K = oscillator["K"][:, -1]
+        D = oscillator["D"][:, -1]
+        if np.isnan(K).any():
+            self.logger.error("Highest high and lowest low are equal for {} symbols. Cannot calculate %K.".format(
+                np.isnan(K).sum()))
+
+        end_time = time.perf_counter()
+        elapsed_time = end_time - start_time
+        self.logger.info("Calculated Stochastic Oscillator of {} symbols in {:0.4f} seconds".format(
+            len(rows), elapsed_time))
+
+        return [{"K": K[i], "D": D[i], "K_values": oscillator["K"][i], "D_values": oscillator["D"][i]}
+                for i in range(len(rows))]
 
     def decide_signal(self, **data):
-        K, D = data.get("StochasticOscillator", {}).get("calculations", (np.nan, np.nan))
+        calculations = data.get("StochasticOscillator", {}).get("calculations", {})
+        K = calculations.get("K", np.nan)
+        D = calculations.get("D", np.nan)
         if np.isnan(K) or np.isnan(D):
             self.logger.error("Missing required data. Cannot decide signal.")
             return Constants.UNKNOWN_SIGNAL
@@ -135,5 +172,6 @@ if __name__ == "__main__":
         closing_prices = [float(price) for price in args.closing_prices.split(',')]
 
     stoc_osc_api = StochasticOscillator(args.interval, args.k_period, args.d_period, args.threshold)
-    K, D = stoc_osc_api.calculate(high_prices=high_prices, low_prices=low_prices, closing_prices=closing_prices)
-    signal = stoc_osc_api.decide_signal(StochasticOscillator={"calculations": (K, D)})
+    calculations = stoc_osc_api.calculate(high_prices=high_prices, low_prices=low_prices,
+                                          closing_prices=closing_prices)
+    signal = stoc_osc_api.decide_signal(StochasticOscillator={"calculations": calculations})
@@ -5,14 +5,109 @@ import argparse
 import time
 import random
 import talib
-import pandas as pd
+import numpy as np
 from indicators.base_indicator import BaseIndicator
+from indicators.incremental import IncrementalSupertrend
+from indicators.intermediates import Intermediates
 from scripts.constants import Constants
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
 
+# From this many parameter pairs on, the pairs are ratcheted together, bar by bar, on vectors
+VECTOR_MIN_PAIRS = 16
+
+
+def _ratchet(closing_prices, upper_band, lower_band):
+    """ Band-ratcheting recurrence of one parameter pair on plain floats. Updates the band lists in place.
+        A close above the previous upper band starts an uptrend, one below the previous lower band a downtrend.
+        Otherwise the trend carries on and its band may only tighten: the lower band in an uptrend never drops,
+        the upper band in a downtrend never rises. Comparisons with the NaN bands of the ATR warm-up are False.
+        Returns: List of in_uptrend flags
+    """
+    if not len(closing_prices):
+        return []
+    in_uptrend = [True] * len(closing_prices)
+    trend = True
+    previous_upper, previous_lower = upper_band[0], lower_band[0]
+    for current in range(1, len(closing_prices)):
+        close, upper, lower = closing_prices[current], upper_band[current], lower_band[current]
+        if close > previous_upper:
+            trend = True
+        elif close < previous_lower:
+            trend = False
+        elif trend:
+            if lower < previous_lower:
+                lower = lower_band[current] = previous_lower
+        elif upper > previous_upper:
+            upper = upper_band[current] = previous_upper
+        in_uptrend[current] = trend
+        previous_upper, previous_lower = upper, lower
+    return in_uptrend
+
+
+def _ratchet_pairs(closing_prices, upper_band, lower_band):
+    """ Same recurrence for (pairs, n) bands, all pairs at once in a single pass over the bars """
+    if not len(closing_prices):
+        return upper_band, lower_band, np.ones(upper_band.shape, dtype=bool)
+    upper_band, lower_band = upper_band.T.copy(), lower_band.T.copy()
+    in_uptrend = np.ones(upper_band.shape, dtype=bool)
+    trend = in_uptrend[0]
+    for current in range(1, len(closing_prices)):
+        close = closing_prices[current]
+        previous_upper, previous_lower = upper_band[current - 1], lower_band[current - 1]
+        upper, lower = upper_band[current], lower_band[current]
+        breakout_up = close > previous_upper
+        breakout_down = close < previous_lower
+        trend = breakout_up | (trend & ~breakout_down)
+        carry = ~(breakout_up | breakout_down)
+        np.copyto(lower, previous_lower, where=carry & trend & (lower < previous_lower))
+        np.copyto(upper, previous_upper, where=carry & ~trend & (upper > previous_upper))
+        in_uptrend[current] = trend
+    return upper_band.T, lower_band.T, in_uptrend.T
+
+
+def supertrend_kernel(high_prices, low_prices, closing_prices, lookback, multiplier, intermediates=None):
+    """ Input: Price series, lookback (ATR period) and multiplier. Both scalars, or equal-length sequences of
+               (lookback, multiplier) pairs to evaluate together, e.g. for tuning
+        Returns: {"atr", "upper_band", "lower_band", "in_uptrend"} arrays of shape (n), or (pairs, n) for sequences
+    """
+    high = np.asarray(high_prices, dtype=np.float64)
+    low = np.asarray(low_prices, dtype=np.float64)
+    close = np.asarray(closing_prices, dtype=np.float64)
+    single = np.ndim(lookback) == 0 and np.ndim(multiplier) == 0
+    lookbacks, multipliers = np.broadcast_arrays(np.atleast_1d(lookback), np.atleast_1d(multiplier))
+
+    atrs = {}
+    for period in set(lookbacks.tolist()):
+        atrs[period] = intermediates.atr(period) if intermediates is not None else \
+            talib.ATR(high, low, close, timeperiod=period)
+    atr = np.array([atrs[period] for period in lookbacks.tolist()]).reshape(len(lookbacks), len(close))
+    hl2 = (high + low) / 2
+    upper_band = hl2 + multipliers[:, None] * atr
+    lower_band = hl2 - multipliers[:, None] * atr
+
+    if len(lookbacks) >= VECTOR_MIN_PAIRS:
+        upper_band, lower_band, in_uptrend = _ratchet_pairs(close, upper_band, lower_band)
+    else:
+        closes = close.tolist()
+        rows = []
+        for upper, lower in zip(upper_band.tolist(), lower_band.tolist()):
+            in_uptrend = _ratchet(closes, upper, lower)
+            rows.append((upper, lower, in_uptrend))
+        upper_band = np.array([row[0] for row in rows], dtype=np.float64).reshape(atr.shape)
+        lower_band = np.array([row[1] for row in rows], dtype=np.float64).reshape(atr.shape)
+        in_uptrend = np.array([row[2] for row in rows], dtype=bool).reshape(atr.shape)
+
+    result = {"atr": atr, "upper_band": upper_band, "lower_band": lower_band, "in_uptrend": in_uptrend}
+    if single:
+        result = {key: value[0] for key, value in result.items()}
+    return result
+
+
 class Supertrend(BaseIndicator):
+    inputs = ('high_prices', 'low_prices', 'closing_prices')
+
     def __init__(self, lookback=10, multiplier=3, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -25,38 +120,9 @@ class Supertrend(BaseIndicator):
         self.lookback = lookback
         self.multiplier = multiplier
 
-    def supertrend(self, high_prices, low_prices, closing_prices, period, multiplier):
-        df = pd.DataFrame({
-            'high': high_prices,
-            'low': low_prices,
-            'close': closing_prices
-        })
-
-        hl2 = (df['high'] + df['low']) / 2
-        df['atr'] = talib.ATR(df['high'].values, df['low'].values, df['close'].values, timeperiod=period)
-        
-        df['upper_band'] = hl2 + multiplier * df['atr']
-        df['lower_band'] = hl2 - multiplier * df['atr']
-        
-        df['in_uptrend'] = True
-        
-        for current in range(1, len(df.index)):
-            previous = current - 1
-            
-            if df['close'][current] > df['upper_band'][previous]:
-                df['in_uptrend'][current] = True
-            elif df['close'][current] < df['lower_band'][previous]:
-                df['in_uptrend'][current] = False
-            else:
-                df.loc[current, 'in_uptrend'] = df.loc[previous, 'in_uptrend']
-                
-                if df['in_uptrend'][current] and df['lower_band'][current] < df['lower_band'][previous]:
-                    df.loc[current, 'lower_band'] = df.loc[previous, 'lower_band']
-                    
-                if not df['in_uptrend'][current] and df['upper_band'][current] > df['upper_band'][previous]:
-                    df['upper_band'][current] = df['upper_band'][previous]
-                    
-        return df
+    def supertrend(self, high_prices, low_prices, closing_prices, period, multiplier, intermediates=None):
+        """ Returns: {"atr", "upper_band", "lower_band", "in_uptrend"} arrays, see supertrend_kernel """
+        return supertrend_kernel(high_prices, low_prices, closing_prices, period, multiplier, intermediates=intermediates)
 
     def calculate(self, **data):
         start_time = time.perf_counter()
@@ -68,8 +134,11 @@ class Supertrend(BaseIndicator):
         self.logger.info("Lookback: {}".format(self.lookback))
         self.logger.info("Multiplier: {}".format(self.multiplier))
 
-        st = self.supertrend(high_prices, low_prices, closing_prices, self.lookback, self.multiplier)
-        self.logger.info("Supertrend:\n{}".format(st))
+        st = self.supertrend(high_prices, low_prices, closing_prices, self.lookback, self.multiplier,
+                             intermediates=Intermediates.from_data(data))
+        if len(st["upper_band"]):
+            self.logger.info("Supertrend upper band: {}, lower band: {}, uptrend: {}".format(
+                st["upper_band"][-1], st["lower_band"][-1], st["in_uptrend"][-1]))
 
         end_time = time.perf_counter()
         elapsed_time = end_time - start_time
@@ -77,19 +146,22 @@ class Supertrend(BaseIndicator):
         
         return st
 
+    def incremental(self):
+        return IncrementalSupertrend(self.lookback, self.multiplier)
+
     def decide_signal(self, **data):
-        st = data.get("Supertrend", {}).get("calculations", pd.DataFrame())
+        st = data.get("Supertrend", {}).get("calculations") or {}
         closing_prices = data.get("closing_prices", [])
-        if st.empty or not closing_prices:
+        if len(st.get("upper_band", [])) < 2 or len(closing_prices) < 2:
             self.logger.error("Missing required data. Cannot decide signal.")
             return Constants.UNKNOWN_SIGNAL
 
-        self.logger.info("Deciding Supertrend Indicator buy/sell/hold signal...")        
-        prev_st = st.shift(1)
-        self.logger.info("Previous Supertrend:\n{}".format(prev_st))
-        if closing_prices[-1] > st['upper_band'].iloc[-1] and prev_st['upper_band'].iloc[-1] <= closing_prices[-2]:
+        self.logger.info("Deciding Supertrend Indicator buy/sell/hold signal...")
+        upper_band, lower_band = st["upper_band"], st["lower_band"]
+        self.logger.info("Previous upper band: {}, lower band: {}".format(upper_band[-2], lower_band[-2]))
+        if closing_prices[-1] > upper_band[-1] and upper_band[-2] <= closing_prices[-2]:
             signal = Constants.BUY_SIGNAL
-        elif closing_prices[-1] < st['lower_band'].iloc[-1] and prev_st['lower_band'].iloc[-1] >= closing_prices[-2]:
+        elif closing_prices[-1] < lower_band[-1] and lower_band[-2] >= closing_prices[-2]:
             signal = Constants.SELL_SIGNAL
         else:
             signal = Constants.HOLD_SIGNAL
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3.5
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import talib
+from indicators.supertrend_indicator.supertrend import supertrend_kernel
+
+
+def supertrend_pandas(high_prices, low_prices, closing_prices, period, multiplier):
+    """ Reference: the row by row DataFrame loop Supertrend.supertrend used before supertrend_kernel """
+    df = pd.DataFrame({'high': high_prices, 'low': low_prices, 'close': closing_prices})
+    hl2 = (df['high'] + df['low']) / 2
+    df['atr'] = talib.ATR(df['high'].values, df['low'].values, df['close'].values, timeperiod=period)
+    df['upper_band'] = hl2 + multiplier * df['atr']
+    df['lower_band'] = hl2 - multiplier * df['atr']
+    df['in_uptrend'] = True
+    for current in range(1, len(df.index)):
+        previous = current - 1
+        if df['close'][current] > df['upper_band'][previous]:
+            df.loc[current, 'in_uptrend'] = True
+        elif df['close'][current] < df['lower_band'][previous]:
+            df.loc[current, 'in_uptrend'] = False
+        else:
+            df.loc[current, 'in_uptrend'] = df.loc[previous, 'in_uptrend']
+            if df['in_uptrend'][current] and df['lower_band'][current] < df['lower_band'][previous]:
+                df.loc[current, 'lower_band'] = df.loc[previous, 'lower_band']
+            if not df['in_uptrend'][current] and df['upper_band'][current] > df['upper_band'][previous]:
+                df.loc[current, 'upper_band'] = df.loc[previous, 'upper_band']
+    return df
+
+
+def max_difference(result, expected):
+    return max(np.nanmax(np.abs(result["upper_band"] - expected["upper_band"].to_numpy())),
+               np.nanmax(np.abs(result["lower_band"] - expected["lower_band"].to_numpy())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the Supertrend kernel with the DataFrame loop")
+    parser.add_argument('-n', '--bars', type=str, default="1000,10000,100000",
+                        help='Comma-separated numbers of bars',
+                        required=False)
+    parser.add_argument('--reference_max_bars', type=int, default=10000,
+                        help='Skip the (slow) DataFrame loop above this many bars',
+                        required=False)
+    parser.add_argument('-p', '--pairs', type=int, default=64,
+                        help='(lookback, multiplier) pairs evaluated together in the tuning run',
+                        required=False)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for bars in [int(n) for n in args.bars.split(',')]:
+        close = 100 + np.cumsum(rng.normal(0, 1, bars))
+        high = close + rng.random(bars)
+        low = close - rng.random(bars)
+
+        start_time = time.perf_counter()
+        result = supertrend_kernel(high, low, close, 10, 3)
+        kernel_time = time.perf_counter() - start_time
+        line = "{:>8} bars  kernel {:8.4f} s".format(bars, kernel_time)
+        if bars <= args.reference_max_bars:
+            start_time = time.perf_counter()
+            expected = supertrend_pandas(high, low, close, 10, 3)
+            reference_time = time.perf_counter() - start_time
+            assert (result["in_uptrend"] == expected["in_uptrend"].to_numpy()).all()
+            line += "  DataFrame loop {:8.4f} s  {:7.1f}x  max diff {:.2e}".format(
+                reference_time, reference_time / kernel_time, max_difference(result, expected))
+        print(line)
+
+        lookbacks = rng.integers(5, 30, args.pairs)
+        multipliers = rng.uniform(1, 5, args.pairs)
+        start_time = time.perf_counter()
+        together = supertrend_kernel(high, low, close, lookbacks, multipliers)
+        together_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        separate = [supertrend_kernel(high, low, close, int(lookback), multiplier)
+                    for lookback, multiplier in zip(lookbacks, multipliers)]
+        separate_time = time.perf_counter() - start_time
+        assert all((row["in_uptrend"] == together["in_uptrend"][i]).all() for i, row in enumerate(separate))
+        print("{:>8} bars  {} pairs together {:8.4f} s, one by one {:8.4f} s".format(
+            bars, args.pairs, together_time, separate_time))
@@ -13,6 +13,8 @@ from scripts.logger import setup_logger
 
 
 class Triangle(BaseIndicator):
+    inputs = ('opening_prices', 'high_prices', 'low_prices', 'closing_prices')
+
     def __init__(self, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
@@ -24,10 +26,10 @@ class Triangle(BaseIndicator):
         self.logger.debug("Is test: {}".format(is_test))
 
     def calculate(self, **data):
-        opening_prices = np.array(data.get('opening_prices'))
-        high_prices = np.array(data.get('high_prices'))
-        low_prices = np.array(data.get('low_prices'))
-        closing_prices = np.array(data.get('closing_prices'))
+        opening_prices = np.asarray(data.get('opening_prices'), dtype=np.float64)
+        high_prices = np.asarray(data.get('high_prices'), dtype=np.float64)
+        low_prices = np.asarray(data.get('low_prices'), dtype=np.float64)
+        closing_prices = np.asarray(data.get('closing_prices'), dtype=np.float64)
         start_time = time.perf_counter()
         self.logger.info("Calculating Triangle pattern...")
 
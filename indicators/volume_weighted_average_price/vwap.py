@@ -6,13 +6,75 @@ import time
 import random
 import numpy as np
 from indicators.base_indicator import BaseIndicator
+from indicators.incremental import IncrementalVWAP
 from scripts.constants import Constants
+from scripts.resampler import bucket_open_times
 from scripts.utils import get_timestamp
 from scripts.logger import setup_logger
 
+# session: reset at the start of every `session` interval (aligned like Binance klines), rolling: the last `window`
+# bars, anchored: from the `anchor` timestamp on, cumulative: the whole series
+VWAP_MODES = ('session', 'rolling', 'anchored', 'cumulative')
+
+
+def _restart_sums(cumulative, starts):
+    """ Restarts the cumulative sums (..., n) in place at every bar where `starts` (n) is True.
+        Sessions are few compared to bars, so each one is a single slice operation. The last session goes first,
+        so every session subtracts the original sum before its start
+    """
+    bounds = np.flatnonzero(starts).tolist()
+    ends = bounds[1:] + [cumulative.shape[-1]]
+    for start, end in reversed(list(zip(bounds, ends))):
+        if start:
+            cumulative[..., start:end] -= cumulative[..., start - 1:start]
+
+
+def vwap_kernel(closing_prices, volumes, mode=Constants.DEFAULT_VWAP_MODE, timestamps=None,
+                session=Constants.DEFAULT_VWAP_SESSION, window=None, anchor=None):
+    """ Input: Closing prices and volumes, (n) or (symbols, n), open times in ms (n) shared by all rows,
+               mode (see VWAP_MODES) and its parameter: session interval, window in bars or anchor timestamp in ms.
+               Without timestamps the series is one session and the anchor is a bar index
+        Returns: VWAP array of the same shape from cumulative sums of close * volume and volume.
+                 NaN before the first full window, before the anchor and where the volume is 0
+    """
+    closing_prices = np.asarray(closing_prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    value = np.cumsum(closing_prices * volumes, axis=-1)
+    volume = np.cumsum(volumes, axis=-1)
+    length = value.shape[-1]
+    first = 0
+    if mode == 'session':
+        if timestamps is not None and length:
+            buckets = bucket_open_times(timestamps, session)
+            starts = np.concatenate(([True], buckets[1:] != buckets[:-1]))
+            _restart_sums(value, starts)
+            _restart_sums(volume, starts)
+    elif mode == 'rolling':
+        if not window:
+            raise ValueError("Rolling VWAP needs a window")
+        value[..., window:] = value[..., window:] - value[..., :-window]
+        volume[..., window:] = volume[..., window:] - volume[..., :-window]
+        first = window - 1
+    elif mode == 'anchored':
+        if anchor is None:
+            raise ValueError("Anchored VWAP needs an anchor")
+        first = int(np.searchsorted(timestamps, anchor)) if timestamps is not None else int(anchor)
+        if 0 < first < length:
+            value = value - value[..., first - 1:first]
+            volume = volume - volume[..., first - 1:first]
+    elif mode != 'cumulative':
+        raise ValueError("Unknown VWAP mode '{}', expected one of {}".format(mode, VWAP_MODES))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vwap = np.where(volume != 0, value / volume, np.nan)
+    vwap[..., :first] = np.nan
+    return vwap
+
 
 class VWAP(BaseIndicator):
-    def __init__(self, is_test=True,
+    inputs = ('timestamps', 'closing_prices', 'volumes', 'current_price')
+
+    def __init__(self, mode=Constants.DEFAULT_VWAP_MODE, session=Constants.DEFAULT_VWAP_SESSION, window=None,
+                 anchor=None, is_test=True,
                  timestamp=get_timestamp(precision="day", separator="-")):
         log_name = os.path.basename(os.path.dirname(os.path.realpath(__file__)))
         self.logger = setup_logger(name=log_name,
@@ -21,28 +83,50 @@ class VWAP(BaseIndicator):
                                    )
         self.logger.debug("Timestamp: {}".format(timestamp))
         self.logger.debug("Is test: {}".format(is_test))
+        if mode not in VWAP_MODES:
+            raise ValueError("Unknown VWAP mode '{}', expected one of {}".format(mode, VWAP_MODES))
+        self.mode = mode
+        self.session = session
+        self.window = window
+        self.anchor = anchor
 
     def calculate(self, **data):
-        volumes = np.array(data.get('volumes'))
-        closing_prices = np.array(data.get('closing_prices'))
         start_time = time.perf_counter()
-        total_volume = sum(volumes)
-        self.logger.info("Total Volume: {}".format(total_volume))
-        total_value = (closing_prices * volumes).sum()
-        self.logger.info("Total Value: {}".format(total_value))
-        vwap = total_value / total_volume
+        self.logger.info("Mode: {}".format(self.mode))
+        vwap_values = vwap_kernel(data.get('closing_prices'), data.get('volumes'), self.mode,
+                                  timestamps=data.get('timestamps'), session=self.session, window=self.window,
+                                  anchor=self.anchor)
+        vwap = vwap_values[-1] if len(vwap_values) else np.nan
         self.logger.info("Volume Weighted Average Price (VWAP): {}".format(vwap))
 
         end_time = time.perf_counter()
         elapsed_time = end_time - start_time
         self.logger.info("Calulated Volume Weighted Average Price (VWAP) in {:0.4f} seconds".format(elapsed_time))
         
-        return vwap
+        # Latest value for decide_signal, full series under vwap_values
+        return {"vwap": vwap, "vwap_values": vwap_values}
+
+    def calculate_batch(self, rows, **data):
+        start_time = time.perf_counter()
+        self.logger.info("Mode: {}, {} symbols".format(self.mode, len(rows)))
+        vwap_values = vwap_kernel(data.get('closing_prices'), data.get('volumes'), self.mode,
+                                  timestamps=data.get('timestamps'), session=self.session, window=self.window,
+                                  anchor=self.anchor)
+
+        end_time = time.perf_counter()
+        elapsed_time = end_time - start_time
+        self.logger.info("Calulated Volume Weighted Average Price (VWAP) of {} symbols in {:0.4f} seconds".format(
+            len(rows), elapsed_time))
+
+        return [{"vwap": values[-1] if len(values) else np.nan, "vwap_values": values} for values in vwap_values]
+
+    def incremental(self):
+        return IncrementalVWAP(self.mode, self.session, self.window, self.anchor)
 
     def decide_signal(self, **data):
-        vwap = data.get("VWAP", {}).get("calculations", {})
+        vwap = data.get("VWAP", {}).get("calculations", {}).get("vwap")
         current_price = data.get("current_price", "")
-        if not vwap or not current_price:
+        if not vwap or np.isnan(vwap) or not current_price:
             self.logger.error("Missing required data. Cannot decide signal.")
             return Constants.UNKNOWN_SIGNAL
 
@@ -66,6 +150,12 @@ if __name__ == "__main__":
     parser.add_argument('-V', '--volumes', type=str,
                         help='Comma-separated list of volumes',
                         required=False)
+    parser.add_argument('-m', '--mode', type=str, default='cumulative', choices=VWAP_MODES,
+                        help='VWAP mode. The prices given here have no timestamps, so a session is the whole series')
+    parser.add_argument('-w', '--window', type=int, default=None,
+                        help='Bars of the rolling VWAP')
+    parser.add_argument('-a', '--anchor', type=int, default=None,
+                        help='Bar index the anchored VWAP starts at')
     parser.add_argument('--use_mock', action='store_true', default=False,
                         help='Add this argument to run mock example',
                         required=False)
@@ -80,6 +170,6 @@ if __name__ == "__main__":
         volumes = [float(volume) for volume in args.volumes.split(',')]
         closing_prices = [float(price) for price in args.closing_prices.split(',')]
 
-    vwap_api = VWAP()
-    vwap = vwap_api.calculate(volumes=volumes, closing_prices=closing_prices)
-    signal = vwap_api.decide_signal(VWAP={"calculations": vwap}, current_price=closing_prices[-1])
+    vwap_api = VWAP(mode=args.mode, window=args.window, anchor=args.anchor)
+    calculations = vwap_api.calculate(volumes=volumes, closing_prices=closing_prices)
+    signal = vwap_api.decide_signal(VWAP={"calculations": calculations}, current_price=closing_prices[-1])
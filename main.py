@@ -3,15 +3,32 @@
 import os
 import sys
 import time
+import asyncio
 import argparse
-import pandas as pd
-from multiprocessing import Pool, Manager
+import numpy as np
+from multiprocessing import Pool, TimeoutError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from binance.client import Client
 from binance.exceptions import BinanceAPIException, BinanceRequestException
+from binance.helpers import date_to_milliseconds, interval_to_milliseconds
 from scripts.constants import Constants
 from scripts.logger import setup_logger
-from scripts.utils import get_timestamp, load_config, save_data_to_csv
+from scripts.kline_store import KlineStore
+from scripts.market_stream import MarketStream
+from scripts.daemon import BarCloseDaemon
+from scripts.async_fetcher import AsyncMarketFetcher
+from scripts.market_snapshot import MarketSnapshot
+from scripts.resampler import TimeframeResampler
+from scripts.shared_data import SharedMarketData
+from scripts.metrics import metrics
+from scripts.deadline import Deadline, apply_last_good
+from scripts.journal import RunJournal
+from indicators.indicator_graph import IndicatorGraph
+from scripts.worker import (init_worker, build_indicators, build_stage_runner, imap_indicators,
+                            run_sentiment_analyzers)
+from scripts.rate_limiter import RateLimiter, BinanceScheduler, ORDER, order_book_weight
 from scripts.strategy_factory import StrategyFactory
+from scripts.utils import get_timestamp, load_config
 from gpt.gpt import make_trade_decision
 from gpt.bing import get_market_news
 
@@ -30,6 +47,22 @@ class TradingAPI(Client):
         self.logger.info("Kline interval: {}".format(self.config["kline_interval"]))
         self.logger.info("Kline start: {}".format(self.config["kline_start"]))
         self.data = {}
+        self.kline_store = KlineStore(root=os.path.join(Constants.PROJECT_ROOT,
+                                                        self.config.get("kline_store_dir", Constants.KLINE_STORE_DIR)))
+        self.logger.info("Kline store: {}".format(self.kline_store.root))
+        self.shared_data = SharedMarketData()
+        # All REST calls share one request weight budget, across processes
+        self.rate_limiter = RateLimiter(weight_per_minute=self.config.get("rate_limit_weight_per_minute",
+                                                                          Constants.BINANCE_REQUEST_WEIGHT_PER_MINUTE),
+                                        orders_per_10s=self.config.get("rate_limit_orders_per_10s",
+                                                                       Constants.BINANCE_ORDERS_PER_10S))
+        self.scheduler = BinanceScheduler(self.rate_limiter, self.logger)
+        self.fetcher = AsyncMarketFetcher(self.kline_store, self.scheduler, self.logger,
+                                          testnet=self.config["testnet"],
+                                          max_concurrency=self.config.get("max_concurrency",
+                                                                          Constants.DEFAULT_FETCH_CONCURRENCY),
+                                          orderbook_depth=self.config.get("orderbook_depth",
+                                                                          Constants.DEFAULT_ORDERBOOK_DEPTH))
         self.logger.info("Initializing trading API...")
         try:
             self.client = Client(os.environ.get('BINANCE_KEY'),
@@ -39,157 +72,312 @@ class TradingAPI(Client):
             self.logger.error(f"Failed to initialize Binance client: {e}")
             sys.exit(1)
 
-        # Indicator APIs
-        self.indicators = []
-        for indicator_config in self.config["indicators"]:
-            if indicator_config["enable"]:
-                class_name = indicator_config["name"]
-                params = indicator_config.get("parameters", {})
-                instance = StrategyFactory.create_strategy(class_name, **params)
-                self.indicators.append(instance)
-        # Sentiment APIs
-        self.sentiment_analyzers = []
-        for sentiment_config in self.config["sentiment_analyzers"]:
-            if sentiment_config["enable"]:
-                class_name = sentiment_config["name"]
-                params = sentiment_config.get("parameters", {})
-                instance = StrategyFactory.create_strategy(class_name, **params)
-                self.sentiment_analyzers.append(instance)
+        # Indicator APIs. Pool workers build their own (see scripts/worker.py), these only describe the setup
+        self.indicators = build_indicators(self.config)
+        IndicatorGraph(self.indicators, self.logger)  # Fails early on dependency cycles
+        self.logger.info("Strategy import times:\n{}".format("\n".join(StrategyFactory.import_report())))
+
+        # News and GPT calls run within time budgets, see scripts/deadline.py
+        self.stages = build_stage_runner(self.config, self.logger)
+        self.last_sentiment = {}
+        # Signals, indicator values, sentiment, decisions and orders of every evaluation, queryable across runs
+        self.journal = RunJournal(root=os.path.join(Constants.PROJECT_ROOT,
+                                                    self.config.get("journal_dir", Constants.JOURNAL_DIR)),
+                                  logger=self.logger, run=self.timestamp)
+
+        # Per-stage latency histograms, exported as a Prometheus textfile or a JSON snapshot
+        self.metrics_path = os.path.join(Constants.PROJECT_ROOT, self.config.get("metrics_path", Constants.METRICS_PATH))
+        self.metrics_format = self.config.get("metrics_format", "prometheus")
+        if self.config.get("metrics_interval"):
+            metrics.start_exporter(self.metrics_path, self.metrics_format, self.config["metrics_interval"])
 
     def run(self):
         init_time = time.perf_counter()
-        manager = Manager()
-        self.data = manager.dict()
+        self.data = {}
         self.logger.info("Fetching historical price data...")
-        # Fetch data
-        for sym in self.config["symbols"]:
-            with Pool() as pool:
-                self.data[sym] = pool.apply(self.fetch_data, args=(sym, ))
-                
-        with Pool() as p:
-            for sym in self.config["symbols"]:
-                if sym not in self.data:
-                    continue
+        # Fetch data for all symbols concurrently
+        start_ms = date_to_milliseconds(self.config["kline_start"])
+        fetched = self.fetcher.fetch(self.config["symbols"], self.config["kline_interval"], start_ms)
+        for sym, result in fetched.items():
+            try:
+                snapshot = self.load_market_data(sym, result, start_ms)
+            except Exception as e:
+                self.logger.error("Failed to load market data for '%s'. Skipping. Error: %s", sym, str(e))
+                continue
+            if not len(snapshot):
+                self.logger.warning("No {} bars for {} since {}. Skipping.".format(self.config["kline_interval"], sym,
+                                                                                 self.config["kline_start"]))
+                continue
+            self.data[sym] = snapshot
                 
-                # Sentiment analysis
-                self.data[sym]["sentiment"] = p.apply_async(self.process_sentiment_analyzer, args=(sym,)).get()
-                # Indicator calculations, signal detection
-                self.data[sym]["indicators"] = p.apply(self.process_indicators, args=(self.data[sym],))
-                # Bing's latest market news
-                self.data[sym]["market_news"] = get_market_news(sym, self.logger)
-                # GPT trade decision
-                self.data[sym]["decision"] = make_trade_decision(sym, self.data[sym])
-                # Execute the trade based of decision
-                self.execute_trades(self.data[sym]["decision"])
-        
-        save_data_to_csv(self.data)
+        with self.shared_data, self.journal, self.worker_pool() as p:
+            snapshots = {sym: self.data[sym] for sym in self.config["symbols"] if sym in self.data}
+            for sym, data in self.evaluate_all(snapshots, p):
+                self.data[sym] = data
 
         app_shutdown = time.perf_counter()
         total_time = app_shutdown - init_time
+        metrics.observe("run_seconds", total_time)
+        self.export_metrics()
         self.logger.info("Total time for app run: %.2f seconds" % total_time)
-    
-    def fetch_data(self, sym):
-        data = {}
-        self.logger.info("Loading % price data..." % sym)
+
+    def stream(self):
+        """ Streaming mode: evaluates every symbol on each kline close from the websocket market stream """
+        interval = self.config["kline_interval"]
+        default_url = Constants.TESTNET_STREAM_URL if self.config["testnet"] else Constants.STREAM_URL
+        market_stream = MarketStream(self.config["symbols"], interval, None, self.logger,
+                                     url=self.config.get("stream_url", default_url),
+                                     buffer_size=self.config.get("stream_buffer_size",
+                                                                 Constants.DEFAULT_STREAM_BUFFER_SIZE),
+                                     fetch_order_book=lambda sym: self.scheduler.call(
+                                         self.client.get_order_book, symbol=sym,
+                                         limit=Constants.ORDERBOOK_SNAPSHOT_DEPTH,
+                                         weight=order_book_weight(Constants.ORDERBOOK_SNAPSHOT_DEPTH)),
+                                     fetch_klines=lambda sym, start_ms: self.scheduler.call(
+                                         self.client.get_klines, symbol=sym, interval=interval, startTime=start_ms,
+                                         limit=Constants.KLINE_FETCH_LIMIT, weight=Constants.BINANCE_KLINES_WEIGHT),
+                                     record_path=self.config.get("stream_record_path"))
+
+        # Higher timeframes used by indicators are resampled incrementally from the streamed bars
+        buffer_size = self.config.get("stream_buffer_size", Constants.DEFAULT_STREAM_BUFFER_SIZE)
+        timeframes = {indicator.interval for indicator in self.indicators} - {interval}
+        resamplers = {sym: [TimeframeResampler(interval, timeframe, buffer_size) for timeframe in timeframes]
+                      for sym in self.config["symbols"]}
+
+        # Seed the ring buffers with the closed bars of the kline store, after fetching the bars missed since
+        # the last run
+        start_ms = date_to_milliseconds(self.config["kline_start"])
+        last_closed_ms = date_to_milliseconds("now UTC") - interval_to_milliseconds(interval)
+        fetched = self.fetcher.fetch(self.config["symbols"], interval, start_ms)
+        stored_until = {}
+        for sym in self.config["symbols"]:
+            if sym in fetched:
+                self.kline_store.append(sym, interval, fetched[sym]["klines"],
+                                        covered_from=fetched[sym]["fetched_from"])
+                market_stream.current_prices[sym] = fetched[sym]["current_price"]
+            open_times, ohlcv = self.kline_store.read(sym, interval, start_ms=start_ms, end_ms=last_closed_ms)
+            market_stream.buffers[sym].extend(open_times, ohlcv)
+            stored_until[sym] = open_times[-1] if len(open_times) else -1
+            for resampler in resamplers[sym]:
+                resampler.update(open_times, ohlcv)
+            self.logger.info("Seeded {} stream buffer with {} bars".format(sym, market_stream.buffers[sym].size))
+
+        with self.shared_data, self.journal, self.worker_pool() as p:
+            async def on_bar_close(sym):
+                # Copied, the ring buffer goes on taking bars while the symbol is evaluated
+                open_times, ohlcv = (array.copy() for array in market_stream.buffers[sym].view())
+                loop = asyncio.get_running_loop()
+                # Streamed bars are stored too, so the next run or restart only fetches what it missed
+                new = open_times > stored_until[sym]
+                if new.any():
+                    await loop.run_in_executor(None, self.kline_store.write, sym, interval,
+                                               open_times[new], np.ascontiguousarray(ohlcv[:, new]))
+                    stored_until[sym] = open_times[-1]
+                order_book = market_stream.order_books[sym].copy(self.config.get("orderbook_depth",
+                                                                                 Constants.DEFAULT_ORDERBOOK_DEPTH))
+                current_price = market_stream.current_prices.get(sym)
+                derived = {}
+                for resampler in resamplers[sym]:
+                    # Bars the resampler has seen already are skipped
+                    resampler.update(open_times, ohlcv)
+                    derived[resampler.interval] = MarketSnapshot(sym, resampler.interval, *resampler.view(),
+                                                                 current_price=current_price,
+                                                                 order_book=order_book)
+                snapshot = self.build_snapshot(sym, open_times, ohlcv, current_price, order_book,
+                                               timeframes=derived)
+                data = await loop.run_in_executor(None, self.evaluate, sym, snapshot, p)
+                if data is not None:
+                    self.data[sym] = data
+                self.export_metrics()
+
+            market_stream.on_bar_close = on_bar_close
+            self.logger.info("Streaming {} market data from {}...".format(interval, market_stream.url))
+            asyncio.run(market_stream.run())
+
+    def daemon(self):
+        """ Daemon mode: keeps the workers, the HTTP session and the caches warm and evaluates every symbol
+            with a newly closed bar right after each kline_interval boundary
+        """
+        symbols = self.config["symbols"]
+        interval = self.config["kline_interval"]
+        interval_ms = interval_to_milliseconds(interval)
+        if interval_ms is None:
+            raise ValueError("Daemon mode needs a fixed-length kline_interval, got '{}'".format(interval))
+        close_delay = self.config.get("daemon_close_delay", Constants.DAEMON_CLOSE_DELAY)
+
+        loop = asyncio.new_event_loop()
+        # Keep idle connections open across bars so every wake-up skips the TCP and TLS handshakes
+        client = loop.run_until_complete(self.fetcher.create_client(keepalive_timeout=2 * interval_ms / 1000))
+        # Workers are recycled now and then, so leaks in third-party libraries can't grow over weeks of uptime
+        pool = self.worker_pool(maxtasksperchild=self.config.get("worker_max_tasks",
+                                                                 Constants.DAEMON_WORKER_MAX_TASKS))
         try:
-            bars = self.client.get_historical_klines(sym, self.config["kline_interval"],
-                                                        self.config["kline_start"])
-            data["klines"] = bars
-        except Exception as e:
-            self.logger.error("Failed to fetch data for '%s'. Skipping. Error: %s", sym, str(e))
+            with self.shared_data, self.journal, pool as p:
+                daemon = BarCloseDaemon(symbols, interval, self.kline_store,
+                                        lambda syms, start_ms: loop.run_until_complete(
+                                            self.fetcher.fetch_all(syms, interval, start_ms, client=client)),
+                                        self.build_snapshot, lambda snapshots: self.evaluate_all(snapshots, p),
+                                        self.logger, close_delay=close_delay)
+                self.logger.info("Daemon started. Evaluating {} symbols on every {} close".format(len(symbols),
+                                                                                                  interval))
+                while True:
+                    close_ms = daemon.wait_for_close()
+                    start_ms = date_to_milliseconds(self.config["kline_start"])
+                    for sym, data in daemon.evaluate_bar(close_ms, start_ms):
+                        self.data[sym] = data
+                    self.export_metrics()
+        finally:
+            loop.run_until_complete(client.close_connection())
+            loop.close()
+
+    def worker_pool(self, maxtasksperchild=None):
+        """ Returns: Pool whose workers build their indicators once and read market data from shared memory """
+        return Pool(processes=self.config.get("workers"), initializer=init_worker,
+                    initargs=(self.config, self.timestamp), maxtasksperchild=maxtasksperchild)
+
+    def evaluate(self, sym, snapshot, pool):
+        """ Returns: Evaluation data of a single symbol, or None if it failed """
+        return dict(self.evaluate_all({sym: snapshot}, pool)).get(sym)
+
+    def indicator_batches(self, snapshots):
+        """ Returns: Lists of SnapshotDescriptors for run_indicator_batch, at most indicator_batch_size symbols each
+                     and enough batches to keep every worker busy
+        """
+        # Sorting by interval and open times puts the symbols whose bars line up in the same batches
+        ordered = sorted(snapshots.values(), key=lambda snapshot: (
+            snapshot.interval, len(snapshot), int(snapshot.timestamps[0]) if len(snapshot) else 0,
+            int(snapshot.timestamps[-1]) if len(snapshot) else 0))
+        workers = self.config.get("workers") or os.cpu_count() or 1
+        batch_size = max(min(self.config.get("indicator_batch_size", Constants.DEFAULT_INDICATOR_BATCH_SIZE),
+                             -(-len(ordered) // workers)), 1)
+        return [[self.shared_data.publish(snapshot) for snapshot in ordered[start:start + batch_size]]
+                for start in range(0, len(ordered), batch_size)]
+
+    def calculate_indicators(self, snapshots, pool):
+        """ Input: {symbol: MarketSnapshot}
+            Returns: Iterator of (symbol, indicator results) in order of completion, see imap_indicators
+        """
+        # Only the descriptors of the shared OHLCV arrays are sent to the workers
+        if self.config.get("batch_indicators"):
+            return imap_indicators(pool, self.indicator_batches(snapshots), self.logger, batched=True)
+        return imap_indicators(pool, [self.shared_data.publish(snapshot) for snapshot in snapshots.values()],
+                               self.logger)
+
+    def evaluate_all(self, snapshots, pool):
+        """ Input: {symbol: MarketSnapshot}
+            Returns: Generator of (symbol, evaluation data) in order of completion. Failed symbols are logged and skipped
+        """
+        start_time = time.perf_counter()
+        # Seconds every symbol gets, counted from the start of its own sentiment task and of its decision,
+        # so symbols whose indicators finish late still get their full budget
+        budget = self.config.get("deadline", Constants.DEFAULT_DEADLINE)
+        indicators = self.calculate_indicators(snapshots, pool)
+        # Sentiment analysis is queued behind the indicators, which the decisions need first
+        sentiment = {sym: pool.apply_async(run_sentiment_analyzers, args=(sym, budget)) for sym in snapshots}
+
+        with ThreadPoolExecutor(max_workers=self.config.get("decision_threads",
+                                                            Constants.DEFAULT_DECISION_THREADS)) as executor:
+            futures = {}
+            # Indicator calculations, signal detection. Workers send back the metrics they recorded
+            for sym, results in indicators:
+                data = {"snapshot": snapshots[sym], "indicators": results}
+                # News, GPT and orders wait on the network, so they run on threads while the workers go on
+                futures[executor.submit(self.decide, sym, data, sentiment[sym], budget)] = sym
+            indicators_time = time.perf_counter() - start_time
+            self.logger.info("Calculated indicators for {} symbols in {:0.2f} seconds ({:0.1f} symbols/s)".format(
+                len(futures), indicators_time, len(futures) / indicators_time if indicators_time else 0))
+
+            for future in as_completed(futures):
+                sym = futures[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    self.logger.error("Failed to evaluate '%s'. Error: %s", sym, str(e))
+                    continue
+                metrics.observe("evaluate_seconds", time.perf_counter() - start_time)
+                self.journal.record(sym, data)
+                yield sym, data
+
+    def decide(self, sym, data, sentiment, budget):
+        """ Input: Evaluation data with the indicator results, AsyncResult of the symbol's sentiment analysis,
+                   seconds the decision may take from now
+            Inputs that could not be refreshed in time are replaced by their last good value and listed in data["stale"].
+            The last good values are kept here in the main process, whichever worker analyzed the symbol
+        """
+        deadline = Deadline.after(budget)
+        last_sentiment = self.last_sentiment.setdefault(sym, {})
+        try:
+            results, worker_metrics = sentiment.get(timeout=deadline.remaining())
+            metrics.merge(worker_metrics)
+            data["sentiment"] = apply_last_good(results, last_sentiment)
+        except TimeoutError:
+            self.logger.warning("Sentiment analysis of {} missed the deadline. Using the last scores.".format(sym))
+            data["sentiment"] = {name: dict(result, stale=True) for name, result in last_sentiment.items()}
+        data["stale"] = sorted(name for name, result in data["sentiment"].items() if result["stale"])
+        # Bing's latest market news
+        with metrics.timer("news_seconds"):
+            data["market_news"], stale = self.stages.run("news", "news", sym, deadline,
+                                                         get_market_news, sym, self.logger)
+        if stale:
+            data["stale"].append("news")
+        # GPT trade decision. A decision that comes too late is dropped instead of being replaced by an old one
+        with metrics.timer("decision_seconds"):
+            data["decision"], stale = self.stages.run("decision", "gpt", sym, deadline,
+                                                      make_trade_decision, sym, data, fallback=False)
+        if data["decision"] is None:
+            self.logger.warning("No trade decision for {} before the deadline. Not trading.".format(sym))
             return data
-        
-        df = self.convert_to_dataframe(self.data[sym]["klines"])
-        start_index = 0 
-        end_index = len(df) - 1
-
-        self.logger.info("Fetching {} opening prices...".format(sym))
-        opening_prices = df['open']
-        opening_price = df.iloc[start_index]['open']
-        self.logger.info("{} opening price: {}".format(sym, opening_price))
-        data["opening_prices"] = opening_prices
-        data["opening_price"] = opening_price
-
-        self.logger.info("Fetching {} high prices...".format(sym))
-        high_prices = df['high']
-        # To get highest price over a specific period: high_prices.rolling(period_length).max().iloc[-1]
-        highest_price = high_prices.max()
-        self.logger.info("{} highest price: {}".format(sym, highest_price))
-        data["high_prices"] = high_prices
-        data["highest_price"] = highest_price
-        
-        self.logger.info("Fetching {} low prices...".format(sym))
-        low_prices = df['low']
-        lowest_price = low_prices.min()
-        self.logger.info("{} lowest price: {}".format(sym, lowest_price))
-        data["low_prices"] = low_prices
-        data["lowest_price"] = lowest_price
-
-        self.logger.info("Fetching {} closing prices...".format(sym))
-        closing_prices = df['close']
-        closing_price = closing_prices.iloc[-1]
-        data["closing_prices"] = closing_prices
-        self.logger.info("Latest {} closing price for interval: {}".format(sym, closing_price))
-        data["closing_prices"] = closing_prices
-        data["closing_price"] = closing_price
-
-        # This should be the same as the last closing price
-        self.logger.info("Fetching {} current price...".format(sym))
-        current_price = self.client.get_symbol_ticker(sym)["price"]
-        self.logger.info("Current {} price: {}".format(sym, current_price))
-        data["current_price"] = current_price
-
-        self.logger.info("Fetching {} volumes...".format(sym))
-        volumes = df['volume']
-        data["volumes"] = volumes
-
-        self.logger.info("Fetching {} order book...".format(sym))
-        order_book = self.client.get_order_book(symbol=sym, limit=Constants.DEFAULT_ORDERBOOK_DEPTH)
-        data["order_book"] = order_book
-        
+        # Execute the trade based of decision
+        self.execute_trades(data["decision"])
         return data
 
-    def convert_to_dataframe(self, klines):
-        self.logger.info("Converting data to dataframe...")
-        df = pd.DataFrame(klines,
-                          columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignored'])
-        df = df.drop(columns=['close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignored'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df.set_index('timestamp', inplace=True)
-        return df
-
-    def process_indicators(self, data):
-        results = {}
-        for indicator in self.indicators:
-            try:
-                results[indicator.name] = {"calculations": indicator.calculate(data) }
-                results[indicator.name] = {"signal": indicator.decide_signal(results[indicator.name]["calculations"]) }
-            except Exception as e:
-                self.logger.error("Failed to calculate indicator '%s'. Error: %s", indicator.name, str(e))
-        return results
-    
-    def process_sentiment_analyzer(self, symbol):
-        results = {}
-        for analyzer in self.sentiment_analyzers:
-            try:
-                results[analyzer.name] = { "sentiment": analyzer.analyze(symbol) }
-                results[analyzer.name] = { "sentiment_score": analyzer.get_scores(results[analyzer.name]["sentiment"]) }
-            except Exception as e:
-                self.logger.error("Failed to analyze sentiment for '%s'. Error: %s", analyzer.name, str(e))
-        return results
+    def export_metrics(self):
+        try:
+            metrics.export(self.metrics_path, self.metrics_format)
+        except OSError as e:
+            self.logger.error("Failed to export metrics to '%s'. Error: %s", self.metrics_path, str(e))
     
+    def load_market_data(self, sym, fetched, start_ms, end_ms=None):
+        interval = self.config["kline_interval"]
+        self.logger.info("Loading %s price data..." % sym)
+        self.kline_store.append(sym, interval, fetched["klines"], covered_from=fetched.get("fetched_from"))
+        open_times, ohlcv = self.kline_store.read(sym, interval, start_ms=start_ms, end_ms=end_ms)
+        return self.build_snapshot(sym, open_times, ohlcv, fetched["current_price"], fetched["order_book"])
+
+    def build_snapshot(self, sym, open_times, ohlcv, current_price, order_book, timeframes=None):
+        snapshot = MarketSnapshot(sym, self.config["kline_interval"], open_times, ohlcv,
+                                  current_price=current_price, order_book=order_book, timeframes=timeframes)
+        self.logger.info("{} bars: {}".format(sym, len(snapshot)))
+        if not len(snapshot):
+            return snapshot
+        self.logger.info("{} opening price: {}".format(sym, snapshot.opening_price))
+        self.logger.info("{} highest price: {}".format(sym, snapshot.highest_price))
+        self.logger.info("{} lowest price: {}".format(sym, snapshot.lowest_price))
+        self.logger.info("Latest {} closing price for interval: {}".format(sym, snapshot.closing_price))
+        self.logger.info("Current {} price: {}".format(sym, snapshot.current_price))
+        return snapshot
+
     def execute_trades(self, decision_dict):
         for symbol, data in decision_dict.items():
             decision = data["decision"]
             quantity = data["quantity"]
+            if decision == Constants.BUY_SIGNAL:
+                place_order = self.client.order_market_buy
+            elif decision == Constants.SELL_SIGNAL:
+                place_order = self.client.order_market_sell
+            else:
+                self.logger.info("No order for {}. Decision: {}".format(symbol, decision))
+                continue
             try:
-                if decision == Constants.BUY:
-                    order = self.client.order_market_buy(symbol, quantity=quantity)
-                elif decision == Constants.SELL:
-                    order = self.client.order_market_sell(symbol, quantity=quantity)
-                self.logger.info(f"Placed {decision} order for {symbol}: {order}")
+                # Order methods take every request parameter by keyword
+                order = self.scheduler.call(place_order, symbol=symbol, quantity=quantity,
+                                            weight=Constants.BINANCE_ORDER_WEIGHT, priority=ORDER)
             except Exception as e:
                 self.logger.error("Failed to execute trade for '%s'. Error: %s", symbol, str(e))
+                continue
+            self.logger.info(f"Placed {decision} order for {symbol}: {order}")
+            self.journal.record_order(symbol, decision, quantity, order)
+            metrics.increment("orders_total", side=decision)
 
 
 if __name__ == "__main__":
@@ -197,7 +385,18 @@ if __name__ == "__main__":
     parser.add_argument('-c', '--config', type=str, default="config.yaml",
                         help='Path to config file to run',
                         required=False)
+    parser.add_argument('--stream', action='store_true', default=False,
+                        help='Run continuously on the websocket market stream instead of a single REST run',
+                        required=False)
+    parser.add_argument('--daemon', action='store_true', default=False,
+                        help='Stay up and evaluate all symbols right after every kline_interval close',
+                        required=False)
     args = parser.parse_args()
 
     api = TradingAPI(args.config)
-    api.run()
\ No newline at end of file
+    if args.stream:
+        api.stream()
+    elif args.daemon:
+        api.daemon()
+    else:
+        api.run()
\ No newline at end of file
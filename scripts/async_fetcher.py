@@ -0,0 +1,101 @@
+#!/usr/bin/env python3.5
+
+import os
+import time
+import asyncio
+import aiohttp
+from binance import AsyncClient
+from binance.helpers import date_to_milliseconds, interval_to_milliseconds
+from scripts.constants import Constants
+from scripts.rate_limiter import order_book_weight
+
+
+class AsyncMarketFetcher:
+    """ Fetches klines, ticker and order book for all symbols concurrently over a single
+        keep-alive HTTP session, with at most `max_concurrency` requests in flight.
+        Every request is charged its weight through `scheduler` (see scripts/rate_limiter.py).
+    """
+    def __init__(self, kline_store, scheduler, logger, testnet=True,
+                 max_concurrency=Constants.DEFAULT_FETCH_CONCURRENCY,
+                 orderbook_depth=Constants.DEFAULT_ORDERBOOK_DEPTH):
+        self.kline_store = kline_store
+        self.scheduler = scheduler
+        self.logger = logger
+        self.testnet = testnet
+        self.max_concurrency = max_concurrency
+        self.orderbook_depth = orderbook_depth
+
+    def fetch(self, symbols, interval, start_ms):
+        """ Returns: {symbol: {"klines": [...], "fetched_from": int, "current_price": str, "order_book": {...}}}
+                     for every symbol that was fetched successfully
+        """
+        return asyncio.run(self.fetch_all(symbols, interval, start_ms))
+
+    async def create_client(self, keepalive_timeout=Constants.HTTP_KEEPALIVE_TIMEOUT):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=keepalive_timeout)
+        return await AsyncClient.create(os.environ.get('BINANCE_KEY'),
+                                        os.environ.get('BINANCE_SECRET'),
+                                        testnet=self.testnet,
+                                        session_params={"connector": connector})
+
+    async def fetch_all(self, symbols, interval, start_ms, client=None):
+        """ Input: Optional client to reuse across calls (see create_client). Otherwise one is created and closed """
+        start_time = time.perf_counter()
+        own_client = client is None
+        if own_client:
+            client = await self.create_client()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            results = await asyncio.gather(*[self.fetch_symbol(client, semaphore, sym, interval, start_ms)
+                                             for sym in symbols],
+                                           return_exceptions=True)
+        finally:
+            if own_client:
+                await client.close_connection()
+
+        fetched = {}
+        for sym, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                self.logger.error("Failed to fetch data for '%s'. Skipping. Error: %s", sym, str(result))
+                continue
+            fetched[sym] = result
+        elapsed_time = time.perf_counter() - start_time
+        self.logger.info("Fetched market data for {} symbols in {:0.4f} seconds".format(len(fetched), elapsed_time))
+        return fetched
+
+    async def fetch_symbol(self, client, semaphore, sym, interval, start_ms):
+        (fetched_from, klines), ticker, order_book = await asyncio.gather(
+            self.fetch_klines(client, semaphore, sym, interval, start_ms),
+            self._call(semaphore, client.get_symbol_ticker, symbol=sym,
+                       weight=Constants.BINANCE_TICKER_PRICE_WEIGHT),
+            self._call(semaphore, client.get_order_book, symbol=sym, limit=self.orderbook_depth,
+                       weight=order_book_weight(self.orderbook_depth)),
+        )
+        return {"klines": klines, "fetched_from": fetched_from, "current_price": ticker["price"],
+                "order_book": order_book}
+
+    async def fetch_klines(self, client, semaphore, sym, interval, start_ms):
+        """ Fetches only the klines missing from the local kline store since start_ms
+            Returns: (open time the klines were requested from, klines)
+        """
+        # Reads the store's coverage index from disk, off the event loop
+        fetch_from = await asyncio.get_running_loop().run_in_executor(None, self.kline_store.fetch_start,
+                                                                      sym, interval, start_ms)
+        requested_from = fetch_from
+        missing_bars = (date_to_milliseconds("now UTC") - fetch_from) // interval_to_milliseconds(interval) + 1
+        self.logger.info("Fetching {} missing {} {} klines...".format(missing_bars, sym, interval))
+        # One request per page, each charged on its own so a long window never exceeds the limiter capacity.
+        # Skips the earliest-timestamp lookup get_historical_klines makes
+        klines = []
+        while True:
+            page = await self._call(semaphore, client.get_klines, symbol=sym, interval=interval,
+                                    startTime=fetch_from, limit=Constants.KLINE_FETCH_LIMIT,
+                                    weight=Constants.BINANCE_KLINES_WEIGHT)
+            klines.extend(page)
+            if len(page) < Constants.KLINE_FETCH_LIMIT:
+                return requested_from, klines
+            fetch_from = page[-1][0] + 1
+
+    async def _call(self, semaphore, method, *args, weight=1, **kwargs):
+        async with semaphore:
+            return await self.scheduler.call_async(method, *args, weight=weight, **kwargs)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3.5
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import aiohttp
+import numpy as np
+from binance import AsyncClient
+from binance.helpers import date_to_milliseconds, interval_to_milliseconds
+from scripts.constants import Constants
+from scripts.logger import setup_logger
+from scripts.utils import load_config
+from scripts.kline_store import KlineStore
+from scripts.kline_decoder import decode_klines
+from scripts.rate_limiter import RateLimiter, BinanceScheduler
+
+
+class Backfill:
+    """ Downloads klines for a date range in chunks of KLINE_FETCH_LIMIT bars, up to
+        `max_concurrency` chunks at a time through the shared rate limiter.
+        Chunks are aligned to a fixed grid and buffered per symbol; every `flush_chunks` chunks the
+        buffer is written to the kline store and the chunk start times are added to a JSON
+        checkpoint, so an interrupted backfill resumes with the chunks it has not stored yet.
+    """
+    def __init__(self, kline_store, scheduler, logger, testnet=True,
+                 max_concurrency=Constants.DEFAULT_FETCH_CONCURRENCY,
+                 flush_chunks=Constants.BACKFILL_FLUSH_CHUNKS, checkpoint_path=None):
+        self.kline_store = kline_store
+        self.scheduler = scheduler
+        self.logger = logger
+        self.testnet = testnet
+        self.max_concurrency = max_concurrency
+        self.flush_chunks = flush_chunks
+        self.checkpoint_path = checkpoint_path or os.path.join(kline_store.root, 'backfill_checkpoint.json')
+        self.checkpoint = self.load_checkpoint()
+        self.bars = 0
+        self.failed = 0
+        self.start_time = None
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, 'r') as f:
+            return json.load(f)
+
+    def save_checkpoint(self):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def done_chunks(self, symbol, interval):
+        return self.checkpoint.setdefault(interval, {}).setdefault(symbol, [])
+
+    def chunks(self, symbol, interval, start_ms, end_ms):
+        """ Returns: Start times of the chunks covering [start_ms, end_ms] that are not stored yet """
+        chunk_ms = Constants.KLINE_FETCH_LIMIT * interval_to_milliseconds(interval)
+        first = start_ms // chunk_ms * chunk_ms
+        done = set(self.done_chunks(symbol, interval))
+        return [chunk_start for chunk_start in range(first, end_ms + 1, chunk_ms) if chunk_start not in done]
+
+    def run(self, symbols, interval, start_ms, end_ms):
+        return asyncio.run(self.run_async(symbols, interval, start_ms, end_ms))
+
+    async def run_async(self, symbols, interval, start_ms, end_ms):
+        queue = asyncio.Queue()
+        for symbol in symbols:
+            chunks = self.chunks(symbol, interval, start_ms, end_ms)
+            self.logger.info("{} {}: {} chunks to download".format(symbol, interval, len(chunks)))
+            for chunk_start in chunks:
+                queue.put_nowait((symbol, chunk_start))
+        total_chunks = queue.qsize()
+
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=Constants.HTTP_KEEPALIVE_TIMEOUT)
+        client = await AsyncClient.create(os.environ.get('BINANCE_KEY'),
+                                          os.environ.get('BINANCE_SECRET'),
+                                          testnet=self.testnet,
+                                          session_params={"connector": connector})
+        buffers = {symbol: [] for symbol in symbols}
+        self.bars = 0
+        self.failed = 0
+        self.start_time = time.perf_counter()
+        try:
+            await asyncio.gather(*[self.download(client, queue, buffers, interval, end_ms)
+                                   for _ in range(self.max_concurrency)])
+        finally:
+            await client.close_connection()
+            for symbol in symbols:
+                self.flush(symbol, interval, buffers[symbol])
+
+        elapsed_time = time.perf_counter() - self.start_time
+        self.logger.info("Backfilled {} bars in {} chunks in {:0.2f} seconds ({:0.0f} bars/s)".format(
+            self.bars, total_chunks - self.failed, elapsed_time, self.bars / max(elapsed_time, 1e-9)))
+        if self.failed:
+            self.logger.warning("{} chunks failed. Run the backfill again to resume them".format(self.failed))
+        return self.bars
+
+    async def download(self, client, queue, buffers, interval, end_ms):
+        chunk_ms = Constants.KLINE_FETCH_LIMIT * interval_to_milliseconds(interval)
+        while not queue.empty():
+            symbol, chunk_start = queue.get_nowait()
+            try:
+                klines = await self.scheduler.call_async(client.get_klines, symbol=symbol, interval=interval,
+                                                         startTime=chunk_start,
+                                                         endTime=min(chunk_start + chunk_ms - 1, end_ms),
+                                                         limit=Constants.KLINE_FETCH_LIMIT,
+                                                         weight=Constants.BINANCE_KLINES_WEIGHT)
+            except Exception as e:
+                # Left out of the checkpoint, the next run picks it up again
+                self.logger.error("Failed to download {} chunk at {}. Skipping. Error: {}".format(
+                    symbol, chunk_start, str(e)))
+                self.failed += 1
+                continue
+            # The chunk holding end_ms is incomplete, store it but don't checkpoint it
+            complete = chunk_start + chunk_ms - 1 <= end_ms
+            buffers[symbol].append((chunk_start, complete, decode_klines(klines)))
+            self.bars += len(klines)
+            if len(buffers[symbol]) >= self.flush_chunks:
+                self.flush(symbol, interval, buffers[symbol])
+
+    def flush(self, symbol, interval, buffer):
+        """ Writes the buffered chunks of a symbol to the kline store, then checkpoints them """
+        if not buffer:
+            return
+        chunks = [decoded for _, _, decoded in buffer if len(decoded[0])]
+        # Complete chunks are covered even without bars (e.g. before the listing), the chunk holding end_ms
+        # up to its last bar
+        chunk_ms = Constants.KLINE_FETCH_LIMIT * interval_to_milliseconds(interval)
+        covered = [(chunk_start, chunk_start + chunk_ms - interval_to_milliseconds(interval) if complete
+                    else open_times.max()) for chunk_start, complete, (open_times, _) in buffer
+                   if complete or len(open_times)]
+        if chunks:
+            self.kline_store.write(symbol, interval, np.concatenate([open_times for open_times, _ in chunks]),
+                                   np.concatenate([ohlcv for _, ohlcv in chunks], axis=1), covered=covered)
+        elif covered:
+            self.kline_store.cover(symbol, interval, covered)
+        self.done_chunks(symbol, interval).extend(chunk_start for chunk_start, complete, _ in buffer if complete)
+        self.save_checkpoint()
+        buffer.clear()
+        elapsed_time = time.perf_counter() - self.start_time
+        self.logger.info("{} bars downloaded ({:0.0f} bars/s)".format(self.bars, self.bars / max(elapsed_time, 1e-9)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download historical klines into the local kline store")
+    parser.add_argument('-c', '--config', type=str, default="config.yaml",
+                        help='Path to config file with the kline store, testnet and rate limit settings',
+                        required=False)
+    parser.add_argument('-s', '--symbols', type=str,
+                        help='Comma-separated list of symbols (default: symbols of the config)',
+                        required=False)
+    parser.add_argument('-i', '--interval', type=str, default='1m',
+                        help='Kline interval to backfill (default: 1m)')
+    parser.add_argument('--start', type=str, required=True,
+                        help='Start date, e.g. "1 Jan, 2020"')
+    parser.add_argument('--end', type=str, default="now UTC",
+                        help='End date (default: now UTC)')
+    parser.add_argument('--checkpoint', type=str,
+                        help='Path to the checkpoint file (default: backfill_checkpoint.json in the kline store)',
+                        required=False)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    logger = setup_logger(name="backfill", is_test=config["testnet"])
+    kline_store = KlineStore(root=os.path.join(Constants.PROJECT_ROOT,
+                                               config.get("kline_store_dir", Constants.KLINE_STORE_DIR)))
+    rate_limiter = RateLimiter(weight_per_minute=config.get("rate_limit_weight_per_minute",
+                                                            Constants.BINANCE_REQUEST_WEIGHT_PER_MINUTE),
+                               orders_per_10s=config.get("rate_limit_orders_per_10s",
+                                                         Constants.BINANCE_ORDERS_PER_10S))
+    backfill = Backfill(kline_store, BinanceScheduler(rate_limiter, logger), logger, testnet=config["testnet"],
+                        max_concurrency=config.get("max_concurrency", Constants.DEFAULT_FETCH_CONCURRENCY),
+                        checkpoint_path=args.checkpoint)
+    symbols = args.symbols.split(',') if args.symbols else config["symbols"]
+    backfill.run(symbols, args.interval, date_to_milliseconds(args.start), date_to_milliseconds(args.end))
@@ -38,10 +38,65 @@ class Constants():
                                    ["1 Dec, 2017", "1 Jan, 2018"], #  klines for the last month of 2017
                                    '1 Jan, 2017', # Since NEOBTC was listed
                                    ]
+    KLINE_STORE_DIR = os.path.join(PROJECT_ROOT, 'data', 'klines')
+    KLINE_STORE_MAX_SEGMENTS = 64
+    KLINE_FETCH_LIMIT = 1000  # Max klines per REST request
+    BACKFILL_FLUSH_CHUNKS = 100  # Chunks buffered per symbol before writing a kline store segment
+    DEFAULT_FETCH_CONCURRENCY = 10
+    DEFAULT_DECISION_THREADS = 16
+    DEFAULT_INDICATOR_BATCH_SIZE = 64  # Max symbols per worker task when batch_indicators is on
+    JOURNAL_DIR = os.path.join(PROJECT_ROOT, 'trades')
+    JOURNAL_BATCH_SIZE = 1000  # Rows per write transaction
+    JOURNAL_FLUSH_INTERVAL = 1.0  # Seconds after which queued rows are written even if the batch isn't full
+    DEFAULT_DEADLINE = 45  # Seconds per symbol, counted from the start of its own sentiment task and decision
+    DEFAULT_STAGE_BUDGETS = {'sentiment': 15, 'news': 10, 'decision': 20}  # Seconds per external call
+    DEFAULT_STAGE_THREADS = 32
+    CIRCUIT_BREAKER_FAILURES = 3  # Consecutive failures or timeouts after which a source is no longer called
+    CIRCUIT_BREAKER_RESET_TIMEOUT = 300  # Seconds before an open circuit breaker lets a trial call through
+    HTTP_KEEPALIVE_TIMEOUT = 60
+
+    # REST rate limits, see https://binance-docs.github.io/apidocs/spot/en/#limits
+    BINANCE_REQUEST_WEIGHT_PER_MINUTE = 6000
+    BINANCE_ORDERS_PER_10S = 50
+    BINANCE_KLINES_WEIGHT = 2
+    BINANCE_TICKER_PRICE_WEIGHT = 2
+    BINANCE_ORDER_WEIGHT = 1
+    BINANCE_DEPTH_WEIGHTS = [(100, 5), (500, 25), (1000, 50), (5000, 250)]  # (max limit, weight)
+    RATE_LIMITER_NAME = 'crypto_trader_rate_limiter'
+    RATE_LIMITER_ORDER_RESERVE = 50  # Weight market data requests leave free for orders
+    RATE_LIMITER_POLL_INTERVAL = 0.05
+    RATE_LIMITER_LOCK_RETRY = 0.001  # Seconds the event loop waits before retrying a limiter lock another process holds
+    RATE_LIMITER_DEFAULT_BACKOFF = 60  # Seconds to pause on 429/418 without a Retry-After header
+    RATE_LIMITER_RETRIES = 3
+
+    STREAM_URL = 'wss://stream.binance.com:9443'
+    TESTNET_STREAM_URL = 'wss://testnet.binance.vision'
+    DEFAULT_STREAM_BUFFER_SIZE = 1000
+    STREAM_MAX_BACKOFF = 60
+
+    METRICS_PATH = os.path.join(PROJECT_ROOT, 'logs', 'metrics.prom')
+    METRICS_PREFIX = 'crypto_trader_'
+    METRICS_EXPORT_INTERVAL = 15  # Seconds
+    METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                               1, 2.5, 5, 10, 30, 60)
+
+    DAEMON_CLOSE_DELAY = 0.5  # Seconds to wait after a bar closes before fetching it
+    DAEMON_WORKER_MAX_TASKS = 1000  # Tasks after which a daemon worker process is replaced
+
     DEFAULT_PERIOD_LENGTH = 14
     DEFAULT_ORDERBOOK_DEPTH = 5
+    ORDERBOOK_SNAPSHOT_DEPTH = 1000  # Depth of the REST snapshot a local order book is synced from
+    ORDERBOOK_RESNAPSHOT_INTERVAL = 1.0  # Min seconds between REST snapshot attempts of one order book
+    ORDERBOOK_MAX_BUFFERED_EVENTS = 1000  # Diff events kept while an order book waits for a snapshot
     RSI_SELL_THRESHOLD = 70
     RSI_BUY_THRESHOLD = 30
+    DEFAULT_PIVOT_WINDOW = 5  # Bars in the centered window a swing high/low must be the extreme of
+    HEAD_SHOULDERS_TOLERANCE = 0.5  # Max shoulder difference as a fraction of the head's height over the neckline
+    HEAD_SHOULDERS_MAX_AGE = 10  # Bars since the right shoulder within which a head and shoulders signals
+    DOUBLE_TOP_BOTTOM_TOLERANCE = 0.1  # Max difference of the two tops (bottoms) as a fraction of the swing height
+    DOUBLE_TOP_BOTTOM_MAX_AGE = 10  # Bars since the second top (bottom) within which a double top (bottom) signals
+    DEFAULT_VWAP_MODE = 'session'
+    DEFAULT_VWAP_SESSION = '1d'  # VWAP resets at the open of every bar of this interval (UTC days)
 
     DEFAULT_TWEET_COUNT = 100
 
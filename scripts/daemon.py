@@ -0,0 +1,98 @@
+#!/usr/bin/env python3.5
+
+import time
+import numpy as np
+from binance.helpers import interval_to_milliseconds
+from scripts.constants import Constants
+from scripts.kline_decoder import decode_klines
+from scripts.market_stream import OHLCVRingBuffer
+from scripts.metrics import metrics
+
+
+class BarCloseDaemon:
+    """ Evaluates every symbol with a newly closed bar right after each kline_interval boundary.
+        The closed bars of every symbol are kept in memory between bar closes: the kline store is read once per
+        symbol, afterwards only the bars of each fetch that closed since are appended to its OHLCVRingBuffer.
+        `fetch_all(symbols, start_ms)` returns the AsyncMarketFetcher results, `build_snapshot(symbol, open_times,
+        ohlcv, current_price, order_book)` a MarketSnapshot and `evaluate_all(snapshots)` yields (symbol, data).
+        `clock` provides time() and sleep(), the time module by default.
+    """
+    def __init__(self, symbols, interval, kline_store, fetch_all, build_snapshot, evaluate_all, logger,
+                 close_delay=Constants.DAEMON_CLOSE_DELAY, clock=time):
+        self.symbols = symbols
+        self.interval = interval
+        self.interval_ms = interval_to_milliseconds(interval)
+        if self.interval_ms is None:
+            raise ValueError("Daemon mode needs a fixed-length kline_interval, got '{}'".format(interval))
+        self.kline_store = kline_store
+        self.fetch_all = fetch_all
+        self.build_snapshot = build_snapshot
+        self.evaluate_all = evaluate_all
+        self.logger = logger
+        self.close_delay = close_delay
+        self.clock = clock
+        self.buffers = {}
+        self.last_evaluated = {}
+
+    def wait_for_close(self):
+        """ Sleeps until close_delay seconds after the next bar close
+            Returns: Close time of that bar in milliseconds
+        """
+        close_ms = (int(self.clock.time() * 1000) // self.interval_ms + 1) * self.interval_ms
+        self.clock.sleep(max(close_ms / 1000 - self.clock.time(), 0) + self.close_delay)
+        return close_ms
+
+    def closed_bars(self, sym, fetched, start_ms, end_ms):
+        """ Stores the fetched klines and appends those opened after the last bar in memory up to end_ms
+            Returns: (open_times, ohlcv) of the bars opened from start_ms to end_ms, as views into the buffer
+        """
+        self.kline_store.append(sym, self.interval, fetched["klines"], covered_from=fetched.get("fetched_from"))
+        buffer = self.buffers.get(sym)
+        if buffer is not None:
+            open_times, ohlcv = decode_klines(fetched["klines"])
+            new = (open_times > buffer.last_open_time()) & (open_times <= end_ms)
+            if new.any() and open_times[new][0] != buffer.last_open_time() + self.interval_ms:
+                self.logger.warning("{} klines do not follow the bars in memory. Reading the store".format(sym))
+                buffer = None
+            else:
+                buffer.extend(open_times[new], ohlcv[:, new])
+        if buffer is None:
+            open_times, ohlcv = self.kline_store.read(sym, self.interval, start_ms=start_ms, end_ms=end_ms)
+            buffer = OHLCVRingBuffer(capacity=max((end_ms - start_ms) // self.interval_ms + 1, 1))
+            buffer.extend(open_times, ohlcv)
+            if buffer.size:
+                self.buffers[sym] = buffer
+
+        open_times, ohlcv = buffer.view()
+        first = np.searchsorted(open_times, start_ms)
+        return open_times[first:], ohlcv[:, first:]
+
+    def evaluate_bar(self, close_ms, start_ms):
+        """ Fetches and evaluates every symbol not evaluated for the bar closed at close_ms yet
+            Yields: (symbol, evaluation data)
+        """
+        bar_open_ms = close_ms - self.interval_ms
+        pending = [sym for sym in self.symbols if self.last_evaluated.get(sym) != bar_open_ms]
+        if not pending:
+            return
+        fetched = self.fetch_all(pending, start_ms)
+        snapshots = {}
+        for sym, result in fetched.items():
+            try:
+                # Closed bars only, the bar that just opened has hardly traded yet
+                open_times, ohlcv = self.closed_bars(sym, result, start_ms, bar_open_ms)
+                snapshot = self.build_snapshot(sym, open_times, ohlcv, result["current_price"], result["order_book"])
+            except Exception as e:
+                self.logger.error("Failed to load market data for '%s'. Skipping. Error: %s", sym, str(e))
+                continue
+            if not len(snapshot) or snapshot.timestamps[-1] < bar_open_ms:
+                self.logger.warning("No closed {} bar for {} yet. Skipping.".format(self.interval, sym))
+                continue
+            snapshots[sym] = snapshot
+
+        for sym, data in self.evaluate_all(snapshots):
+            self.last_evaluated[sym] = bar_open_ms
+            latency = self.clock.time() - close_ms / 1000
+            metrics.observe("bar_close_latency_seconds", latency)
+            self.logger.info("{} decision latency: {:0.3f} seconds after bar close".format(sym, latency))
+            yield sym, data
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3.5
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from scripts.constants import Constants
+from scripts.metrics import metrics
+
+
+class Deadline:
+    """ Absolute wall clock deadline, so it can be handed to pool workers and keep its meaning there """
+    def __init__(self, expires_at):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds, start=None):
+        """ Input: Seconds from `start` (a time.time() value, defaults to now) """
+        return cls((time.time() if start is None else start) + seconds)
+
+    def remaining(self):
+        return max(self.expires_at - time.time(), 0.0)
+
+    def expired(self):
+        return self.remaining() == 0
+
+    def budget(self, seconds=None):
+        """ Returns: Time a stage may take: its own budget, cut short by the deadline """
+        return self.remaining() if seconds is None else min(seconds, self.remaining())
+
+
+def apply_last_good(results, last_good):
+    """ Input: {source: {..., "stale": bool}} of one key, stale results carrying no value,
+               {source: result} of the last good results of that key, updated in place
+        Returns: The fresh results, and for every stale source the last good result marked stale if there is one
+    """
+    applied = {}
+    for source, result in results.items():
+        if not result["stale"]:
+            last_good[source] = applied[source] = result
+        elif source in last_good:
+            applied[source] = dict(last_good[source], stale=True)
+    return applied
+
+
+class CircuitBreaker:
+    """ Stops calling a source after `failure_threshold` consecutive failures or timeouts.
+        After `reset_timeout` seconds a single trial call is let through: success closes the breaker,
+        failure opens it again.
+    """
+    def __init__(self, name, failure_threshold=Constants.CIRCUIT_BREAKER_FAILURES,
+                 reset_timeout=Constants.CIRCUIT_BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        """ Returns: True if this failure opened the breaker """
+        with self._lock:
+            self.failures += 1
+            reopened = self._trial
+            self._trial = False
+            if reopened or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class StageRunner:
+    """ Runs calls to external sources (sentiment APIs, news, GPT) within time budgets.
+        A call that overruns its budget is abandoned: the caller moves on with the last good value of that
+        source, marked stale. The call itself can't be interrupted and finishes on its thread in the background.
+        Every source has a circuit breaker, so a source that keeps timing out is not called at all until it
+        has had time to recover.
+    """
+    def __init__(self, logger, budgets=None, failure_threshold=Constants.CIRCUIT_BREAKER_FAILURES,
+                 reset_timeout=Constants.CIRCUIT_BREAKER_RESET_TIMEOUT, max_workers=Constants.DEFAULT_STAGE_THREADS):
+        self.logger = logger
+        self.budgets = dict(Constants.DEFAULT_STAGE_BUDGETS, **(budgets or {}))
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage")
+        self.breakers = {}
+        self.cache = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, source):
+        with self._lock:
+            if source not in self.breakers:
+                self.breakers[source] = CircuitBreaker(source, self.failure_threshold, self.reset_timeout)
+            return self.breakers[source]
+
+    def run(self, stage, source, key, deadline, fn, *args, fallback=True, **kwargs):
+        """ Input: Stage whose budget applies, source the breaker and cache belong to, cache key (e.g. symbol)
+            Returns: (value, stale). On overrun, failure or an open breaker the value is the last good value
+                     for (source, key), or None if there is none or `fallback` is False
+        """
+        breaker = self.breaker(source)
+        timeout = deadline.budget(self.budgets.get(stage))
+        if timeout <= 0:
+            self.logger.warning("No time left for {} of {}. Using the last value.".format(source, key))
+        elif not breaker.allow():
+            metrics.increment("circuit_open_total", source=source)
+            self.logger.warning("Circuit breaker of {} is open. Using the last value for {}.".format(source, key))
+        else:
+            future = self.executor.submit(fn, *args, **kwargs)
+            try:
+                with metrics.timer("external_seconds", source=source):
+                    value = future.result(timeout=timeout)
+            except TimeoutError:
+                future.cancel()
+                metrics.increment("timeouts_total", source=source)
+                self.logger.warning("{} of {} overran its {:0.1f}s budget. Using the last value.".format(
+                    source, key, timeout))
+                self._record_failure(breaker)
+            except Exception as e:
+                self.logger.error("%s of %s failed. Using the last value. Error: %s", source, key, str(e))
+                self._record_failure(breaker)
+            else:
+                breaker.record_success()
+                with self._lock:
+                    self.cache[(source, key)] = value
+                return value, False
+        with self._lock:
+            return (self.cache.get((source, key)) if fallback else None), True
+
+    def _record_failure(self, breaker):
+        if breaker.record_failure():
+            self.logger.warning("Circuit breaker of {} opened. Not calling it for {}s.".format(
+                breaker.name, breaker.reset_timeout))
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3.5
+
+import os
+import json
+import glob
+import time
+import queue
+import sqlite3
+import datetime
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from scripts.constants import Constants
+
+
+# Table -> columns. Every table also has `recorded_at` (epoch ms), `run` and `symbol`
+SCHEMA = {
+    "signals": (("bar_time", "INTEGER"), ("indicator", "TEXT"), ("signal", "TEXT")),
+    "indicator_values": (("bar_time", "INTEGER"), ("indicator", "TEXT"), ("key", "TEXT"), ("value", "REAL")),
+    "sentiment": (("analyzer", "TEXT"), ("score", "REAL"), ("score_text", "TEXT"), ("stale", "INTEGER")),
+    "decisions": (("bar_time", "INTEGER"), ("decision", "TEXT"), ("quantity", "REAL"), ("stale", "TEXT"),
+                  ("raw", "TEXT")),
+    "orders": (("side", "TEXT"), ("quantity", "REAL"), ("response", "TEXT")),
+}
+COMMON_COLUMNS = (("recorded_at", "INTEGER"), ("run", "TEXT"), ("symbol", "TEXT"))
+
+
+def _json(value):
+    return json.dumps(value, default=str)
+
+
+def _number(value):
+    if isinstance(value, (bool, np.bool_)):
+        return float(value)
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    # Quantities often come as strings, like Binance sends them
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def tail_values(value, key=""):
+    """ Input: Indicator calculations: scalars, arrays, Series/DataFrames, tuples or dicts of those
+        Returns: Generator of (key, float) with the latest value of every numeric series
+    """
+    if isinstance(value, dict):
+        for name, item in value.items():
+            yield from tail_values(item, "{}.{}".format(key, name) if key else str(name))
+    elif isinstance(value, tuple):
+        for i, item in enumerate(value):
+            yield from tail_values(item, "{}.{}".format(key, i) if key else str(i))
+    elif isinstance(value, pd.DataFrame):
+        if len(value):
+            yield from tail_values(value.iloc[-1].to_dict(), key)
+    elif isinstance(value, (pd.Series, np.ndarray, list)):
+        if isinstance(value, pd.Series):
+            value = value.to_numpy()
+        if len(value):
+            last = value[-1]
+            # A 2-D array holds one series per row
+            if isinstance(value, np.ndarray) and value.ndim > 1:
+                last = tuple(value[..., -1])
+            yield from tail_values(last, key)
+    else:
+        number = _number(value)
+        if number is not None:
+            yield key or "value", number
+
+
+class RunJournal:
+    """ Append-only journal of evaluations and orders in SQLite databases running in WAL mode.
+        Records are partitioned by date, with one <YYYYMMDD>.sqlite file per UTC day, and by symbol through an
+        indexed column. `record` only queues the evaluation. A background thread flattens it into typed rows
+        and writes them in batches, so the trading loop never waits for the disk.
+    """
+    def __init__(self, root=Constants.JOURNAL_DIR, logger=None, run=None,
+                 batch_size=Constants.JOURNAL_BATCH_SIZE, flush_interval=Constants.JOURNAL_FLUSH_INTERVAL):
+        self.root = root
+        self.logger = logger
+        self.run = run
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._connections = {}
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, symbol, data):
+        """ Input: Evaluation data of a symbol: {"snapshot", "indicators", "sentiment", "decision", ...} """
+        self._put(("evaluation", symbol, data, int(time.time() * 1000)))
+
+    def record_order(self, symbol, side, quantity, response):
+        self._put(("order", symbol, (side, quantity, response), int(time.time() * 1000)))
+
+    def _put(self, item):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_forever, name="journal-writer", daemon=True)
+            self._thread.start()
+        self._queue.put(item)
+
+    def close(self):
+        """ Writes everything queued so far and closes the databases """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def rows(self, kind, symbol, payload, recorded_at):
+        """ Returns: [(table, row)] of one queued item """
+        common = (recorded_at, self.run, symbol)
+        if kind == "order":
+            side, quantity, response = payload
+            return [("orders", common + (side, _number(quantity), _json(response)))]
+
+        rows = []
+        snapshot = payload.get("snapshot")
+        bar_time = int(snapshot.timestamps[-1]) if snapshot is not None and len(snapshot.timestamps) else None
+        for indicator, result in (payload.get("indicators") or {}).items():
+            signal = result.get("signal")
+            rows.append(("signals", common + (bar_time, indicator,
+                                              signal if isinstance(signal, str) or signal is None else _json(signal))))
+            for key, value in tail_values(result.get("calculations")):
+                rows.append(("indicator_values", common + (bar_time, indicator, key, value)))
+        for analyzer, result in (payload.get("sentiment") or {}).items():
+            score = result.get("sentiment_score")
+            rows.append(("sentiment", common + (analyzer, _number(score),
+                                                None if _number(score) is not None else _json(score),
+                                                int(bool(result.get("stale"))))))
+        stale = _json(payload.get("stale") or [])
+        for decision_symbol, decision in (payload.get("decision") or {}).items():
+            rows.append(("decisions", (recorded_at, self.run, decision_symbol, bar_time, decision.get("decision"),
+                                       _number(decision.get("quantity")), stale, _json(decision))))
+        return rows
+
+    def _write_forever(self):
+        pending, closing = [], False
+        while not closing:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                closing = True
+            elif item:
+                kind, symbol, payload, recorded_at = item
+                try:
+                    pending.extend((recorded_at, table, row) for table, row in self.rows(kind, symbol,
+                                                                                        payload, recorded_at))
+                except Exception as e:
+                    self._log_error("Failed to journal {} of {}. Error: {}".format(kind, symbol, e))
+            if pending and (closing or not item or len(pending) >= self.batch_size):
+                self._flush(pending)
+                pending = []
+        for connection in self._connections.values():
+            connection.close()
+        self._connections = {}
+
+    def _flush(self, pending):
+        batches = {}
+        for recorded_at, table, row in pending:
+            batches.setdefault((self._date(recorded_at), table), []).append(row)
+        for (date, table), rows in batches.items():
+            try:
+                connection = self._connection(date)
+                with connection:
+                    connection.executemany("INSERT INTO {} VALUES ({})".format(
+                        table, ", ".join("?" * len(rows[0]))), rows)
+            except sqlite3.Error as e:
+                self._log_error("Failed to write {} {} rows. Error: {}".format(len(rows), table, e))
+
+    def _connection(self, date):
+        if date not in self._connections:
+            os.makedirs(self.root, exist_ok=True)
+            connection = sqlite3.connect(os.path.join(self.root, date + ".sqlite"))
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for table, columns in SCHEMA.items():
+                connection.execute("CREATE TABLE IF NOT EXISTS {} ({})".format(
+                    table, ", ".join("{} {}".format(*column) for column in COMMON_COLUMNS + columns)))
+                connection.execute("CREATE INDEX IF NOT EXISTS {0}_symbol ON {0} (symbol, recorded_at)".format(table))
+            connection.commit()
+            self._connections[date] = connection
+        return self._connections[date]
+
+    @staticmethod
+    def _date(recorded_at):
+        return datetime.datetime.utcfromtimestamp(recorded_at / 1000).strftime('%Y%m%d')
+
+    def _log_error(self, message):
+        if self.logger is not None:
+            self.logger.error(message)
+
+    def query(self, table, symbol=None, start=None, end=None):
+        """ Input: Table name, optional symbol and datetime (or epoch ms) bounds on recorded_at, inclusive
+            Returns: DataFrame of the matching rows of every date partition in range
+        """
+        if table not in SCHEMA:
+            raise ValueError("Unknown journal table: {}. Options: {}".format(table, ", ".join(SCHEMA)))
+        start_ms, end_ms = (None if bound is None else _epoch_ms(bound) for bound in (start, end))
+        conditions, params = [], []
+        for condition, param in (("symbol = ?", symbol), ("recorded_at >= ?", start_ms), ("recorded_at <= ?", end_ms)):
+            if param is not None:
+                conditions.append(condition)
+                params.append(param)
+        sql = "SELECT * FROM {}{} ORDER BY recorded_at".format(
+            table, " WHERE " + " AND ".join(conditions) if conditions else "")
+
+        frames = []
+        for path in sorted(glob.glob(os.path.join(self.root, "*.sqlite"))):
+            date = os.path.splitext(os.path.basename(path))[0]
+            if (start_ms is not None and date < self._date(start_ms)) or \
+                    (end_ms is not None and date > self._date(end_ms)):
+                continue
+            with sqlite3.connect("file:{}?mode=ro".format(path), uri=True) as connection:
+                frames.append(pd.read_sql_query(sql, connection, params=params))
+        columns = [name for name, _ in COMMON_COLUMNS + SCHEMA[table]]
+        frames = [frame for frame in frames if len(frame)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def _epoch_ms(value):
+    if isinstance(value, (int, float, np.integer)):
+        return int(value)
+    # Naive times are taken as UTC
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the run journal")
+    parser.add_argument('-t', '--table', type=str, default="decisions", choices=sorted(SCHEMA),
+                        help='Journal table to query',
+                        required=False)
+    parser.add_argument('-s', '--symbol', type=str, default=None,
+                        help='Only rows of this symbol',
+                        required=False)
+    parser.add_argument('--start', type=str, default=None,
+                        help='Only rows recorded from this UTC time on, e.g. "2024-01-01" or "2024-01-01 12:00"',
+                        required=False)
+    parser.add_argument('--end', type=str, default=None,
+                        help='Only rows recorded until this UTC time',
+                        required=False)
+    parser.add_argument('-d', '--dir', type=str, default=Constants.JOURNAL_DIR,
+                        help='Journal directory',
+                        required=False)
+    args = parser.parse_args()
+
+    with pd.option_context('display.max_rows', None, 'display.width', None):
+        print(RunJournal(args.dir).query(args.table, args.symbol, args.start, args.end))
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3.5
+
+import itertools
+import numpy as np
+
+
+def decode_klines(klines):
+    """ Input: Raw klines as returned by the Binance REST API
+               [open_time, "open", "high", "low", "close", "volume", close_time, ...]
+        Returns: (open_times int64[n], ohlcv float64[5, n])
+        Parses the string columns straight into a float64 buffer in one pass, without
+        building an intermediate DataFrame or object array.
+    """
+    n = len(klines)
+    open_times = np.fromiter((kline[0] for kline in klines), dtype=np.int64, count=n)
+    values = np.fromiter(itertools.chain.from_iterable(kline[1:6] for kline in klines),
+                         dtype=np.float64, count=5 * n)
+    return open_times, np.ascontiguousarray(values.reshape(n, 5).T)
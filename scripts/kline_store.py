@@ -0,0 +1,164 @@
+#!/usr/bin/env python3.5
+
+import os
+import glob
+import numpy as np
+from binance.helpers import interval_to_milliseconds
+from scripts.constants import Constants
+from scripts.kline_decoder import decode_klines
+from scripts.metrics import metrics
+
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class KlineStore:
+    """ Local columnar kline store keyed by (symbol, interval).
+        Every append writes a compressed npz segment holding int64 open times and a
+        float64 (5, n) OHLCV array to <root>/<interval>/<symbol>/. Reads merge the segments,
+        later segments overriding earlier ones for the same open time, so a
+        re-fetched (previously still open) bar replaces its stale copy. A coverage index next to
+        the segments records which open time ranges were fetched completely.
+    """
+    def __init__(self, root=Constants.KLINE_STORE_DIR, max_segments=Constants.KLINE_STORE_MAX_SEGMENTS):
+        self.root = root
+        self.max_segments = max_segments
+
+    def _path(self, symbol, interval):
+        return os.path.join(self.root, interval, symbol)
+
+    def _segments(self, symbol, interval):
+        """ Returns: [(seq, first_open_time, last_open_time, path)] ordered by write sequence """
+        segments = []
+        for path in glob.glob(os.path.join(self._path(symbol, interval), '*.npz')):
+            seq, first, last = os.path.splitext(os.path.basename(path))[0].split('_')
+            segments.append((int(seq), int(first), int(last), path))
+        return sorted(segments)
+
+    def _write_segment(self, symbol, interval, seq, open_times, ohlcv):
+        path = self._path(symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        segment_file = os.path.join(path, '{:08d}_{}_{}.npz'.format(seq, open_times.min(), open_times.max()))
+        # Write to a temporary file first so readers never see a partial segment
+        tmp_file = segment_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez_compressed(f, open_time=np.ascontiguousarray(open_times, dtype=np.int64),
+                                ohlcv=np.ascontiguousarray(ohlcv, dtype=np.float64))
+        os.replace(tmp_file, segment_file)
+
+    def span(self, symbol, interval):
+        """ Returns: (first_open_time, last_open_time) of the stored bars, or None if nothing is stored """
+        segments = self._segments(symbol, interval)
+        if not segments:
+            return None
+        return min(first for _, first, _, _ in segments), max(last for _, _, last, _ in segments)
+
+    def _coverage_path(self, symbol, interval):
+        return os.path.join(self._path(symbol, interval), 'coverage.npy')
+
+    def coverage(self, symbol, interval):
+        """ Returns: int64 (k, 2) array of the disjoint [first, last] open time ranges, sorted, in which every bar
+                     the exchange has is stored. Ranges the exchange returned no bars for (before a listing,
+                     maintenance windows) are covered as well, so they are not requested again
+        """
+        path = self._coverage_path(symbol, interval)
+        if not os.path.exists(path):
+            return np.empty((0, 2), dtype=np.int64)
+        return np.load(path)
+
+    def cover(self, symbol, interval, ranges):
+        """ Input: [(first_open_time, last_open_time)] ranges fetched completely from the exchange """
+        ranges = np.concatenate((self.coverage(symbol, interval), np.asarray(ranges, dtype=np.int64).reshape(-1, 2)))
+        ranges = ranges[np.argsort(ranges[:, 0], kind='stable')]
+        # Ranges overlapping or touching the next bar are merged. Monthly bars are up to 31 days apart
+        step = interval_to_milliseconds(interval) or 31 * 24 * 60 * 60 * 1000
+        merged = [list(ranges[0])]
+        for first, last in ranges[1:]:
+            if first <= merged[-1][1] + step:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        path = self._path(symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        tmp_file = self._coverage_path(symbol, interval) + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.save(f, np.array(merged, dtype=np.int64))
+        os.replace(tmp_file, self._coverage_path(symbol, interval))
+
+    def fetch_start(self, symbol, interval, start_ms):
+        """ Returns: Open time in milliseconds from which klines are missing to cover start_ms until now.
+            Only the coverage index is read. Bars missing between covered ranges (e.g. an interrupted backfill)
+            are fetched again from the first gap on
+        """
+        coverage = self.coverage(symbol, interval)
+        covering = np.flatnonzero((coverage[:, 0] <= start_ms) & (coverage[:, 1] >= start_ms))
+        if not len(covering):
+            return start_ms
+        index = covering[0]
+        interval_ms = interval_to_milliseconds(interval)
+        if index + 1 < len(coverage) and interval_ms is not None:
+            return int(coverage[index, 1]) + interval_ms
+        # The last stored bar may still have been open when it was fetched, so fetch it again
+        return int(coverage[index, 1])
+
+    def read(self, symbol, interval, start_ms=None, end_ms=None):
+        """ Input: Optional start/end open time bounds in milliseconds (inclusive)
+            Returns: (open_times int64[n], ohlcv float64[5, n]) sorted by open time
+        """
+        open_times, ohlcv = [], []
+        for _, first, last, path in self._segments(symbol, interval):
+            if (start_ms is not None and last < start_ms) or (end_ms is not None and first > end_ms):
+                continue
+            with np.load(path) as segment:
+                open_times.append(segment['open_time'])
+                ohlcv.append(segment['ohlcv'])
+        if not open_times:
+            return np.empty(0, dtype=np.int64), np.empty((len(OHLCV_COLUMNS), 0), dtype=np.float64)
+
+        open_times = np.concatenate(open_times)
+        ohlcv = np.concatenate(ohlcv, axis=1)
+        # Keep the most recently written row for every open time
+        reverse_unique, reverse_index = np.unique(open_times[::-1], return_index=True)
+        keep = len(open_times) - 1 - reverse_index
+        open_times, ohlcv = reverse_unique, ohlcv[:, keep]
+
+        mask = np.ones(len(open_times), dtype=bool)
+        if start_ms is not None:
+            mask &= open_times >= start_ms
+        if end_ms is not None:
+            mask &= open_times <= end_ms
+        if mask.all():
+            return open_times, ohlcv
+        return open_times[mask], np.ascontiguousarray(ohlcv[:, mask])
+
+    def append(self, symbol, interval, klines, covered_from=None):
+        """ Input: Raw klines as returned by the Binance REST API, open time in milliseconds they were requested
+                   from. The range from there to the last kline is recorded as covered
+            Returns: Number of bars written
+        """
+        if not len(klines):
+            return 0
+        with metrics.timer("decode_seconds"):
+            open_times, ohlcv = decode_klines(klines)
+        first = open_times.min() if covered_from is None else min(covered_from, open_times.min())
+        return self.write(symbol, interval, open_times, ohlcv, covered=[(first, open_times.max())])
+
+    def write(self, symbol, interval, open_times, ohlcv, covered=None):
+        """ Input: Covered ranges (see cover), by default the range of the written bars """
+        segments = self._segments(symbol, interval)
+        seq = segments[-1][0] + 1 if segments else 0
+        self._write_segment(symbol, interval, seq, open_times, ohlcv)
+        self.cover(symbol, interval, covered if covered is not None else [(open_times.min(), open_times.max())])
+        if len(segments) + 1 > self.max_segments:
+            self.compact(symbol, interval)
+        return len(open_times)
+
+    def compact(self, symbol, interval):
+        """ Merges all segments of (symbol, interval) into a single segment """
+        segments = self._segments(symbol, interval)
+        if len(segments) < 2:
+            return
+        open_times, ohlcv = self.read(symbol, interval)
+        self._write_segment(symbol, interval, segments[-1][0] + 1, open_times, ohlcv)
+        for _, _, _, path in segments:
+            os.remove(path)
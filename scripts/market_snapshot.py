@@ -0,0 +1,146 @@
+#!/usr/bin/env python3.5
+
+import numpy as np
+from scripts.resampler import check_timeframe, resample
+
+
+class MarketSnapshot:
+    """ Market data of one symbol for one run.
+        OHLCV lives in a single float64 array of shape (5, n) whose rows are contiguous,
+        so the per-column properties are zero-copy views that numpy and talib accept as is.
+        Timestamps are int64 open times in milliseconds.
+        Higher timeframes are derived from these bars on demand (see `timeframe`).
+        A snapshot may have no bars (e.g. a new listing), its latest and extreme prices are NaN then.
+    """
+    __slots__ = ('symbol', 'interval', 'timestamps', 'ohlcv', 'current_price', 'order_book', 'timeframes',
+                 '_dataframe')
+
+    OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+    def __init__(self, symbol, interval, timestamps, ohlcv, current_price=None, order_book=None, timeframes=None):
+        ohlcv = np.asarray(ohlcv, dtype=np.float64)
+        if ohlcv.ndim != 2 or ohlcv.shape[0] != 5:
+            raise ValueError("ohlcv must have shape (5, n), got {}".format(ohlcv.shape))
+        if ohlcv.strides[1] != ohlcv.itemsize:
+            ohlcv = np.ascontiguousarray(ohlcv)
+        self.symbol = symbol
+        self.interval = interval
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.ohlcv = ohlcv
+        if current_price is None:
+            current_price = ohlcv[self.CLOSE, -1] if ohlcv.shape[1] else np.nan
+        self.current_price = float(current_price)
+        self.order_book = order_book if order_book is not None else {}
+        self.timeframes = timeframes if timeframes is not None else {}
+        self._dataframe = None
+
+    def __getstate__(self):
+        # The cached DataFrame is rebuilt on demand, don't pickle it to worker processes
+        return {slot: getattr(self, slot) for slot in self.__slots__ if slot != '_dataframe'}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._dataframe = None
+
+    def __len__(self):
+        return self.ohlcv.shape[1]
+
+    @property
+    def opening_prices(self):
+        return self.ohlcv[self.OPEN]
+
+    @property
+    def high_prices(self):
+        return self.ohlcv[self.HIGH]
+
+    @property
+    def low_prices(self):
+        return self.ohlcv[self.LOW]
+
+    @property
+    def closing_prices(self):
+        return self.ohlcv[self.CLOSE]
+
+    @property
+    def volumes(self):
+        return self.ohlcv[self.VOLUME]
+
+    @property
+    def opening_price(self):
+        return self.ohlcv[self.OPEN, 0] if len(self) else np.nan
+
+    @property
+    def highest_price(self):
+        return self.ohlcv[self.HIGH].max() if len(self) else np.nan
+
+    @property
+    def lowest_price(self):
+        return self.ohlcv[self.LOW].min() if len(self) else np.nan
+
+    @property
+    def closing_price(self):
+        return self.ohlcv[self.CLOSE, -1] if len(self) else np.nan
+
+    def timeframe(self, interval):
+        """ Returns: This snapshot resampled to `interval` bars. Derived on first use only, then cached """
+        if interval is None or interval == self.interval:
+            return self
+        if interval not in self.timeframes:
+            check_timeframe(self.interval, interval)
+            open_times, ohlcv = resample(self.timestamps, self.ohlcv, interval)
+            self.timeframes[interval] = MarketSnapshot(self.symbol, interval, open_times, ohlcv,
+                                                       current_price=self.current_price, order_book=self.order_book)
+        return self.timeframes[interval]
+
+    def to_dataframe(self):
+        """ Returns: OHLCV DataFrame indexed by open time. Built on first use only, then cached """
+        if self._dataframe is None:
+            import pandas as pd
+            self._dataframe = pd.DataFrame(self.ohlcv.T, columns=['open', 'high', 'low', 'close', 'volume'],
+                                           index=pd.DatetimeIndex(pd.to_datetime(self.timestamps, unit='ms'),
+                                                                  name='timestamp'),
+                                           copy=False)
+        return self._dataframe
+
+    def as_dict(self):
+        """ Returns: Indicator inputs keyed the way BaseIndicator.calculate expects them, as views """
+        return {
+            "timestamps": self.timestamps,
+            "opening_prices": self.opening_prices,
+            "high_prices": self.high_prices,
+            "low_prices": self.low_prices,
+            "closing_prices": self.closing_prices,
+            "volumes": self.volumes,
+            "opening_price": self.opening_price,
+            "highest_price": self.highest_price,
+            "lowest_price": self.lowest_price,
+            "closing_price": self.closing_price,
+            "current_price": self.current_price,
+            "order_book": self.order_book,
+        }
+
+
+def stack_snapshots(snapshots):
+    """ Input: MarketSnapshots with the same bar open times
+        Returns: Their indicator inputs (see MarketSnapshot.as_dict) stacked, the series copied once into a single
+                 (5, symbols, n) array: series of shape (symbols, n), the timestamps (n) they share, latest values
+                 and current prices of shape (symbols) and a list of the order books
+    """
+    ohlcv = np.empty((5, len(snapshots), len(snapshots[0])))
+    for i, snapshot in enumerate(snapshots):
+        ohlcv[:, i] = snapshot.ohlcv
+    return {
+        "timestamps": snapshots[0].timestamps,
+        "opening_prices": ohlcv[MarketSnapshot.OPEN],
+        "high_prices": ohlcv[MarketSnapshot.HIGH],
+        "low_prices": ohlcv[MarketSnapshot.LOW],
+        "closing_prices": ohlcv[MarketSnapshot.CLOSE],
+        "volumes": ohlcv[MarketSnapshot.VOLUME],
+        "opening_price": ohlcv[MarketSnapshot.OPEN, :, 0],
+        "highest_price": ohlcv[MarketSnapshot.HIGH].max(axis=1),
+        "lowest_price": ohlcv[MarketSnapshot.LOW].min(axis=1),
+        "closing_price": ohlcv[MarketSnapshot.CLOSE, :, -1],
+        "current_price": np.array([snapshot.current_price for snapshot in snapshots]),
+        "order_book": [snapshot.order_book for snapshot in snapshots],
+    }
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3.5
+
+import json
+import asyncio
+import numpy as np
+import websockets
+from binance.helpers import interval_to_milliseconds
+from scripts.constants import Constants
+from scripts.kline_decoder import decode_klines
+from scripts.order_book import LocalOrderBook
+
+
+class OHLCVRingBuffer:
+    """ Fixed-size OHLCV ring buffer.
+        Every bar is written twice, at i and i + capacity, so the latest `size` bars
+        are always available as one contiguous slice without copying or np.roll.
+    """
+    def __init__(self, capacity=Constants.DEFAULT_STREAM_BUFFER_SIZE):
+        self.capacity = capacity
+        self.open_times = np.zeros(2 * capacity, dtype=np.int64)
+        self.ohlcv = np.zeros((5, 2 * capacity), dtype=np.float64)
+        self.head = 0
+        self.size = 0
+
+    def append(self, open_time, ohlcv):
+        self.open_times[self.head] = self.open_times[self.head + self.capacity] = open_time
+        self.ohlcv[:, self.head] = self.ohlcv[:, self.head + self.capacity] = ohlcv
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, open_times, ohlcv):
+        for open_time, column in zip(open_times[-self.capacity:], ohlcv[:, -self.capacity:].T):
+            self.append(open_time, column)
+
+    def last_open_time(self):
+        if not self.size:
+            return None
+        return self.open_times[(self.head - 1) % self.capacity]
+
+    def view(self):
+        """ Returns: (open_times int64[size], ohlcv float64[5, size]) oldest first, as views into the buffer """
+        start = self.head + self.capacity - self.size
+        return self.open_times[start:start + self.size], self.ohlcv[:, start:start + self.size]
+
+
+class MarketStream:
+    """ Subscribes to the Binance kline, ticker and diff depth streams for a set of symbols.
+        Closed klines are appended to a per-symbol OHLCVRingBuffer and `on_bar_close(symbol)` runs
+        as a task, one at a time per symbol, so the loop goes on reading every stream meanwhile.
+        The latest ticker price is kept in memory and depth diffs are applied to a per-symbol LocalOrderBook.
+        Order book snapshots, and the klines missed while disconnected (`fetch_klines(symbol, start_ms)`),
+        are fetched on the default executor.
+    """
+    def __init__(self, symbols, interval, on_bar_close, logger,
+                 url=Constants.STREAM_URL, buffer_size=Constants.DEFAULT_STREAM_BUFFER_SIZE,
+                 fetch_order_book=None, fetch_klines=None, record_path=None):
+        self.symbols = symbols
+        self.interval = interval
+        self.on_bar_close = on_bar_close
+        self.fetch_klines = fetch_klines
+        self.interval_ms = interval_to_milliseconds(interval)
+        self.logger = logger
+        self.url = url
+        self.record_path = record_path
+        self._record_file = None
+        self.buffers = {sym: OHLCVRingBuffer(buffer_size) for sym in symbols}
+        self.current_prices = {}
+        self.order_books = {sym: LocalOrderBook(sym, fetch_order_book, logger) for sym in symbols}
+        self._snapshot_tasks = {}
+        self._bar_close_tasks = {}
+        self._bar_close_pending = set()
+        self._gap_tasks = {}
+        self._gap_klines = {}
+        self._symbols_by_stream_name = {sym.lower(): sym for sym in symbols}
+
+    def stream_names(self):
+        streams = []
+        for sym in self.symbols:
+            streams.append("{}@kline_{}".format(sym.lower(), self.interval))
+            streams.append("{}@ticker".format(sym.lower()))
+            streams.append("{}@depth@100ms".format(sym.lower()))
+        return streams
+
+    def stream_uri(self):
+        return "{}/stream?streams={}".format(self.url.rstrip('/'), "/".join(self.stream_names()))
+
+    async def run(self):
+        """ Consumes the stream forever, reconnecting with exponential backoff """
+        backoff = 1
+        while True:
+            try:
+                async with websockets.connect(self.stream_uri()) as ws:
+                    self.logger.info("Connected to market stream {}".format(self.url))
+                    backoff = 1
+                    async for message in ws:
+                        await self.handle_message(message)
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                self.logger.error("Market stream disconnected: {}. Reconnecting in {}s".format(e, backoff))
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, Constants.STREAM_MAX_BACKOFF)
+
+    async def handle_message(self, message):
+        if self.record_path:
+            if self._record_file is None:
+                self._record_file = open(self.record_path, 'a')
+            self._record_file.write(message.rstrip('\n') + '\n')
+        payload = json.loads(message)
+        stream, event = payload.get("stream", ""), payload.get("data", {})
+        sym = self._symbols_by_stream_name.get(stream.split('@')[0])
+        if sym is None:
+            return
+
+        if "@kline_" in stream:
+            kline = event["k"]
+            if not kline["x"]:
+                return
+            if sym in self._gap_tasks:
+                # Appended once the missed klines are in
+                self._gap_klines[sym].append(kline)
+                return
+            buffer = self.buffers[sym]
+            if buffer.size and kline["t"] <= buffer.last_open_time():
+                return
+            if (buffer.size and self.fetch_klines is not None and self.interval_ms is not None
+                    and kline["t"] > buffer.last_open_time() + self.interval_ms):
+                self._gap_klines[sym] = [kline]
+                self._gap_tasks[sym] = asyncio.ensure_future(self.fill_gap(sym))
+                return
+            self.append_kline(sym, kline)
+        elif stream.endswith("@ticker"):
+            self.current_prices[sym] = event["c"]
+        elif "@depth" in stream:
+            if self.order_books[sym].update(event) and sym not in self._snapshot_tasks:
+                self._snapshot_tasks[sym] = asyncio.ensure_future(self.resnapshot(sym))
+
+    def append_kline(self, sym, kline):
+        buffer = self.buffers[sym]
+        if buffer.size and kline["t"] <= buffer.last_open_time():
+            return
+        buffer.append(kline["t"], (float(kline["o"]), float(kline["h"]), float(kline["l"]),
+                                   float(kline["c"]), float(kline["v"])))
+        self.schedule_bar_close(sym)
+
+    def schedule_bar_close(self, sym):
+        """ Runs on_bar_close(sym) in a task. Bar closes arriving while it runs are coalesced into one more run """
+        if sym in self._bar_close_tasks:
+            self._bar_close_pending.add(sym)
+            return
+        self._bar_close_tasks[sym] = asyncio.ensure_future(self.bar_close(sym))
+
+    async def bar_close(self, sym):
+        try:
+            while True:
+                try:
+                    await self.on_bar_close(sym)
+                except Exception as e:
+                    self.logger.error("Failed to handle {} bar close. Error: {}".format(sym, e))
+                if sym not in self._bar_close_pending:
+                    break
+                self._bar_close_pending.discard(sym)
+        finally:
+            del self._bar_close_tasks[sym]
+
+    async def fill_gap(self, sym):
+        """ Fetches the klines `sym` missed (e.g. while reconnecting) off the event loop and appends them in order,
+            followed by the klines streamed meanwhile. A long gap is fetched page by page, from the last open time
+            each page returns, until the first streamed kline
+        """
+        buffer = self.buffers[sym]
+        start_ms = int(buffer.last_open_time()) + self.interval_ms
+        end_ms = self._gap_klines[sym][0]["t"]
+        try:
+            self.logger.warning("{} stream missed klines since {}. Fetching them...".format(sym, start_ms))
+            while start_ms < end_ms:
+                klines = await asyncio.get_running_loop().run_in_executor(None, self.fetch_klines, sym, start_ms)
+                if not klines:
+                    break
+                open_times, ohlcv = decode_klines(klines)
+                # The last page ends with the bar that is still open
+                closed = open_times < end_ms
+                if closed.any():
+                    buffer.extend(open_times[closed], ohlcv[:, closed])
+                start_ms = int(open_times[-1]) + 1
+            if buffer.last_open_time() + self.interval_ms < end_ms:
+                self.logger.warning("REST klines of {} end at {}, before the streamed ones at {}".format(
+                    sym, int(buffer.last_open_time()), end_ms))
+        except Exception as e:
+            self.logger.error("Failed to fetch missed {} klines. Error: {}".format(sym, e))
+        finally:
+            del self._gap_tasks[sym]
+            for kline in self._gap_klines.pop(sym):
+                self.append_kline(sym, kline)
+
+    async def resnapshot(self, sym):
+        """ Fetches the REST order book snapshot of `sym` off the event loop. Its depth events are buffered meanwhile """
+        order_book = self.order_books[sym]
+        order_book.mark_snapshot_attempt()
+        try:
+            self.logger.info("Fetching {} order book snapshot...".format(sym))
+            snapshot = await asyncio.get_running_loop().run_in_executor(None, order_book.fetch_snapshot, sym)
+            if not order_book.sync(snapshot):
+                self.logger.warning("{} order book snapshot is behind the stream. Retrying in {}s.".format(
+                    sym, Constants.ORDERBOOK_RESNAPSHOT_INTERVAL))
+        except Exception as e:
+            self.logger.error("Failed to fetch {} order book snapshot. Error: {}".format(sym, e))
+        finally:
+            del self._snapshot_tasks[sym]
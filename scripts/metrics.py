@@ -0,0 +1,158 @@
+#!/usr/bin/env python3.5
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from scripts.constants import Constants
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, **extra):
+    labels = list(labels) + list(extra.items())
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(key, str(value).replace('"', '\\"')) for key, value in labels) + "}"
+
+
+class Metrics:
+    """ Process-local latency histograms and counters.
+        Histograms use fixed buckets (seconds), so snapshots from several processes merge by adding
+        them up: pool workers send `collect()` back with their results and the main process `merge`s it.
+    """
+    def __init__(self, buckets=Constants.METRICS_LATENCY_BUCKETS, prefix=Constants.METRICS_PREFIX):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def increment(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """ Records the duration of the block in histogram `name`. Failed blocks also count errors_total """
+        start_time = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment("errors_total", stage=name, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def collect(self, reset=True):
+        """ Returns: Picklable snapshot of all metrics, cleared afterwards if `reset` """
+        with self._lock:
+            snapshot = {"histograms": {key: [list(counts), total, count]
+                                       for key, (counts, total, count) in self._histograms.items()},
+                        "counters": dict(self._counters)}
+            if reset:
+                self._histograms, self._counters = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, (counts, total, count) in snapshot["histograms"].items():
+                histogram = self._histograms.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                histogram[2] += count
+            for key, value in snapshot["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def quantile(self, counts, q):
+        """ Returns: Estimate of quantile q from bucket counts, interpolating inside the bucket """
+        rank = q * sum(counts)
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return 0.0
+
+    def to_prometheus(self):
+        """ Returns: All metrics in the Prometheus text exposition format """
+        snapshot = self.collect(reset=False)
+        lines = []
+        for name in sorted({name for name, _ in snapshot["histograms"]}):
+            metric = self.prefix + name
+            lines.append("# TYPE {} histogram".format(metric))
+            for (key_name, labels), (counts, total, count) in sorted(snapshot["histograms"].items()):
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append("{}_bucket{} {}".format(metric, _format_labels(labels, le=le), cumulative))
+                lines.append("{}_sum{} {}".format(metric, _format_labels(labels), total))
+                lines.append("{}_count{} {}".format(metric, _format_labels(labels), count))
+        for name in sorted({name for name, _ in snapshot["counters"]}):
+            metric = self.prefix + name
+            lines.append("# TYPE {} counter".format(metric))
+            for (key_name, labels), value in sorted(snapshot["counters"].items()):
+                if key_name == name:
+                    lines.append("{}{} {}".format(metric, _format_labels(labels), value))
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """ Returns: {"histograms": {name: [...]}, "counters": {name: [...]}} with p50/p90/p99 estimates """
+        snapshot = self.collect(reset=False)
+        result = {"timestamp": time.time(), "histograms": {}, "counters": {}}
+        for (name, labels), (counts, total, count) in sorted(snapshot["histograms"].items()):
+            result["histograms"].setdefault(name, []).append({
+                "labels": dict(labels), "count": count, "sum": total,
+                "mean": total / count if count else 0.0,
+                "p50": self.quantile(counts, 0.5), "p90": self.quantile(counts, 0.9),
+                "p99": self.quantile(counts, 0.99),
+            })
+        for (name, labels), value in sorted(snapshot["counters"].items()):
+            result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return result
+
+    def export(self, path, fmt="prometheus"):
+        """ Writes all metrics to `path` atomically, as a Prometheus textfile or a JSON snapshot """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            if fmt == "json":
+                json.dump(self.to_json(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_exporter(self, path, fmt="prometheus", interval=Constants.METRICS_EXPORT_INTERVAL):
+        """ Exports every `interval` seconds from a daemon thread """
+        def export_forever():
+            while True:
+                time.sleep(interval)
+                self.export(path, fmt)
+        thread = threading.Thread(target=export_forever, name="metrics-exporter", daemon=True)
+        thread.start()
+        return thread
+
+
+# Registry of this process
+metrics = Metrics()
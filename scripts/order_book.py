@@ -0,0 +1,220 @@
+#!/usr/bin/env python3.5
+
+import json
+import time
+import argparse
+from collections import deque
+import numpy as np
+from scripts.constants import Constants
+
+
+class OrderBookGapError(Exception):
+    pass
+
+
+def _levels(levels):
+    """ Input: [[price, quantity], ...] with string or float values
+        Returns: (prices float64[k], quantities float64[k]) sorted by price ascending
+    """
+    if not len(levels):
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+    values = np.asarray(levels, dtype=np.float64)
+    order = np.argsort(values[:, 0], kind='stable')
+    return values[order, 0], values[order, 1]
+
+
+def _merge(prices, quantities, update_prices, update_quantities):
+    """ Applies sorted level updates to one side of the book. A quantity of 0 removes the level """
+    if not len(update_prices):
+        return prices, quantities
+    index = np.searchsorted(prices, update_prices)
+    clipped = np.minimum(index, len(prices) - 1)
+    exists = (index < len(prices)) & (prices[clipped] == update_prices) if len(prices) else np.zeros(len(index), dtype=bool)
+    quantities[index[exists]] = update_quantities[exists]
+    insert = ~exists & (update_quantities > 0)
+    if insert.any():
+        prices = np.insert(prices, index[insert], update_prices[insert])
+        quantities = np.insert(quantities, index[insert], update_quantities[insert])
+    if exists.any() and (update_quantities[exists] == 0).any():
+        keep = quantities > 0
+        prices, quantities = prices[keep], quantities[keep]
+    return prices, quantities
+
+
+class LocalOrderBook:
+    """ L2 order book of one symbol maintained from Binance depth diff events
+        (<symbol>@depth@100ms). Both sides are kept as price-sorted float64 arrays.
+        A sequence gap (U != previous u + 1) clears the book. With a snapshot source the events are buffered
+        until a REST snapshot catches up with them, without one (e.g. replaying a recording) the next event
+        starts the book over. The book is not `synced` in between and OBA doesn't use it.
+    """
+    def __init__(self, symbol, fetch_snapshot=None, logger=None):
+        self.symbol = symbol
+        self.fetch_snapshot = fetch_snapshot
+        self.logger = logger
+        self.bid_prices, self.bid_quantities = _levels([])
+        self.ask_prices, self.ask_quantities = _levels([])
+        self.last_update_id = None
+        self.pending = deque(maxlen=Constants.ORDERBOOK_MAX_BUFFERED_EVENTS)
+        self.last_snapshot_attempt = None
+        self.updates = 0
+        self.resnapshots = 0
+
+    @property
+    def synced(self):
+        return self.last_update_id is not None
+
+    def reset(self):
+        """ Clears both sides. The book is unsynced until the next snapshot (or event without a snapshot source) """
+        self.bid_prices, self.bid_quantities = _levels([])
+        self.ask_prices, self.ask_quantities = _levels([])
+        self.last_update_id = None
+
+    def load_snapshot(self, snapshot):
+        """ Input: REST depth snapshot {"lastUpdateId": int, "bids": [...], "asks": [...]} """
+        self.bid_prices, self.bid_quantities = _levels(snapshot["bids"])
+        self.ask_prices, self.ask_quantities = _levels(snapshot["asks"])
+        self.last_update_id = snapshot["lastUpdateId"]
+
+    def snapshot_due(self):
+        """ Returns: Whether a snapshot may be fetched, at most one every ORDERBOOK_RESNAPSHOT_INTERVAL seconds """
+        return self.last_snapshot_attempt is None or \
+            time.monotonic() - self.last_snapshot_attempt >= Constants.ORDERBOOK_RESNAPSHOT_INTERVAL
+
+    def mark_snapshot_attempt(self):
+        self.last_snapshot_attempt = time.monotonic()
+
+    def sync(self, snapshot):
+        """ Loads a REST snapshot and applies the buffered events newer than it
+            Returns: False if the snapshot is behind the buffered events. The book is cleared again and the events
+                     from the gap on stay buffered for the next snapshot
+        """
+        self.load_snapshot(snapshot)
+        self.resnapshots += 1
+        while self.pending:
+            try:
+                self.apply_diff(self.pending[0])
+            except OrderBookGapError:
+                self.reset()
+                return False
+            self.pending.popleft()
+        return True
+
+    def resnapshot(self):
+        """ Fetches a snapshot through `fetch_snapshot` (blocking) and syncs the buffered events onto it """
+        self.mark_snapshot_attempt()
+        if self.logger:
+            self.logger.info("Fetching {} order book snapshot...".format(self.symbol))
+        synced = self.sync(self.fetch_snapshot(self.symbol))
+        if not synced and self.logger:
+            self.logger.warning("{} order book snapshot is behind the stream. Retrying in {}s.".format(
+                self.symbol, Constants.ORDERBOOK_RESNAPSHOT_INTERVAL))
+        return synced
+
+    def apply_diff(self, event):
+        """ Input: Depth diff event {"U": first update id, "u": final update id, "b": [...], "a": [...]}
+            Returns: False if the event is older than the book and was dropped
+            Raises: OrderBookGapError if update ids are missing between the book and the event
+        """
+        first_update_id, final_update_id = event["U"], event["u"]
+        if self.last_update_id is None:
+            # Unsynced and no snapshot source, the first event defines the book
+            self.last_update_id = first_update_id - 1
+        if final_update_id <= self.last_update_id:
+            return False
+        if first_update_id > self.last_update_id + 1:
+            raise OrderBookGapError("{} depth gap: expected update {}, got {}".format(
+                self.symbol, self.last_update_id + 1, first_update_id))
+
+        self.bid_prices, self.bid_quantities = _merge(self.bid_prices, self.bid_quantities, *_levels(event["b"]))
+        self.ask_prices, self.ask_quantities = _merge(self.ask_prices, self.ask_quantities, *_levels(event["a"]))
+        self.last_update_id = final_update_id
+        self.updates += 1
+        return True
+
+    def update(self, event):
+        """ Applies a diff event, or buffers it while the book waits for a snapshot. A sequence gap clears the book,
+            see the class description
+            Returns: True if the book waits for a snapshot and one is due, for the caller to fetch it and `sync`
+        """
+        if self.synced or self.fetch_snapshot is None:
+            try:
+                self.apply_diff(event)
+                return False
+            except OrderBookGapError as e:
+                if self.logger:
+                    self.logger.warning("{}. Clearing the book.".format(e))
+                self.reset()
+                if self.fetch_snapshot is None:
+                    self.apply_diff(event)
+                    return False
+        self.pending.append(event)
+        return self.snapshot_due()
+
+    def process(self, event):
+        """ Same as update, fetching a due snapshot right here. MarketStream fetches it on an executor instead """
+        if self.update(event):
+            self.resnapshot()
+
+    def bids(self, depth=None):
+        """ Returns: (prices, quantities) of the best `depth` bids, best first, as views """
+        if depth is None:
+            return self.bid_prices[::-1], self.bid_quantities[::-1]
+        return self.bid_prices[::-1][:depth], self.bid_quantities[::-1][:depth]
+
+    def asks(self, depth=None):
+        """ Returns: (prices, quantities) of the best `depth` asks, best first, as views """
+        if depth is None:
+            return self.ask_prices, self.ask_quantities
+        return self.ask_prices[:depth], self.ask_quantities[:depth]
+
+    def copy(self, depth=None):
+        """ Returns: A detached copy of the top `depth` levels, safe to hand to another thread or process """
+        book = LocalOrderBook(self.symbol)
+        bid_prices, bid_quantities = self.bids(depth)
+        book.bid_prices, book.bid_quantities = bid_prices[::-1].copy(), bid_quantities[::-1].copy()
+        ask_prices, ask_quantities = self.asks(depth)
+        book.ask_prices, book.ask_quantities = ask_prices.copy(), ask_quantities.copy()
+        book.last_update_id = self.last_update_id
+        return book
+
+
+def read_diff_file(path):
+    """ Yields depth diff events from a recording with one event per line.
+        Both raw events and combined-stream messages ({"stream": ..., "data": {...}}) are accepted.
+    """
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            yield event.get("data", event)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded depth diff events into a local order book")
+    parser.add_argument('-d', '--diffs', type=str,
+                        help='Path to a recording with one depth diff event per line',
+                        required=True)
+    parser.add_argument('-s', '--snapshot', type=str,
+                        help='Path to a REST depth snapshot (JSON) to start from. Optional.',
+                        required=False)
+    parser.add_argument('--symbol', type=str, default='BTCUSDT',
+                        help='Symbol of the recording')
+    parser.add_argument('--depth', type=int, default=Constants.DEFAULT_ORDERBOOK_DEPTH,
+                        help='Number of levels to print per side')
+    args = parser.parse_args()
+
+    order_book = LocalOrderBook(args.symbol)
+    if args.snapshot:
+        with open(args.snapshot, 'r') as f:
+            order_book.load_snapshot(json.load(f))
+    events = list(read_diff_file(args.diffs))
+    start_time = time.perf_counter()
+    for event in events:
+        order_book.process(event)
+    elapsed_time = time.perf_counter() - start_time
+    print("Applied {} of {} events in {:0.4f} seconds ({:0.0f} events/s)".format(
+        order_book.updates, len(events), elapsed_time, len(events) / max(elapsed_time, 1e-9)))
+    print("Bids:\n{}".format(np.column_stack(order_book.bids(args.depth))))
+    print("Asks:\n{}".format(np.column_stack(order_book.asks(args.depth))))
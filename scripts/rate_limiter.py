@@ -0,0 +1,307 @@
+#!/usr/bin/env python3.5
+
+import os
+import time
+import fcntl
+import asyncio
+import inspect
+import tempfile
+import numpy as np
+from binance.exceptions import BinanceAPIException
+from scripts.constants import Constants
+from scripts.metrics import metrics
+
+
+MARKET_DATA = 0
+ORDER = 1
+
+# Slots of the shared limiter state
+_WEIGHT, _WEIGHT_UPDATED, _ORDERS, _ORDERS_UPDATED, _BLOCKED_UNTIL, _ORDER_WAITING_UNTIL = range(6)
+
+
+def order_book_weight(limit):
+    """ Returns: Request weight of GET /api/v3/depth for the given limit """
+    for max_limit, weight in Constants.BINANCE_DEPTH_WEIGHTS:
+        if limit <= max_limit:
+            return weight
+    return Constants.BINANCE_DEPTH_WEIGHTS[-1][1]
+
+
+class RateLimiter:
+    """ Token buckets for the Binance REST request weight and order limits.
+        The bucket state lives in a memory-mapped file guarded by a file lock, so every
+        process that creates a RateLimiter with the same name (pool workers, the backfill command,
+        a second bot) draws from one budget. Orders may use the whole weight budget; market data
+        leaves `order_reserve` weight untouched and waits while an order is waiting.
+    """
+    def __init__(self, name=Constants.RATE_LIMITER_NAME,
+                 weight_per_minute=Constants.BINANCE_REQUEST_WEIGHT_PER_MINUTE,
+                 orders_per_10s=Constants.BINANCE_ORDERS_PER_10S,
+                 order_reserve=Constants.RATE_LIMITER_ORDER_RESERVE):
+        self.name = name
+        self.weight_per_minute = weight_per_minute
+        self.orders_per_10s = orders_per_10s
+        self.order_reserve = order_reserve
+        self._attach()
+
+    def _attach(self):
+        self._lock_path = os.path.join(tempfile.gettempdir(), "{}.lock".format(self.name))
+        self._lock_file = None
+        self._lock_pid = None
+        state_path = os.path.join(tempfile.gettempdir(), "{}.state".format(self.name))
+        with self._locked():
+            # The state file outlives the process on purpose: the exchange keeps counting weight
+            # across restarts, so the next run (or the backfill command) must see the budget already spent
+            if not os.path.exists(state_path) or os.path.getsize(state_path) != 6 * 8:
+                now = time.time()
+                np.array([self.weight_per_minute, now, self.orders_per_10s, now, 0, 0],
+                         dtype=np.float64).tofile(state_path)
+            self._state = np.memmap(state_path, dtype=np.float64, mode='r+', shape=(6,))
+
+    def __getstate__(self):
+        return {"name": self.name, "weight_per_minute": self.weight_per_minute,
+                "orders_per_10s": self.orders_per_10s, "order_reserve": self.order_reserve}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    def _locked(self, blocking=True):
+        """ Returns: Context manager holding the state file lock. Without blocking, entering it raises
+                     BlockingIOError while another process holds the lock
+        """
+        # flock locks belong to the open file, so every process needs its own
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self._lock_path, 'a')
+            self._lock_pid = os.getpid()
+        return _FileLock(self._lock_file, blocking)
+
+    def _refill(self, now):
+        state = self._state
+        # Clamp elapsed time so a wall clock stepping backwards never drains the buckets
+        state[_WEIGHT_UPDATED] = min(state[_WEIGHT_UPDATED], now)
+        state[_ORDERS_UPDATED] = min(state[_ORDERS_UPDATED], now)
+        state[_WEIGHT] = min(self.weight_per_minute,
+                             state[_WEIGHT] + (now - state[_WEIGHT_UPDATED]) * self.weight_per_minute / 60)
+        state[_WEIGHT_UPDATED] = now
+        state[_ORDERS] = min(self.orders_per_10s,
+                             state[_ORDERS] + (now - state[_ORDERS_UPDATED]) * self.orders_per_10s / 10)
+        state[_ORDERS_UPDATED] = now
+
+    def capacity(self, priority=MARKET_DATA):
+        """ Returns: Largest weight a single request of the given priority can ever be granted """
+        if priority == ORDER:
+            return self.weight_per_minute
+        return self.weight_per_minute - self.order_reserve
+
+    def try_acquire(self, weight, priority=MARKET_DATA, blocking=True):
+        """ Returns: 0 if the weight was taken from the bucket, otherwise seconds to wait before retrying.
+                     Without blocking, a lock held by another process is a short wait too
+            Raises: ValueError if the weight exceeds the capacity of the bucket, as it could never be taken
+        """
+        if weight > self.capacity(priority):
+            raise ValueError("Request weight {} exceeds the rate limiter capacity of {}".format(
+                weight, self.capacity(priority)))
+        try:
+            with self._locked(blocking):
+                return self._take(weight, priority)
+        except BlockingIOError:
+            return Constants.RATE_LIMITER_LOCK_RETRY
+
+    def _take(self, weight, priority):
+        """ try_acquire with the lock held """
+        state = self._state
+        now = time.time()
+        self._refill(now)
+        if now < state[_BLOCKED_UNTIL]:
+            return state[_BLOCKED_UNTIL] - now
+
+        if priority == ORDER:
+            if state[_WEIGHT] >= weight and state[_ORDERS] >= 1:
+                state[_WEIGHT] -= weight
+                state[_ORDERS] -= 1
+                return 0
+            wait = max((weight - state[_WEIGHT]) * 60 / self.weight_per_minute,
+                       (1 - state[_ORDERS]) * 10 / self.orders_per_10s, 0)
+            # Hold market data back until the order has had its turn. Expires on its own,
+            # so a process dying while it waits cannot stall the others
+            state[_ORDER_WAITING_UNTIL] = max(state[_ORDER_WAITING_UNTIL],
+                                              now + wait + Constants.RATE_LIMITER_POLL_INTERVAL)
+            return wait
+
+        if now < state[_ORDER_WAITING_UNTIL]:
+            return state[_ORDER_WAITING_UNTIL] - now
+        available = state[_WEIGHT] - self.order_reserve
+        if available >= weight:
+            state[_WEIGHT] -= weight
+            return 0
+        return (weight - available) * 60 / self.weight_per_minute
+
+    def acquire(self, weight, priority=MARKET_DATA):
+        wait = self.try_acquire(weight, priority)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.try_acquire(weight, priority)
+
+    async def acquire_async(self, weight, priority=MARKET_DATA):
+        """ Same as acquire, never blocking the event loop on the lock of another process """
+        wait = self.try_acquire(weight, priority, blocking=False)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.try_acquire(weight, priority, blocking=False)
+
+    def update_used_weight(self, used_weight, blocking=True):
+        """ Aligns the bucket with the X-MBX-USED-WEIGHT-1M header the exchange returned
+            Returns: False if skipped because another process holds the lock (without blocking).
+                     The header of the next response aligns the bucket then
+        """
+        try:
+            with self._locked(blocking):
+                self._refill(time.time())
+                self._state[_WEIGHT] = min(self._state[_WEIGHT], self.weight_per_minute - used_weight)
+        except BlockingIOError:
+            return False
+        return True
+
+    def block(self, seconds, blocking=True):
+        """ Stops all requests for `seconds`, e.g. after an HTTP 429/418 with Retry-After
+            Returns: False if another process holds the lock (without blocking)
+        """
+        try:
+            with self._locked(blocking):
+                self._state[_BLOCKED_UNTIL] = max(self._state[_BLOCKED_UNTIL], time.time() + seconds)
+        except BlockingIOError:
+            return False
+        return True
+
+    async def block_async(self, seconds):
+        while not self.block(seconds, blocking=False):
+            await asyncio.sleep(Constants.RATE_LIMITER_LOCK_RETRY)
+
+
+class _FileLock:
+    def __init__(self, lock_file, blocking=True):
+        self.lock_file = lock_file
+        self.blocking = blocking
+
+    def __enter__(self):
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+
+def _accepts_params(method):
+    """ Returns: Whether a client method takes request parameters as keyword arguments (e.g. get_klines(**params)),
+                 which also carry the per-request `requests_params`
+    """
+    try:
+        return any(parameter.kind == parameter.VAR_KEYWORD
+                   for parameter in inspect.signature(method).parameters.values())
+    except (TypeError, ValueError):
+        return False
+
+
+class _ResponseHeaders:
+    """ Headers of the response to a single call. The client's `response` attribute is shared by every
+        call in flight, so they are captured with a per-request hook (requests) or middleware (aiohttp) instead
+    """
+    def __init__(self):
+        self.headers = None
+
+    def requests_hook(self, response, *args, **kwargs):
+        self.headers = response.headers
+
+    async def aiohttp_middleware(self, request, handler):
+        response = await handler(request)
+        self.headers = response.headers
+        return response
+
+    def used_weight(self):
+        if self.headers and self.headers.get("X-MBX-USED-WEIGHT-1M"):
+            return int(self.headers["X-MBX-USED-WEIGHT-1M"])
+        return None
+
+
+class BinanceScheduler:
+    """ Routes Binance REST calls through a RateLimiter.
+        Each call is charged its request weight before it is sent. The used weight reported
+        by the exchange is fed back into the limiter, and HTTP 429/418 responses block
+        every process for the Retry-After period before the call is retried.
+    """
+    def __init__(self, limiter, logger, retries=Constants.RATE_LIMITER_RETRIES):
+        self.limiter = limiter
+        self.logger = logger
+        self.retries = retries
+        self._takes_params = {}
+
+    def call(self, method, *args, weight=1, priority=MARKET_DATA, **kwargs):
+        endpoint = method.__name__
+        for attempt in range(self.retries + 1):
+            with metrics.timer("rate_limit_wait_seconds", endpoint=endpoint):
+                self.limiter.acquire(weight, priority)
+            metrics.increment("requests_total", endpoint=endpoint)
+            response = _ResponseHeaders()
+            try:
+                with metrics.timer("request_seconds", endpoint=endpoint):
+                    result = method(*args, **self._capturing(method, kwargs,
+                                                             {"hooks": {"response": response.requests_hook}}))
+            except BinanceAPIException as e:
+                retry_after = self._retry_after(e)
+                if retry_after is None:
+                    raise
+                # Every process pauses, even when this call gives up
+                self.limiter.block(retry_after)
+                if attempt == self.retries:
+                    raise
+                continue
+            if response.used_weight() is not None:
+                self.limiter.update_used_weight(response.used_weight())
+            return result
+
+    async def call_async(self, method, *args, weight=1, priority=MARKET_DATA, **kwargs):
+        endpoint = method.__name__
+        for attempt in range(self.retries + 1):
+            with metrics.timer("rate_limit_wait_seconds", endpoint=endpoint):
+                await self.limiter.acquire_async(weight, priority)
+            metrics.increment("requests_total", endpoint=endpoint)
+            response = _ResponseHeaders()
+            try:
+                with metrics.timer("request_seconds", endpoint=endpoint):
+                    result = await method(*args, **self._capturing(method, kwargs,
+                                                                   {"middlewares": (response.aiohttp_middleware,)}))
+            except BinanceAPIException as e:
+                retry_after = self._retry_after(e)
+                if retry_after is None:
+                    raise
+                # Every process pauses, even when this call gives up
+                await self.limiter.block_async(retry_after)
+                if attempt == self.retries:
+                    raise
+                continue
+            if response.used_weight() is not None:
+                # Skipped rather than waited for if another process holds the lock
+                self.limiter.update_used_weight(response.used_weight(), blocking=False)
+            return result
+
+    def _capturing(self, method, kwargs, requests_params):
+        """ Returns: kwargs with the per-request hook capturing the response headers of this call. Methods that
+                     take no request parameters (e.g. get_historical_klines, which makes several requests) are
+                     called as they are and don't update the used weight
+        """
+        if method not in self._takes_params:
+            self._takes_params[method] = _accepts_params(method)
+        if not self._takes_params[method] or "requests_params" in kwargs:
+            return kwargs
+        return dict(kwargs, requests_params=requests_params)
+
+    def _retry_after(self, e):
+        """ Returns: Seconds every process pauses requests for after an HTTP 429/418, None for other errors """
+        if e.status_code not in (429, 418):
+            return None
+        headers = getattr(e.response, "headers", {}) or {}
+        retry_after = float(headers.get("Retry-After", Constants.RATE_LIMITER_DEFAULT_BACKOFF))
+        metrics.increment("rate_limited_total", status=e.status_code)
+        self.logger.warning("Binance rate limit hit (HTTP {}). Pausing requests for {}s".format(
+            e.status_code, retry_after))
+        return retry_after
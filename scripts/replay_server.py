@@ -0,0 +1,65 @@
+#!/usr/bin/env python3.5
+
+import json
+import asyncio
+import argparse
+from urllib.parse import urlparse, parse_qs
+import websockets
+
+
+class ReplayServer:
+    """ Local stand-in for the Binance combined stream endpoint.
+        Replays a recording of raw combined-stream messages (one JSON message per line,
+        as written by MarketStream's record_path) to every client, filtered to the
+        streams the client subscribed to via /stream?streams=a/b/c.
+    """
+    def __init__(self, recording_path, host="localhost", port=8765, delay=0.0, loop=False):
+        self.recording_path = recording_path
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.loop = loop
+        with open(recording_path, 'r') as f:
+            self.messages = [line.rstrip('\n') for line in f if line.strip()]
+
+    @staticmethod
+    def requested_streams(path):
+        streams = parse_qs(urlparse(path).query).get("streams", [""])[0]
+        return set(stream for stream in streams.split('/') if stream)
+
+    async def handler(self, websocket, path=None):
+        if path is None:
+            path = websocket.request.path
+        streams = self.requested_streams(path)
+        while True:
+            for message in self.messages:
+                if streams and json.loads(message).get("stream") not in streams:
+                    continue
+                await websocket.send(message)
+                await asyncio.sleep(self.delay)
+            if not self.loop:
+                break
+        await websocket.close()
+
+    async def serve_forever(self):
+        async with websockets.serve(self.handler, self.host, self.port):
+            await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded Binance market stream over a local websocket")
+    parser.add_argument('-r', '--recording', type=str,
+                        help='Path to a recording with one combined-stream message per line',
+                        required=True)
+    parser.add_argument('--host', type=str, default="localhost",
+                        help='Host to listen on')
+    parser.add_argument('-p', '--port', type=int, default=8765,
+                        help='Port to listen on')
+    parser.add_argument('-d', '--delay', type=float, default=0.0,
+                        help='Delay in seconds between replayed messages')
+    parser.add_argument('--loop', action='store_true', default=False,
+                        help='Replay the recording in a loop until the client disconnects')
+    args = parser.parse_args()
+
+    server = ReplayServer(args.recording, args.host, args.port, args.delay, args.loop)
+    asyncio.run(server.serve_forever())
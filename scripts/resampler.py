@@ -0,0 +1,128 @@
+#!/usr/bin/env python3.5
+
+import time
+import argparse
+import numpy as np
+from binance.helpers import interval_to_milliseconds
+from scripts.constants import Constants
+from scripts.market_stream import OHLCVRingBuffer
+
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+DAY_MS = 86400000
+WEEK_OFFSET_MS = 4 * DAY_MS  # Binance weeks start on Monday, the epoch was a Thursday
+
+
+def check_timeframe(base_interval, interval):
+    """ Raises: ValueError if `interval` bars cannot be built from `base_interval` bars """
+    base_ms = interval_to_milliseconds(base_interval)
+    if base_ms is None:
+        raise ValueError("Cannot resample from base interval '{}'".format(base_interval))
+    if interval == '1M':
+        target_ms, aligned_ms = None, DAY_MS
+    else:
+        target_ms = interval_to_milliseconds(interval)
+        if target_ms is None:
+            raise ValueError("Unknown kline interval '{}'".format(interval))
+        aligned_ms = DAY_MS if interval == '1w' else target_ms
+    if (target_ms is not None and target_ms < base_ms) or aligned_ms % base_ms:
+        raise ValueError("Cannot build {} bars from {} bars".format(interval, base_interval))
+
+
+def bucket_open_times(open_times, interval):
+    """ Returns: Open time of the `interval` bar each open time falls into, aligned like Binance klines """
+    open_times = np.asarray(open_times, dtype=np.int64)
+    if interval == '1M':
+        months = open_times.astype('datetime64[ms]').astype('datetime64[M]')
+        return months.astype('datetime64[ms]').astype(np.int64)
+    interval_ms = interval_to_milliseconds(interval)
+    offset = WEEK_OFFSET_MS if interval == '1w' else 0
+    return (open_times - offset) // interval_ms * interval_ms + offset
+
+
+def resample(open_times, ohlcv, interval):
+    """ Input: Base bars as (open_times int64[n], ohlcv float64[5, n]), oldest first
+        Returns: (open_times int64[m], ohlcv float64[5, m]) aggregated into `interval` bars.
+        The last bar is partial if the base bars end before its close.
+    """
+    buckets = bucket_open_times(open_times, interval)
+    n = len(buckets)
+    if n == 0:
+        return buckets, np.empty((5, 0), dtype=np.float64)
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], n) - 1
+    bars = np.empty((5, len(starts)), dtype=np.float64)
+    bars[OPEN] = ohlcv[OPEN, starts]
+    bars[HIGH] = np.maximum.reduceat(ohlcv[HIGH], starts)
+    bars[LOW] = np.minimum.reduceat(ohlcv[LOW], starts)
+    bars[CLOSE] = ohlcv[CLOSE, ends]
+    bars[VOLUME] = np.add.reduceat(ohlcv[VOLUME], starts)
+    return buckets[starts], bars
+
+
+class TimeframeResampler:
+    """ Incrementally derives `interval` bars from a stream of `base_interval` bars.
+        Completed bars are kept in an OHLCVRingBuffer; the bar still being built is kept
+        separately and merged with each batch of new base bars.
+    """
+    def __init__(self, base_interval, interval, capacity=Constants.DEFAULT_STREAM_BUFFER_SIZE):
+        check_timeframe(base_interval, interval)
+        self.base_interval = base_interval
+        self.interval = interval
+        self.buffer = OHLCVRingBuffer(capacity)
+        self.partial_open_time = None
+        self.partial = None
+        self.last_base_open_time = None
+
+    def update(self, open_times, ohlcv):
+        """ Input: New base bars, oldest first. Bars already seen are ignored """
+        open_times = np.asarray(open_times, dtype=np.int64)
+        if self.last_base_open_time is not None:
+            new = open_times > self.last_base_open_time
+            open_times, ohlcv = open_times[new], ohlcv[:, new]
+        if not len(open_times):
+            return
+        self.last_base_open_time = open_times[-1]
+
+        bar_open_times, bars = resample(open_times, ohlcv, self.interval)
+        if self.partial is not None:
+            if bar_open_times[0] == self.partial_open_time:
+                bars[OPEN, 0] = self.partial[OPEN]
+                bars[HIGH, 0] = max(bars[HIGH, 0], self.partial[HIGH])
+                bars[LOW, 0] = min(bars[LOW, 0], self.partial[LOW])
+                bars[VOLUME, 0] += self.partial[VOLUME]
+            else:
+                self.buffer.append(self.partial_open_time, self.partial)
+        self.buffer.extend(bar_open_times[:-1], bars[:, :-1])
+        self.partial_open_time, self.partial = bar_open_times[-1], bars[:, -1].copy()
+
+    def view(self):
+        """ Returns: (open_times, ohlcv) of the completed bars followed by the bar being built """
+        open_times, ohlcv = self.buffer.view()
+        if self.partial is None:
+            return open_times.copy(), ohlcv.copy()
+        return np.append(open_times, self.partial_open_time), np.column_stack((ohlcv, self.partial))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark resampling base klines into a higher timeframe")
+    parser.add_argument('-b', '--base_interval', type=str, default='1m',
+                        help='Interval of the generated base bars')
+    parser.add_argument('-i', '--interval', type=str, default='1h',
+                        help='Interval to resample to')
+    parser.add_argument('-n', '--bars', type=int, default=1000000,
+                        help='Number of base bars')
+    args = parser.parse_args()
+
+    check_timeframe(args.base_interval, args.interval)
+    base_ms = interval_to_milliseconds(args.base_interval)
+    open_times = np.arange(args.bars, dtype=np.int64) * base_ms
+    closing_prices = 100 + np.cumsum(np.random.normal(0, 1, args.bars))
+    ohlcv = np.vstack((closing_prices, closing_prices + 1, closing_prices - 1, closing_prices,
+                       np.random.uniform(0, 10, args.bars)))
+
+    start_time = time.perf_counter()
+    bar_open_times, bars = resample(open_times, ohlcv, args.interval)
+    elapsed_time = time.perf_counter() - start_time
+    print("Resampled {} {} bars into {} {} bars in {:0.4f} seconds".format(
+        args.bars, args.base_interval, len(bar_open_times), args.interval, elapsed_time))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3.5
+
+import weakref
+import threading
+import numpy as np
+from collections import namedtuple
+from multiprocessing import shared_memory, resource_tracker
+from scripts.market_snapshot import MarketSnapshot
+
+# Small, picklable references to data living in shared memory. These are what cross process boundaries
+SharedArray = namedtuple('SharedArray', ['name', 'shape', 'dtype'])
+SnapshotDescriptor = namedtuple('SnapshotDescriptor', ['symbol', 'interval', 'timestamps', 'ohlcv',
+                                                       'current_price', 'order_book', 'timeframes'])
+
+
+class SharedMarketData:
+    """ Owner side of the market data plane.
+        `publish` copies a snapshot's arrays into shared memory blocks once and returns a
+        SnapshotDescriptor that workers turn back into a MarketSnapshot with `attach`, without
+        copying or pickling the arrays. Publishing a symbol again releases its previous blocks.
+        Create it before the worker pool, so the workers inherit the owner's resource tracker.
+    """
+    def __init__(self):
+        self._blocks = {}
+        self._lock = threading.Lock()
+        resource_tracker.ensure_running()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _share(self, array, blocks):
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        return SharedArray(block.name, array.shape, array.dtype.str)
+
+    def _describe(self, snapshot, blocks):
+        return SnapshotDescriptor(snapshot.symbol, snapshot.interval,
+                                  self._share(snapshot.timestamps, blocks),
+                                  self._share(snapshot.ohlcv, blocks),
+                                  snapshot.current_price, snapshot.order_book,
+                                  {interval: self._describe(timeframe, blocks)
+                                   for interval, timeframe in snapshot.timeframes.items()})
+
+    def publish(self, snapshot):
+        """ Returns: SnapshotDescriptor of the snapshot and its derived timeframes """
+        blocks = []
+        descriptor = self._describe(snapshot, blocks)
+        with self._lock:
+            previous = self._blocks.pop(snapshot.symbol, [])
+            self._blocks[snapshot.symbol] = blocks
+        self._unlink(previous)
+        return descriptor
+
+    def release(self, symbol):
+        with self._lock:
+            blocks = self._blocks.pop(symbol, [])
+        self._unlink(blocks)
+
+    def close(self):
+        with self._lock:
+            blocks = [block for symbol_blocks in self._blocks.values() for block in symbol_blocks]
+            self._blocks = {}
+        self._unlink(blocks)
+
+    @staticmethod
+    def _unlink(blocks):
+        # Workers that already attached keep their mapping, only the name goes away
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+# Worker side: blocks attached by this process, kept open while arrays may still reference them.
+# numpy arrays don't pin the block's buffer (closing it would not fail), so weak references to the
+# arrays handed out tell whether a block is still in use. Views of an array keep it alive
+_attached = {}
+_arrays = {}
+
+
+def _attach_array(shared_array):
+    if shared_array.name not in _attached:
+        # Attaching registers the name with the resource tracker the workers share with the owner.
+        # That is a no-op for a name the owner already registered, and the owner unlinks it
+        _attached[shared_array.name] = shared_memory.SharedMemory(name=shared_array.name)
+    array = np.ndarray(shared_array.shape, dtype=np.dtype(shared_array.dtype),
+                       buffer=_attached[shared_array.name].buf)
+    _arrays.setdefault(shared_array.name, []).append(weakref.ref(array))
+    return array
+
+
+def _names(descriptor):
+    names = {descriptor.timestamps.name, descriptor.ohlcv.name}
+    for timeframe in descriptor.timeframes.values():
+        names |= _names(timeframe)
+    return names
+
+
+def _release_attached(keep):
+    for name in list(_attached):
+        if name in keep:
+            continue
+        arrays = [array for array in _arrays.get(name, []) if array() is not None]
+        if arrays:
+            # Arrays from an earlier task are still alive, try again on the next attach
+            _arrays[name] = arrays
+            continue
+        _attached.pop(name).close()
+        _arrays.pop(name, None)
+
+
+def attach(descriptor):
+    """ Returns: MarketSnapshot whose arrays are views into the shared memory blocks of `descriptor` """
+    _release_attached(_names(descriptor))
+    return _attach_snapshot(descriptor)
+
+
+def attach_all(descriptors):
+    """ Returns: [MarketSnapshot] of every descriptor, all attached at once (attach keeps only its own blocks) """
+    _release_attached(set().union(*(_names(descriptor) for descriptor in descriptors)))
+    return [_attach_snapshot(descriptor) for descriptor in descriptors]
+
+
+def _attach_snapshot(descriptor):
+    return MarketSnapshot(descriptor.symbol, descriptor.interval,
+                          _attach_array(descriptor.timestamps), _attach_array(descriptor.ohlcv),
+                          current_price=descriptor.current_price, order_book=descriptor.order_book,
+                          timeframes={interval: _attach_snapshot(timeframe)
+                                      for interval, timeframe in descriptor.timeframes.items()})
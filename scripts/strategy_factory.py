@@ -1,62 +1,128 @@
-from indicators.average_directional_index.adx import ADX
-from indicators.bollinger_bands.boll_bands import BollingerBands
-from indicators.double_top_bottom.dtb import DoubleTopBottom
-from indicators.elliott_wave_theory.ewt import EWT
-from indicators.fibonacci_retracements.fib_ret import FibonacciRetracements
-from indicators.head_and_shoulders.head_n_shoulders import HeadAndShoulders
-from indicators.ichimoku_cloud.ichimoku import IchimokuCloud
-from indicators.macd.macd import MACD
-from indicators.order_book_analysis.oba import OBA
-from indicators.on_balance_volume.obv import OBV
-from indicators.relative_strength_index.rsi import RSI
-from indicators.stochastic_oscillator.stoc_osc import StochasticOscillator
-from indicators.supertrend_indicator.supertrend import Supertrend
-from indicators.triangle.triangle import Triangle
-from indicators.volume_weighted_average_price.vwap import VWAP
-from sentiment_analysis.google_trends.google_trends import GoogleTrends
-from sentiment_analysis.reddit.reddit import Reddit
-from sentiment_analysis.twitter.twitter import Twitter
+#!/usr/bin/env python3.5
 
+import time
+import argparse
+import importlib
+import importlib.metadata
+from scripts.utils import load_config
+
+
+# Strategy name -> "module:Class". Modules are only imported when a strategy is created
+STRATEGIES = {
+    'ADX': 'indicators.average_directional_index.adx:ADX',
+    'BollingerBands': 'indicators.bollinger_bands.boll_bands:BollingerBands',
+    'DoubleTopBottom': 'indicators.double_top_bottom.dtb:DoubleTopBottom',
+    'EWT': 'indicators.elliott_wave_theory.ewt:EWT',
+    'FibonacciRetracements': 'indicators.fibonacci_retracements.fib_ret:FibonacciRetracements',
+    'HeadAndShoulders': 'indicators.head_and_shoulders.head_n_shoulders:HeadAndShoulders',
+    'IchimokuCloud': 'indicators.ichimoku_cloud.ichimoku:IchimokuCloud',
+    'MACD': 'indicators.macd.macd:MACD',
+    'OBA': 'indicators.order_book_analysis.oba:OBA',
+    'OBV': 'indicators.on_balance_volume.obv:OBV',
+    'RSI': 'indicators.relative_strength_index.rsi:RSI',
+    'StochasticOscillator': 'indicators.stochastic_oscillator.stoc_osc:StochasticOscillator',
+    'Supertrend': 'indicators.supertrend_indicator.supertrend:Supertrend',
+    'Triangle': 'indicators.triangle.triangle:Triangle',
+    'VWAP': 'indicators.volume_weighted_average_price.vwap:VWAP',
+    'GoogleTrends': 'sentiment_analysis.google_trends.google_trends:GoogleTrends',
+    'Reddit': 'sentiment_analysis.reddit.reddit:Reddit',
+    'Twitter': 'sentiment_analysis.twitter.twitter:Twitter',
+}
+
+# Third-party packages add strategies by declaring entry points in this group, e.g. in pyproject.toml:
+# [project.entry-points."crypto_trader.strategies"]
+# MyIndicator = "my_package.my_indicator:MyIndicator"
+ENTRY_POINT_GROUP = 'crypto_trader.strategies'
 
 
 class StrategyFactory:
+    _registry = None
+    _classes = {}
+    import_times = {}  # Strategy name -> seconds spent importing its module
+
+    @classmethod
+    def registry(cls):
+        """ Returns: {name: "module:Class"} of the built-in strategies and the installed plugins """
+        if cls._registry is None:
+            registry = dict(STRATEGIES)
+            entry_points = importlib.metadata.entry_points()
+            if hasattr(entry_points, "select"):
+                entry_points = entry_points.select(group=ENTRY_POINT_GROUP)
+            else:
+                entry_points = entry_points.get(ENTRY_POINT_GROUP, [])
+            for entry_point in entry_points:
+                registry[entry_point.name] = entry_point.value
+            cls._registry = registry
+        return cls._registry
+
+    @classmethod
+    def register(cls, name, path):
+        """ Input: Strategy name and "module:Class" path to import it from """
+        cls.registry()[name] = path
+        cls._classes.pop(name, None)
+
+    @classmethod
+    def load(cls, name):
+        """ Returns: The strategy class, importing its module on first use
+            Raises: ValueError for a name that isn't registered, ImportError naming the strategy and
+                    the missing package if its module can't be imported
+        """
+        if name not in cls._classes:
+            path = cls.registry().get(name)
+            if path is None:
+                raise ValueError("Unknown strategy '{}' in the config. Known strategies: {}".format(
+                    name, ", ".join(sorted(cls.registry()))))
+            module_name, class_name = path.split(':')
+            start_time = time.perf_counter()
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError as e:
+                if e.name and e.name != module_name and not module_name.startswith(e.name + '.'):
+                    raise ImportError("Strategy '{}' needs the missing package '{}'. Install it or disable "
+                                      "the strategy in the config".format(name, e.name), name=e.name) from e
+                raise ImportError("Cannot import strategy '{}' from {}: {}".format(name, path, e),
+                                  name=e.name) from e
+            cls.import_times[name] = time.perf_counter() - start_time
+            if not hasattr(module, class_name):
+                raise ImportError("Cannot import strategy '{}': {} has no class {}".format(
+                    name, module_name, class_name), name=module_name)
+            cls._classes[name] = getattr(module, class_name)
+        return cls._classes[name]
+
     @staticmethod
     def create_strategy(name, **params):
-        if name == 'ADX':
-            return ADX(**params)
-        elif name == 'BollingerBands':
-            return BollingerBands(**params)
-        elif name == 'DoubleTopBottom':
-            return DoubleTopBottom(**params)
-        elif name == 'EWT':
-            return EWT(**params)
-        elif name == 'FibonacciRetracements':
-            return FibonacciRetracements(**params)
-        elif name == 'HeadAndShoulders':
-            return HeadAndShoulders(**params)
-        elif name == 'IchimokuCloud':
-            return IchimokuCloud(**params)
-        elif name == 'MACD':
-            return MACD(**params)
-        elif name == 'OBA':
-            return OBA(**params)
-        elif name == 'OBV':
-            return OBV(**params)
-        elif name == 'RSI':
-            return RSI(**params)
-        elif name == 'StochasticOscillator':
-            return StochasticOscillator(**params)
-        elif name == 'Supertrend':
-            return Supertrend(**params)
-        elif name == 'Triangle':
-            return Triangle(**params)
-        elif name == 'VWAP':
-            return VWAP(**params)
-        elif name == 'GoogleTrends':
-            return GoogleTrends(**params)
-        elif name == 'Reddit':
-            return Reddit(**params)
-        elif name == 'Twitter':
-            return Twitter(**params)
-        else:
-            raise ValueError(f'Unknown strategy: {name}')
+        """ Raises: TypeError naming the strategy if the config gives it parameters it doesn't accept """
+        strategy_class = StrategyFactory.load(name)
+        try:
+            return strategy_class(**params)
+        except TypeError as e:
+            raise TypeError("Invalid parameters {} for strategy '{}' in the config: {}".format(
+                sorted(params), name, e)) from e
+
+    @classmethod
+    def import_report(cls):
+        """ Returns: Lines of import time per loaded strategy, slowest first. A module's dependencies are
+                     charged to the first strategy that imports them
+        """
+        lines = ["{:<24} {:8.1f} ms".format(name, seconds * 1000)
+                 for name, seconds in sorted(cls.import_times.items(), key=lambda item: -item[1])]
+        lines.append("{:<24} {:8.1f} ms".format("Total", sum(cls.import_times.values()) * 1000))
+        return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the import time of the strategies enabled in a config")
+    parser.add_argument('-c', '--config', type=str, default="config.yaml",
+                        help='Path to config file',
+                        required=False)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    for section in ("indicators", "sentiment_analyzers"):
+        for strategy_config in config[section]:
+            if strategy_config["enable"]:
+                try:
+                    StrategyFactory.load(strategy_config["name"])
+                except Exception as e:
+                    print("Failed to load {}: {}".format(strategy_config["name"], e))
+    print("\n".join(StrategyFactory.import_report()))
@@ -1,9 +1,6 @@
-import os
 import yaml
 import time
 import datetime
-import pandas as pd
-from scripts.constants import Constants
 from typing import Literal
 
 
@@ -45,16 +42,3 @@ def get_timestamp(precision: Literal["year", "month", "day", "hours", "minutes",
 def load_config(path):
   with open(path, 'r') as cf:
       return yaml.safe_load(cf)
-
-
-def save_data_to_csv(data):
-    timestamp = time.time()
-    date_time = datetime.datetime.fromtimestamp(timestamp)
-    date_str = date_time.strftime('%Y%m%d')
-    time_str = date_time.strftime('%H%M%S')
-    output_folder = os.path.join(Constants.PROJECT_ROOT, "trades", date_str)
-    os.makedirs(output_folder, exist_ok=True)
-    output_path = os.path.join(output_folder, time_str+".csv")
-    df = pd.DataFrame.from_dict(data)
-    df.to_csv(output_path)
-   
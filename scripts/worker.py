@@ -0,0 +1,136 @@
+#!/usr/bin/env python3.5
+
+import os
+from scripts.constants import Constants
+from scripts.logger import setup_logger
+from scripts.metrics import metrics
+from scripts.deadline import Deadline, StageRunner
+from scripts.resampler import check_timeframe
+from scripts.shared_data import attach, attach_all
+from scripts.strategy_factory import StrategyFactory
+from indicators.indicator_graph import IndicatorGraph
+
+# Per-process state, built once by `init_worker` instead of pickling TradingAPI into every task
+_indicator_graph = None
+_sentiment_analyzers = []
+_stage_runner = None
+_logger = None
+
+
+def build_indicators(config):
+    indicators = []
+    for indicator_config in config["indicators"]:
+        if indicator_config["enable"]:
+            class_name = indicator_config["name"]
+            params = dict(indicator_config.get("parameters") or {})
+            # Indicators run on `interval` bars resampled locally from the kline_interval bars
+            interval = params.pop("interval", None) or config["kline_interval"]
+            check_timeframe(config["kline_interval"], interval)
+            instance = StrategyFactory.create_strategy(class_name, **params)
+            instance.interval = interval
+            indicators.append(instance)
+    return indicators
+
+
+def build_sentiment_analyzers(config):
+    sentiment_analyzers = []
+    for sentiment_config in config["sentiment_analyzers"]:
+        if sentiment_config["enable"]:
+            class_name = sentiment_config["name"]
+            params = sentiment_config.get("parameters", {})
+            instance = StrategyFactory.create_strategy(class_name, **params)
+            sentiment_analyzers.append(instance)
+    return sentiment_analyzers
+
+
+def build_stage_runner(config, logger):
+    return StageRunner(logger, budgets=config.get("stage_budgets"),
+                       failure_threshold=config.get("circuit_breaker_failures", Constants.CIRCUIT_BREAKER_FAILURES),
+                       reset_timeout=config.get("circuit_breaker_reset", Constants.CIRCUIT_BREAKER_RESET_TIMEOUT))
+
+
+def init_worker(config, timestamp):
+    """ Pool initializer: builds the indicators and sentiment analyzers of this worker process """
+    global _indicator_graph, _sentiment_analyzers, _stage_runner, _logger
+    _logger = setup_logger(name="worker_{}".format(os.getpid()), is_test=config["testnet"], timestamp=timestamp)
+    _indicator_graph = IndicatorGraph(build_indicators(config), _logger, max_workers=config.get("indicator_threads"))
+    _sentiment_analyzers = build_sentiment_analyzers(config)
+    _stage_runner = build_stage_runner(config, _logger)
+    _logger.info("Strategy import times:\n{}".format("\n".join(StrategyFactory.import_report())))
+
+
+def run_indicators(descriptor):
+    """ Input: SnapshotDescriptor of market data published with SharedMarketData
+        Returns: (symbol, results or None if they failed, metrics recorded by this task) for the main process to merge
+    """
+    try:
+        results = _indicator_graph.run(attach(descriptor))
+    except Exception as e:
+        _logger.error("Failed to calculate indicators for '%s'. Error: %s", descriptor.symbol, str(e))
+        results = None
+    return descriptor.symbol, results, metrics.collect()
+
+
+def run_indicator_batch(descriptors):
+    """ Input: SnapshotDescriptors of several symbols, see IndicatorGraph.run_batch
+        Returns: ([(symbol, results or None if they failed)], metrics recorded by this task) for the main process
+                 to merge
+    """
+    try:
+        results = _indicator_graph.run_batch(attach_all(descriptors))
+    except Exception as e:
+        _logger.error("Failed to calculate indicators for {}. Error: {}".format(
+            ", ".join(descriptor.symbol for descriptor in descriptors), str(e)))
+        results = [None] * len(descriptors)
+    return [(descriptor.symbol, result) for descriptor, result in zip(descriptors, results)], metrics.collect()
+
+
+def imap_indicators(pool, tasks, logger, batched=False):
+    """ Input: Pool initialized with init_worker, SnapshotDescriptors or, if batched, lists of them
+        Returns: Iterator of (symbol, indicator results) in order of completion. The tasks are queued on the pool
+                 right away, the metrics the workers send back are merged as their results come in. Symbols whose
+                 indicators failed are logged and skipped, the workers go on with the other tasks
+    """
+    # Every symbol (or batch of symbols) is a separate task on the pool's shared queue (chunksize 1), so a worker
+    # that finishes early takes the next one instead of idling behind a fixed shard
+    if batched:
+        batches = pool.imap_unordered(run_indicator_batch, tasks, chunksize=1)
+    else:
+        batches = ((((sym, results),), worker_metrics) for sym, results, worker_metrics in
+                   pool.imap_unordered(run_indicators, tasks, chunksize=1))
+
+    def results():
+        for batch_results, worker_metrics in batches:
+            metrics.merge(worker_metrics)
+            for sym, result in batch_results:
+                if result is None:
+                    logger.error("Failed to calculate indicators for '%s'. Skipping.", sym)
+                    continue
+                yield sym, result
+    return results()
+
+
+def run_sentiment_analyzers(symbol, budget):
+    """ Input: Symbol, seconds its sentiment analysis may take from the start of this task
+        Returns: (results, metrics recorded by this task) for the main process to merge
+    """
+    return (process_sentiment_analyzers(_sentiment_analyzers, symbol, _stage_runner, Deadline.after(budget)),
+            metrics.collect())
+
+
+def analyze_sentiment(analyzer, symbol):
+    with metrics.timer("sentiment_seconds", analyzer=analyzer.name):
+        return analyzer.get_scores(analyzer.analyze(symbol))
+
+
+def process_sentiment_analyzers(sentiment_analyzers, symbol, stage_runner, deadline):
+    """ Returns: {analyzer name: {"sentiment_score": ..., "stale": ...}}. An analyzer that overruns its budget,
+                 fails or has an open circuit breaker is stale without a score. Symbols move between workers,
+                 so the main process fills in the last good score (see scripts/deadline.py apply_last_good)
+    """
+    results = {}
+    for analyzer in sentiment_analyzers:
+        score, stale = stage_runner.run("sentiment", analyzer.name, symbol, deadline,
+                                        analyze_sentiment, analyzer, symbol, fallback=False)
+        results[analyzer.name] = { "sentiment_score": score, "stale": stale }
+    return results
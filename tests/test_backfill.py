@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from scripts.backfill import Backfill
+from scripts.constants import Constants
+from scripts.kline_store import KlineStore
+
+BAR_MS = 300000
+CHUNK_MS = Constants.KLINE_FETCH_LIMIT * BAR_MS
+
+
+class Client:
+    """ Serves 5m klines of a price equal to the bar number, failing the chunks in `failing` """
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requests = []
+
+    def get_klines(self, symbol, interval, startTime, endTime, limit):
+        self.requests.append((symbol, startTime))
+        if startTime in self.failing:
+            raise ConnectionError("chunk unavailable")
+        first = -(-startTime // BAR_MS)
+        last = min(endTime // BAR_MS, first + limit - 1)
+        return [[i * BAR_MS, str(i), str(i + 1), str(i - 1), str(i), "1", (i + 1) * BAR_MS - 1]
+                for i in range(first, last + 1)]
+
+
+class Scheduler:
+    async def call_async(self, method, *args, weight=1, **kwargs):
+        return method(*args, **kwargs)
+
+
+def make_backfill(tmp_path, flush_chunks=2):
+    return Backfill(KlineStore(root=str(tmp_path)), Scheduler(), logging.getLogger("test_backfill"),
+                    max_concurrency=3, flush_chunks=flush_chunks)
+
+
+def download(backfill, client, symbols, start_ms, end_ms):
+    queue = asyncio.Queue()
+    for symbol in symbols:
+        for chunk_start in backfill.chunks(symbol, "5m", start_ms, end_ms):
+            queue.put_nowait((symbol, chunk_start))
+    buffers = {symbol: [] for symbol in symbols}
+    backfill.start_time = 0
+
+    async def run():
+        await asyncio.gather(*[backfill.download(client, queue, buffers, "5m", end_ms)
+                               for _ in range(backfill.max_concurrency)])
+
+    asyncio.run(run())
+    for symbol in symbols:
+        backfill.flush(symbol, "5m", buffers[symbol])
+
+
+def test_chunks_are_aligned_to_the_grid(tmp_path):
+    backfill = make_backfill(tmp_path)
+    assert backfill.chunks("BTCUSDT", "5m", CHUNK_MS + 7, 3 * CHUNK_MS) == [CHUNK_MS, 2 * CHUNK_MS, 3 * CHUNK_MS]
+    backfill.done_chunks("BTCUSDT", "5m").append(2 * CHUNK_MS)
+    assert backfill.chunks("BTCUSDT", "5m", CHUNK_MS, 3 * CHUNK_MS) == [CHUNK_MS, 3 * CHUNK_MS]
+    assert backfill.chunks("ETHUSDT", "5m", CHUNK_MS, 3 * CHUNK_MS) == [CHUNK_MS, 2 * CHUNK_MS, 3 * CHUNK_MS]
+
+
+def test_download_stores_bars_and_checkpoints_complete_chunks(tmp_path):
+    backfill = make_backfill(tmp_path)
+    end_ms = 4 * CHUNK_MS + 10 * BAR_MS
+    download(backfill, Client(), ["BTCUSDT", "ETHUSDT"], 0, end_ms)
+    for symbol in ("BTCUSDT", "ETHUSDT"):
+        open_times, ohlcv = backfill.kline_store.read(symbol, "5m")
+        assert_array_equal(open_times, np.arange(end_ms // BAR_MS + 1) * BAR_MS)
+        assert_array_equal(ohlcv[3], np.arange(end_ms // BAR_MS + 1))
+        # The chunk holding end_ms is stored, but downloaded again on the next run
+        assert sorted(backfill.done_chunks(symbol, "5m")) == [0, CHUNK_MS, 2 * CHUNK_MS, 3 * CHUNK_MS]
+    assert backfill.bars == 2 * (end_ms // BAR_MS + 1)
+
+
+def test_failed_chunks_resume_from_the_checkpoint(tmp_path):
+    end_ms = 4 * CHUNK_MS - 1
+    backfill = make_backfill(tmp_path)
+    download(backfill, Client(failing=[CHUNK_MS, 3 * CHUNK_MS]), ["BTCUSDT"], 0, end_ms)
+    assert backfill.failed == 2
+    assert sorted(backfill.done_chunks("BTCUSDT", "5m")) == [0, 2 * CHUNK_MS]
+    # The live fetch refills the hole as well
+    assert backfill.kline_store.fetch_start("BTCUSDT", "5m", 0) == CHUNK_MS
+
+    resumed = make_backfill(tmp_path)
+    client = Client()
+    download(resumed, client, ["BTCUSDT"], 0, end_ms)
+    assert sorted(chunk_start for _, chunk_start in client.requests) == [CHUNK_MS, 3 * CHUNK_MS]
+    open_times, _ = resumed.kline_store.read("BTCUSDT", "5m")
+    assert_array_equal(open_times, np.arange(4 * Constants.KLINE_FETCH_LIMIT) * BAR_MS)
+    assert resumed.kline_store.fetch_start("BTCUSDT", "5m", 0) == end_ms + 1 - BAR_MS
+
+
+@pytest.mark.parametrize("flush_chunks", [1, 10])
+def test_flush_chunks(tmp_path, flush_chunks):
+    backfill = make_backfill(tmp_path, flush_chunks=flush_chunks)
+    download(backfill, Client(), ["BTCUSDT"], 0, 3 * CHUNK_MS - 1)
+    assert len(backfill.kline_store._segments("BTCUSDT", "5m")) == (3 if flush_chunks == 1 else 1)
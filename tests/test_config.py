@@ -0,0 +1,20 @@
+import os
+import importlib.util
+from scripts.constants import Constants
+from scripts.utils import load_config
+from scripts.worker import build_indicators
+
+# Indicators of the shipped config that need an optional package
+OPTIONAL_DEPENDENCIES = {"IchimokuCloud": "ta"}
+
+
+def test_shipped_config_builds_its_indicators():
+    config = load_config(os.path.join(Constants.PROJECT_ROOT, "config.yaml"))
+    names = [indicator["name"] for indicator in config["indicators"]]
+    assert len(names) == len(set(names))
+    for indicator in config["indicators"]:
+        dependency = OPTIONAL_DEPENDENCIES.get(indicator["name"])
+        if dependency and importlib.util.find_spec(dependency) is None:
+            indicator["enable"] = False
+    enabled = [indicator["name"] for indicator in config["indicators"] if indicator["enable"]]
+    assert [type(indicator).__name__ for indicator in build_indicators(config)] == enabled
@@ -0,0 +1,119 @@
+import logging
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from scripts.daemon import BarCloseDaemon
+from scripts.kline_store import KlineStore
+from scripts.market_snapshot import MarketSnapshot
+
+logger = logging.getLogger("test_daemon")
+
+BAR_MS = 300000
+
+
+def make_klines(first, last):
+    """ Returns: Raw 5m klines of bars first to last, as the Binance REST API returns them """
+    return [[bar * BAR_MS, str(bar - 0.5), str(bar + 1), str(bar - 1), str(float(bar)), "10.0",
+             (bar + 1) * BAR_MS - 1, "0", 1, "0", "0", "0"] for bar in range(first, last + 1)]
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class CountingStore(KlineStore):
+    reads = 0
+
+    def read(self, symbol, interval, start_ms=None, end_ms=None):
+        self.reads += 1
+        return super().read(symbol, interval, start_ms=start_ms, end_ms=end_ms)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CountingStore(root=str(tmp_path))
+    # Backfilled up to bar 95, which was still open then
+    store.append("BTCUSDT", "5m", make_klines(0, 95))
+    return store
+
+
+def make_daemon(store, clock, evaluated, fetches=None):
+    def fetch_all(symbols, start_ms):
+        if fetches is not None:
+            fetches.append(list(symbols))
+        # Like AsyncMarketFetcher: from the first missing bar up to the bar that is still open
+        open_bar = int(clock.time() * 1000) // BAR_MS
+        return {sym: {"klines": make_klines(store.fetch_start(sym, "5m", start_ms) // BAR_MS, open_bar),
+                      "fetched_from": store.fetch_start(sym, "5m", start_ms),
+                      "current_price": str(float(open_bar)), "order_book": None}
+                for sym in symbols}
+
+    def build_snapshot(sym, open_times, ohlcv, current_price, order_book):
+        return MarketSnapshot(sym, "5m", open_times, ohlcv, current_price=current_price, order_book=order_book)
+
+    def evaluate_all(snapshots):
+        for sym, snapshot in snapshots.items():
+            evaluated.append((sym, snapshot.timestamps.copy(), snapshot.closing_prices.copy()))
+            yield sym, {"decision": "HOLD"}
+
+    return BarCloseDaemon(["BTCUSDT"], "5m", store, fetch_all, build_snapshot, evaluate_all, logger,
+                          close_delay=0.5, clock=clock)
+
+
+def test_one_evaluate_cycle_per_bar_close(store):
+    evaluated = []
+    fetches = []
+    clock = FakeClock(100 * BAR_MS / 1000 + 10)
+    daemon = make_daemon(store, clock, evaluated, fetches)
+
+    close_ms = daemon.wait_for_close()
+    assert close_ms == 101 * BAR_MS
+    assert clock.sleeps == [BAR_MS / 1000 - 10 + 0.5]
+    assert list(daemon.evaluate_bar(close_ms, 50 * BAR_MS)) == [("BTCUSDT", {"decision": "HOLD"})]
+    sym, timestamps, closes = evaluated[0]
+    # Closed bars only: bar 101 just opened
+    assert_array_equal(timestamps, np.arange(50, 101) * BAR_MS)
+    assert_array_equal(closes, np.arange(50, 101, dtype=np.float64))
+    assert store.reads == 1
+
+    # Woken up again within the same bar, nothing new to evaluate or fetch
+    assert list(daemon.evaluate_bar(close_ms, 50 * BAR_MS)) == []
+    assert fetches == [["BTCUSDT"]]
+
+    close_ms = daemon.wait_for_close()
+    assert close_ms == 102 * BAR_MS
+    assert list(daemon.evaluate_bar(close_ms, 51 * BAR_MS)) == [("BTCUSDT", {"decision": "HOLD"})]
+    sym, timestamps, closes = evaluated[1]
+    assert_array_equal(timestamps, np.arange(51, 102) * BAR_MS)
+    assert_array_equal(closes, np.arange(51, 102, dtype=np.float64))
+    # Bar 101 was appended to the series in memory instead of reading the store again
+    assert store.reads == 1
+    assert_array_equal(store.read("BTCUSDT", "5m", start_ms=101 * BAR_MS)[0], [101 * BAR_MS, 102 * BAR_MS])
+
+
+def test_failing_symbol_is_skipped(store):
+    evaluated = []
+    clock = FakeClock(100 * BAR_MS / 1000)
+    daemon = make_daemon(store, clock, evaluated)
+    daemon.symbols = ["BTCUSDT", "ETHUSDT"]
+    daemon.fetch_all = lambda symbols, start_ms: {"BTCUSDT": {"klines": make_klines(95, 101),
+                                                              "current_price": "101.0", "order_book": None},
+                                                  "ETHUSDT": {"klines": [["bad"]]}}
+    close_ms = daemon.wait_for_close()
+    assert [sym for sym, _ in daemon.evaluate_bar(close_ms, 50 * BAR_MS)] == ["BTCUSDT"]
+    assert daemon.last_evaluated == {"BTCUSDT": 100 * BAR_MS}
+
+    # Only the symbol that failed is fetched again for the same bar
+    fetches = []
+    daemon.fetch_all = lambda symbols, start_ms: fetches.append(list(symbols)) or {}
+    assert list(daemon.evaluate_bar(close_ms, 50 * BAR_MS)) == []
+    assert fetches == [["ETHUSDT"]]
@@ -0,0 +1,107 @@
+import time
+import logging
+import threading
+from scripts.deadline import Deadline, CircuitBreaker, apply_last_good
+from scripts.worker import build_stage_runner, process_sentiment_analyzers
+
+logger = logging.getLogger("test_deadline")
+
+
+def test_deadline_expires():
+    deadline = Deadline.after(0.05)
+    assert not deadline.expired()
+    assert 0 < deadline.budget(10) <= 0.05
+    assert deadline.budget(0.01) == 0.01
+    time.sleep(0.06)
+    assert deadline.expired()
+    assert deadline.remaining() == deadline.budget(10) == 0
+    # Counted from the given start, e.g. the bar close
+    assert Deadline.after(30, start=time.time() - 60).expired()
+
+
+def test_circuit_breaker_opens_and_resets():
+    breaker = CircuitBreaker("news", failure_threshold=3, reset_timeout=0.05)
+    assert not breaker.record_failure() and not breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+    time.sleep(0.06)
+    # A single trial call once reset_timeout has passed. Failing it opens the breaker again
+    assert breaker.allow() and not breaker.allow()
+    assert breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow() and breaker.allow()
+
+
+def stage_runner(failures=2, reset=0.1, budgets=None):
+    return build_stage_runner({"circuit_breaker_failures": failures, "circuit_breaker_reset": reset,
+                               "stage_budgets": budgets or {"news": 0.05}}, logger)
+
+
+def test_stage_runner_falls_back_to_the_last_value():
+    runner = stage_runner(failures=10)
+    deadline = Deadline.after(10)
+    assert runner.run("news", "bing", "BTCUSDT", deadline, lambda: "fresh") == ("fresh", False)
+
+    def fail():
+        raise ConnectionError("down")
+    assert runner.run("news", "bing", "BTCUSDT", deadline, fail) == ("fresh", True)
+    # Overrunning the news budget
+    release = threading.Event()
+    assert runner.run("news", "bing", "BTCUSDT", deadline, release.wait) == ("fresh", True)
+    release.set()
+    # No last value for another key, or not wanted
+    assert runner.run("news", "bing", "ETHUSDT", deadline, fail) == (None, True)
+    assert runner.run("news", "bing", "BTCUSDT", deadline, fail, fallback=False) == (None, True)
+
+
+def test_stage_runner_skips_an_open_breaker_and_an_expired_deadline():
+    runner = stage_runner(failures=2, reset=0.1)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ConnectionError("down")
+    deadline = Deadline.after(10)
+    runner.run("news", "bing", "BTCUSDT", deadline, lambda: "fresh")
+    for _ in range(4):
+        assert runner.run("news", "bing", "BTCUSDT", deadline, fail) == ("fresh", True)
+    assert len(calls) == 2 and runner.breaker("bing").is_open
+    time.sleep(0.11)
+    assert runner.run("news", "bing", "BTCUSDT", deadline, lambda: "recovered") == ("recovered", False)
+    assert not runner.breaker("bing").is_open
+
+    assert runner.run("news", "bing", "BTCUSDT", Deadline.after(0), fail) == ("recovered", True)
+    assert len(calls) == 2
+
+
+def test_last_good_results_fill_in_stale_ones():
+    last_good = {}
+    fresh = {"Reddit": {"sentiment_score": 0.25, "stale": False}, "Twitter": {"sentiment_score": None, "stale": True}}
+    # Nothing to fall back to yet
+    assert apply_last_good(fresh, last_good) == {"Reddit": {"sentiment_score": 0.25, "stale": False}}
+    stale = {"Reddit": {"sentiment_score": None, "stale": True}, "Twitter": {"sentiment_score": 0.5, "stale": False}}
+    assert apply_last_good(stale, last_good) == {"Reddit": {"sentiment_score": 0.25, "stale": True},
+                                                 "Twitter": {"sentiment_score": 0.5, "stale": False}}
+    assert last_good == {"Reddit": {"sentiment_score": 0.25, "stale": False},
+                         "Twitter": {"sentiment_score": 0.5, "stale": False}}
+
+
+def test_workers_leave_the_fallback_to_the_main_process():
+    class SlowAnalyzer:
+        name = "Slow"
+
+        def analyze(self, symbol):
+            time.sleep(0.2)
+
+        def get_scores(self, results):
+            return 1.0
+
+    runner = stage_runner(budgets={"sentiment": 0.05})
+    # Worker caches don't fall back, the main process does
+    runner.cache[("Slow", "BTCUSDT")] = 0.5
+    results = process_sentiment_analyzers([SlowAnalyzer()], "BTCUSDT", runner, Deadline.after(10))
+    assert results == {"Slow": {"sentiment_score": None, "stale": True}}
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+import talib
+from indicators.bollinger_bands.boll_bands import bollinger_kernel
+from indicators.incremental import (IncrementalSMA, IncrementalEMA, IncrementalMACD, IncrementalATR, IncrementalADX,
+                                    IncrementalOBV, IncrementalBollingerBands)
+from indicators.on_balance_volume.obv import OBV
+
+BARS = 3000
+# Bars before the data starts, e.g. a symbol listed after the others in a stacked array
+NAN_PREFIX = 20
+
+
+@pytest.fixture(scope="module", params=[0, NAN_PREFIX], ids=["bars", "nan_prefix"])
+def ohlcv(request):
+    rng = np.random.default_rng(9)
+    close = 100 + np.cumsum(rng.normal(0, 1, BARS))
+    high = close + rng.random(BARS)
+    low = close - rng.random(BARS)
+    volume = rng.random(BARS) * 100
+    ohlcv = np.vstack([close, high, low, close, volume])
+    ohlcv[:, :request.param] = np.nan
+    return ohlcv
+
+
+def feed(indicator, ohlcv):
+    """ Returns: The value after every bar, updated one bar at a time """
+    return [indicator.update_bar(ohlcv[:, i]) for i in range(ohlcv.shape[1])]
+
+
+def assert_matches(values, expected, rtol=1e-11):
+    """ None while warming up where the batch value is NaN """
+    values = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    np.testing.assert_allclose(values, expected, rtol=rtol, atol=1e-9)
+
+
+@pytest.mark.parametrize("period", [1, 5, 30])
+def test_moving_averages(ohlcv, period):
+    close = ohlcv[3]
+    assert_matches(feed(IncrementalSMA(period), ohlcv), talib.SMA(close, timeperiod=period))
+    assert_matches(feed(IncrementalEMA(period), ohlcv), talib.EMA(close, timeperiod=period))
+
+
+@pytest.mark.parametrize("fast_period, slow_period, signal_period", [(12, 26, 9), (5, 3, 4)])
+def test_macd(ohlcv, fast_period, slow_period, signal_period):
+    values = feed(IncrementalMACD(fast_period, slow_period, signal_period), ohlcv)
+    expected = talib.MACD(ohlcv[3], fast_period, slow_period, signal_period)
+    for i in range(3):
+        assert_matches([None if value is None else value[i] for value in values], expected[i])
+
+
+@pytest.mark.parametrize("period", [1, 14])
+def test_atr(ohlcv, period):
+    assert_matches(feed(IncrementalATR(period), ohlcv), talib.ATR(ohlcv[1], ohlcv[2], ohlcv[3], timeperiod=period))
+
+
+@pytest.mark.parametrize("period", [2, 14])
+def test_adx(ohlcv, period):
+    assert_matches(feed(IncrementalADX(period), ohlcv), talib.ADX(ohlcv[1], ohlcv[2], ohlcv[3], timeperiod=period))
+
+
+def test_obv(ohlcv):
+    expected = OBV().calculate(closing_prices=ohlcv[3], volumes=ohlcv[4]).to_numpy(copy=True)
+    # The DataFrame version counts no volume over the NaN bars instead of leaving them undefined
+    expected[np.isnan(ohlcv[3])] = np.nan
+    assert_matches(feed(IncrementalOBV(), ohlcv), expected)
+
+
+def test_bollinger_bands(ohlcv):
+    values = feed(IncrementalBollingerBands(20, 2), ohlcv)
+    bands = bollinger_kernel(ohlcv[3], 20, 2)
+    for key in ("upper_band", "middle_band", "lower_band"):
+        # The kernel's variance comes from sums of squares, which keeps fewer digits than Welford's method
+        assert_matches([None if value is None else value[key] for value in values], bands[key], rtol=1e-9)
+
+
+def test_extend_matches_updates(ohlcv):
+    indicator = IncrementalATR(14)
+    assert indicator.extend(ohlcv[:, :1000]) == feed(IncrementalATR(14), ohlcv[:, :1000])[-1]
+    assert indicator.update_bar(ohlcv[:, 1000]) == feed(IncrementalATR(14), ohlcv[:, :1001])[-1]
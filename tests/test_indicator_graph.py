@@ -0,0 +1,170 @@
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+from indicators.base_indicator import BaseIndicator
+from indicators.indicator_graph import IndicatorGraph
+from scripts.constants import Constants
+from scripts.market_snapshot import MarketSnapshot
+from scripts.strategy_factory import StrategyFactory
+
+logger = logging.getLogger("test_indicator_graph")
+FIVE_MINUTES = 300000
+# Every indicator with its dependencies installed here, IchimokuCloud needs the `ta` package
+INDICATORS = [
+    ("ADX", {}),
+    ("BollingerBands", {"window_size": 20, "num_std": 2}),
+    ("DoubleTopBottom", {}),
+    ("EWT", {}),
+    ("FibonacciRetracements", {}),
+    ("HeadAndShoulders", {}),
+    ("MACD", {}),
+    ("OBA", {}),
+    ("OBV", {}),
+    ("RSI", {}),
+    ("StochasticOscillator", {"interval": "1h"}),
+    ("Supertrend", {}),
+    ("Triangle", {}),
+    ("VWAP", {}),
+]
+
+
+def build_indicators():
+    indicators = []
+    for name, parameters in INDICATORS:
+        parameters = dict(parameters)
+        interval = parameters.pop("interval", None)
+        indicator = StrategyFactory.create_strategy(name, **parameters)
+        if interval:
+            indicator.interval = interval
+        indicators.append(indicator)
+    return indicators
+
+
+def make_snapshot(symbol, rng, bars=600, start=0):
+    timestamps = (start + np.arange(bars, dtype=np.int64)) * FIVE_MINUTES
+    close = 100 + np.cumsum(rng.normal(0, 1, bars))
+    high = close + rng.random(bars)
+    low = close - rng.random(bars)
+    ohlcv = np.vstack([close + rng.normal(0, 0.2, bars), high, low, close, rng.random(bars) * 100])
+    order_book = {"bids": [[close[-1] - i, rng.random()] for i in range(10)],
+                  "asks": [[close[-1] + i, rng.random()] for i in range(10)]}
+    return MarketSnapshot(symbol, "5m", timestamps, ohlcv, order_book=order_book)
+
+
+def assert_same(result, expected, path="results"):
+    if isinstance(expected, dict):
+        assert set(result) == set(expected), path
+        for key in expected:
+            assert_same(result[key], expected[key], "{}[{!r}]".format(path, key))
+    elif isinstance(expected, (list, tuple)):
+        assert len(result) == len(expected), path
+        for i, (value, expected_value) in enumerate(zip(result, expected)):
+            assert_same(value, expected_value, "{}[{}]".format(path, i))
+    elif isinstance(expected, (pd.Series, np.ndarray, float, np.floating)):
+        np.testing.assert_allclose(np.asarray(result, dtype=np.float64), np.asarray(expected, dtype=np.float64),
+                                   rtol=1e-9, atol=1e-9, err_msg=path)
+    else:
+        assert result == expected, path
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return IndicatorGraph(build_indicators(), logger, max_workers=4)
+
+
+def test_run_batch_matches_run(graph, monkeypatch):
+    groups = []
+    run_group = graph.run_group
+    monkeypatch.setattr(graph, "run_group", lambda snapshots: groups.append(
+        [snapshot.symbol for snapshot in snapshots]) or run_group(snapshots))
+    rng = np.random.default_rng(4)
+    snapshots = [make_snapshot("AAAUSDT", rng), make_snapshot("BBBUSDT", rng),
+                 # Open one bar later, and with fewer bars: groups of their own
+                 make_snapshot("CCCUSDT", rng, start=1), make_snapshot("DDDUSDT", rng, bars=500),
+                 make_snapshot("EEEUSDT", rng), make_snapshot("FFFUSDT", rng, start=1)]
+    batch = graph.run_batch(snapshots)
+    assert groups == [["AAAUSDT", "BBBUSDT", "EEEUSDT"], ["CCCUSDT", "FFFUSDT"]]
+    separate = [graph.run(snapshot) for snapshot in snapshots]
+    assert len(batch) == len(snapshots)
+    for snapshot, result, expected in zip(snapshots, batch, separate):
+        assert set(expected) == {name for name, _ in INDICATORS}, snapshot.symbol
+        assert_same(result, expected, snapshot.symbol)
+    # Not just failures: the indicators come to actual decisions
+    signals = {result[name]["signal"] for result in batch for name in result if name != "RSI"}
+    assert {"buy", "sell"} <= signals
+
+
+class Stub(BaseIndicator):
+    """ Indicator reading the results of the indicators named in `inputs` """
+    def __init__(self, name, inputs=(), log=None):
+        self._name = name
+        self.inputs = tuple(inputs)
+        self.log = log
+
+    @property
+    def name(self):
+        return self._name
+
+    def calculate(self, **data):
+        self.log.append(self._name)
+        return len(data["closing_prices"])
+
+    def decide_signal(self, **data):
+        """ Returns: The signals of the dependencies it got """
+        return {dependency: data[dependency]["signal"] for dependency in self.inputs if dependency in data}
+
+
+def test_topological_order():
+    graph = IndicatorGraph([Stub("EWT", ["RSI", "MACD", "closing_prices"]), Stub("MACD", ["closing_prices"]),
+                            Stub("Signal", ["EWT"]), Stub("RSI", ["closing_prices"])], logger)
+    order = graph.order
+    assert sorted(order) == ["EWT", "MACD", "RSI", "Signal"]
+    assert order.index("RSI") < order.index("EWT") and order.index("MACD") < order.index("EWT") < order.index("Signal")
+    assert graph.dependencies == {"EWT": {"RSI", "MACD"}, "MACD": set(), "Signal": {"EWT"}, "RSI": set()}
+
+
+def test_dependency_cycles_are_rejected():
+    with pytest.raises(ValueError, match="A, B"):
+        IndicatorGraph([Stub("A", ["B"]), Stub("B", ["A"]), Stub("C")], logger)
+    # Reading its own output is not a dependency
+    assert IndicatorGraph([Stub("A", ["A"])], logger).order == ["A"]
+
+
+def test_run_passes_dependency_results():
+    log = []
+    graph = IndicatorGraph([Stub("Signal", ["EWT"], log), Stub("EWT", ["RSI"], log), Stub("RSI", [], log)], logger,
+                           max_workers=4)
+    rng = np.random.default_rng(0)
+    results = graph.run(make_snapshot("AAAUSDT", rng, bars=10))
+    assert log == ["RSI", "EWT", "Signal"]
+    assert list(results) == ["RSI", "EWT", "Signal"]
+    assert results["Signal"] == {"calculations": 10, "signal": {"EWT": {"RSI": {}}}}
+
+
+class Failing(Stub):
+    def calculate(self, **data):
+        raise ValueError("no data")
+
+
+def test_dependents_of_a_failed_indicator_still_run():
+    log = []
+    graph = IndicatorGraph([Failing("RSI", [], log), Stub("EWT", ["RSI"], log)], logger)
+    results = graph.run(make_snapshot("AAAUSDT", np.random.default_rng(0), bars=10))
+    assert results == {"EWT": {"calculations": 10, "signal": {}}}
+
+
+def test_short_resampled_series_are_reported(caplog):
+    daily = StrategyFactory.create_strategy("StochasticOscillator")
+    daily.interval = "1d"
+    hourly = StrategyFactory.create_strategy("StochasticOscillator")
+    hourly.interval = "1h"
+    snapshot = make_snapshot("BTCUSDT", np.random.default_rng(0), bars=288)
+    with caplog.at_level(logging.WARNING, logger="test_indicator_graph"):
+        results = IndicatorGraph([daily], logger).run(snapshot)
+    assert results["StochasticOscillator"]["signal"] == Constants.UNKNOWN_SIGNAL
+    assert "Only 1 1d bars resampled from the BTCUSDT 5m bars, StochasticOscillator needs 16" in caplog.text
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="test_indicator_graph"):
+        IndicatorGraph([hourly], logger).run(snapshot)
+    assert "resampled" not in caplog.text
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from scripts.journal import RunJournal, tail_values
+from scripts.market_snapshot import MarketSnapshot
+
+DAY_MS = 86400000
+FIRST_DAY = pd.Timestamp("2024-03-01 23:59:00").value // 10 ** 6
+
+
+def evaluation(bar_time):
+    ohlcv = np.vstack([np.full(3, 100.), np.full(3, 101.), np.full(3, 99.), [100., 100.5, 101.], np.ones(3)])
+    return {"snapshot": MarketSnapshot("BTCUSDT", "5m", bar_time + np.arange(-2, 1) * 300000, ohlcv),
+            "indicators": {"RSI": {"calculations": np.array([40., 55.]), "signal": ["hold", "hold"]},
+                           "VWAP": {"calculations": {"vwap": 100.4, "vwap_values": pd.Series([100.2, 100.4])},
+                                    "signal": "buy"}},
+            "sentiment": {"Reddit": {"sentiment_score": 0.25, "stale": False},
+                          "Twitter": {"sentiment_score": "positive", "stale": True}},
+            "stale": ["Twitter"],
+            "decision": {"BTCUSDT": {"decision": "buy", "quantity": 0.1}}}
+
+
+def record_at(monkeypatch, recorded_at, record, *args):
+    monkeypatch.setattr(time, "time", lambda: recorded_at / 1000)
+    record(*args)
+    monkeypatch.undo()
+
+
+def test_round_trip_through_one_database_per_day(tmp_path, monkeypatch):
+    with RunJournal(str(tmp_path), run="run-1", flush_interval=0.01) as journal:
+        record_at(monkeypatch, FIRST_DAY, journal.record, "BTCUSDT", evaluation(FIRST_DAY - 60000))
+        record_at(monkeypatch, FIRST_DAY + 1000, journal.record_order, "BTCUSDT", "buy", 0.1, {"orderId": 7})
+        record_at(monkeypatch, FIRST_DAY + DAY_MS, journal.record_order, "ETHUSDT", "sell", "2.5", {"orderId": 8})
+    assert sorted(os.listdir(tmp_path)) == ["20240301.sqlite", "20240302.sqlite"]
+
+    journal = RunJournal(str(tmp_path))
+    signals = journal.query("signals")
+    assert signals[["symbol", "indicator", "signal"]].values.tolist() == [
+        ["BTCUSDT", "RSI", json.dumps(["hold", "hold"])], ["BTCUSDT", "VWAP", "buy"]]
+    assert (signals["bar_time"] == FIRST_DAY - 60000).all() and (signals["run"] == "run-1").all()
+    values = journal.query("indicator_values")
+    assert dict(zip(values["indicator"] + ":" + values["key"], values["value"])) == {
+        "RSI:value": 55., "VWAP:vwap": 100.4, "VWAP:vwap_values": 100.4}
+    sentiment = journal.query("sentiment")
+    assert sentiment["analyzer"].tolist() == ["Reddit", "Twitter"] and sentiment["stale"].tolist() == [0, 1]
+    # Scores that aren't numbers are kept as JSON text
+    assert sentiment["score"][0] == 0.25 and pd.isna(sentiment["score"][1])
+    assert pd.isna(sentiment["score_text"][0]) and sentiment["score_text"][1] == '"positive"'
+    decision, = journal.query("decisions").to_dict("records")
+    assert (decision["decision"], decision["quantity"], json.loads(decision["stale"])) == ("buy", 0.1, ["Twitter"])
+
+    orders = journal.query("orders")
+    assert orders[["symbol", "side", "quantity"]].values.tolist() == [["BTCUSDT", "buy", 0.1], ["ETHUSDT", "sell", 2.5]]
+    assert json.loads(orders["response"][1]) == {"orderId": 8}
+    assert journal.query("orders", symbol="ETHUSDT")["side"].tolist() == ["sell"]
+    assert journal.query("orders", start="2024-03-02")["symbol"].tolist() == ["ETHUSDT"]
+    assert journal.query("orders", end=FIRST_DAY + 1000)["symbol"].tolist() == ["BTCUSDT"]
+    assert journal.query("orders", start="2024-03-03").empty
+
+
+def test_query_checks_the_table(tmp_path):
+    with pytest.raises(ValueError):
+        RunJournal(str(tmp_path)).query("trades")
+    assert list(RunJournal(str(tmp_path)).query("orders").columns) == [
+        "recorded_at", "run", "symbol", "side", "quantity", "response"]
+
+
+def test_tail_values():
+    calculations = {"macd": (np.array([1., 2.]), np.array([0.5, 1.5])), "bands": np.array([[1., 2.], [3., 4.]]),
+                    "frame": pd.DataFrame({"a": [1., 5.]}), "empty": [], "name": "up", "flag": True}
+    assert dict(tail_values(calculations)) == {"macd.0": 2., "macd.1": 1.5, "bands.0": 2., "bands.1": 4.,
+                                               "frame.a": 5., "flag": 1.}
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+import talib
+from indicators import kernels
+from indicators.kernels_benchmark import sliding_max_deque, stochastic_loop
+from indicators.bollinger_bands.boll_bands import bollinger_kernel
+from indicators.stochastic_oscillator.stoc_osc import stochastic_kernel
+
+BARS = 2000
+
+
+@pytest.fixture(scope="module")
+def prices():
+    rng = np.random.default_rng(5)
+    close = 100 + np.cumsum(rng.normal(0, 1, (3, BARS)), axis=-1)
+    return close + rng.random((3, BARS)), close - rng.random((3, BARS)), close
+
+
+def rolling(values, window):
+    return pd.Series(values).rolling(window)
+
+
+@pytest.mark.parametrize("window", [1, 2, 14, 200])
+def test_sliding_extremes_match_pandas_and_the_deque(prices, window):
+    high, low, _ = prices
+    maxima = kernels.sliding_max(high, window)
+    minima = kernels.sliding_min(low, window)
+    assert maxima.shape == minima.shape == high.shape
+    for i in range(len(high)):
+        np.testing.assert_array_equal(maxima[i], rolling(high[i], window).max().to_numpy())
+        np.testing.assert_array_equal(minima[i], rolling(low[i], window).min().to_numpy())
+        np.testing.assert_array_equal(maxima[i], sliding_max_deque(high[i], window))
+    np.testing.assert_array_equal(kernels.sliding_max(high[0], window), maxima[0])
+
+
+@pytest.mark.parametrize("window", [3, 7, 64])
+def test_sliding_extremes_on_trends(window):
+    # A steady downtrend is the worst case for rescanning the window, every bar pushes the max out of it
+    trend = np.vstack([np.arange(300, dtype=np.float64)[::-1], np.arange(300, dtype=np.float64)])
+    maxima = kernels.sliding_max(trend, window)
+    minima = kernels.sliding_min(trend, window)
+    for i in range(len(trend)):
+        np.testing.assert_array_equal(maxima[i], rolling(trend[i], window).max().to_numpy())
+        np.testing.assert_array_equal(minima[i], rolling(trend[i], window).min().to_numpy())
+    assert np.isnan(kernels.sliding_max(trend[0, :window - 1], window)).all()
+
+
+def test_rolling_var_keeps_its_digits_at_high_price_levels():
+    rng = np.random.default_rng(7)
+    close = 60000 + np.cumsum(rng.normal(0, 0.01, BARS))
+    close[500:520] = close[499]
+    _, variance = kernels.rolling_mean_var(close, 20)
+    expected = np.array([np.var(close[i - 19:i + 1]) for i in range(19, BARS)])
+    np.testing.assert_allclose(variance[19:], expected, rtol=1e-6, atol=1e-12)
+    assert (variance[19:] >= 0).all()
+
+
+@pytest.mark.parametrize("window", [2, 20, 200])
+@pytest.mark.parametrize("ddof", [0, 1])
+def test_rolling_mean_var_matches_pandas(prices, window, ddof):
+    close = prices[2]
+    mean, variance = kernels.rolling_mean_var(close, window, ddof)
+    for i in range(len(close)):
+        np.testing.assert_allclose(mean[i], rolling(close[i], window).mean().to_numpy(), rtol=1e-9)
+        # Variance from sums of squares loses the digits the price level takes, relative to the price squared
+        np.testing.assert_allclose(variance[i], rolling(close[i], window).var(ddof=ddof).to_numpy(),
+                                   rtol=0, atol=1e-9 * np.max(close[i]) ** 2)
+
+
+def test_rows_apply_talib_to_every_symbol(prices):
+    high, low, close = prices
+    for i in range(len(close)):
+        np.testing.assert_array_equal(kernels.sma(close, 20)[i], talib.SMA(close[i], timeperiod=20))
+        np.testing.assert_array_equal(kernels.ema(close, 20)[i], talib.EMA(close[i], timeperiod=20))
+        np.testing.assert_array_equal(kernels.true_range(high, low, close)[i], talib.TRANGE(high[i], low[i], close[i]))
+        np.testing.assert_array_equal(kernels.atr(high, low, close, 14)[i],
+                                      talib.ATR(high[i], low[i], close[i], timeperiod=14))
+    np.testing.assert_array_equal(kernels.atr(high[0], low[0], close[0], 14),
+                                  talib.ATR(high[0], low[0], close[0], timeperiod=14))
+
+
+def test_bollinger_matches_pandas(prices):
+    close = prices[2]
+    bands = bollinger_kernel(close, 20, 2)
+    for i in range(len(close)):
+        mean = rolling(close[i], 20).mean().to_numpy()
+        std = rolling(close[i], 20).std(ddof=0).to_numpy()
+        np.testing.assert_allclose(bands["middle_band"][i], mean, rtol=1e-9)
+        np.testing.assert_allclose(bands["upper_band"][i], mean + 2 * std, rtol=1e-9)
+        np.testing.assert_allclose(bands["lower_band"][i], mean - 2 * std, rtol=1e-9)
+
+
+def test_stochastic_matches_the_loop(prices):
+    oscillator = stochastic_kernel(*prices, k_period=14, d_period=3)
+    for i, (high, low, close) in enumerate(zip(*prices)):
+        K, D = stochastic_loop(high, low, close, 14, 3)
+        np.testing.assert_allclose([oscillator["K"][i, -1], oscillator["D"][i, -1]], [K, D], rtol=1e-9)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_array_equal
+from scripts.kline_decoder import decode_klines
+
+# GET /api/v3/klines response: prices and volumes are strings, open and close times integers
+KLINES = [
+    [1700000000000, "37000.01000000", "37050.00000000", "36990.50000000", "37020.99000000", "12.34567000",
+     1700000299999, "456789.12345678", 1234, "6.00000000", "222222.22222222", "0"],
+    [1700000300000, "37020.99000000", "37100.10000000", "37000.00000000", "37099.00000000", "0.00100000",
+     1700000599999, "37.09900000", 3, "0.00000000", "0.00000000", "0"],
+    [1700000600000, "37099.00000000", "37099.00000000", "36800.12345678", "36801.00000000", "1000.00000000",
+     1700000899999, "36801000.00000000", 98765, "500.00000000", "18400500.00000000", "0"],
+]
+
+
+def convert_to_dataframe(klines):
+    """ The pandas path decode_klines replaced """
+    df = pd.DataFrame(klines,
+                      columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time',
+                               'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume',
+                               'taker_buy_quote_asset_volume', 'ignored'])
+    df = df.drop(columns=['close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume',
+                          'taker_buy_quote_asset_volume', 'ignored'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df.set_index('timestamp', inplace=True)
+    return df
+
+
+def test_decode_klines_matches_the_pandas_path():
+    open_times, ohlcv = decode_klines(KLINES)
+    assert open_times.dtype == np.int64 and ohlcv.dtype == np.float64
+    assert open_times.shape == (3,) and ohlcv.shape == (5, 3)
+    assert ohlcv.flags['C_CONTIGUOUS']
+    assert_array_equal(open_times, [1700000000000, 1700000300000, 1700000600000])
+    assert_array_equal(ohlcv[:, 0], [37000.01, 37050.0, 36990.5, 37020.99, 12.34567])
+
+    df = convert_to_dataframe(KLINES)
+    assert_array_equal(pd.to_datetime(open_times, unit='ms'), df.index)
+    assert_array_equal(ohlcv, df[['open', 'high', 'low', 'close', 'volume']].astype(float).to_numpy().T)
+
+
+def test_decode_no_klines():
+    open_times, ohlcv = decode_klines([])
+    assert open_times.shape == (0,) and open_times.dtype == np.int64
+    assert ohlcv.shape == (5, 0) and ohlcv.dtype == np.float64
@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from scripts.kline_store import KlineStore
+
+BAR_MS = 300000
+
+
+def make_klines(first, bars, close=100.0):
+    """ Returns: Raw 5m klines as the Binance REST API returns them, opening at bar `first` """
+    return [[(first + i) * BAR_MS, str(close + i - 0.5), str(close + i + 1), str(close + i - 1),
+             str(close + i), str(10.0 + i), (first + i + 1) * BAR_MS - 1, "0", 1, "0", "0", "0"]
+            for i in range(bars)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return KlineStore(root=str(tmp_path), max_segments=4)
+
+
+def test_append_and_read(store):
+    assert store.span("BTCUSDT", "5m") is None
+    assert store.append("BTCUSDT", "5m", make_klines(0, 10)) == 10
+    open_times, ohlcv = store.read("BTCUSDT", "5m")
+    assert_array_equal(open_times, np.arange(10) * BAR_MS)
+    assert ohlcv.shape == (5, 10)
+    assert_array_equal(ohlcv[3], 100.0 + np.arange(10))
+    assert store.span("BTCUSDT", "5m") == (0, 9 * BAR_MS)
+
+    open_times, ohlcv = store.read("BTCUSDT", "5m", start_ms=3 * BAR_MS, end_ms=5 * BAR_MS)
+    assert_array_equal(open_times, [3 * BAR_MS, 4 * BAR_MS, 5 * BAR_MS])
+    assert_array_equal(ohlcv[3], [103.0, 104.0, 105.0])
+    assert len(store.read("ETHUSDT", "5m")[0]) == 0
+
+
+def test_later_segments_replace_overlapping_bars(store):
+    store.append("BTCUSDT", "5m", make_klines(0, 10))
+    # The bar at 9 was still open when it was first fetched
+    store.append("BTCUSDT", "5m", make_klines(9, 5, close=200.0))
+    open_times, ohlcv = store.read("BTCUSDT", "5m")
+    assert_array_equal(open_times, np.arange(14) * BAR_MS)
+    assert_array_equal(ohlcv[3], np.concatenate((100.0 + np.arange(9), 200.0 + np.arange(5))))
+
+
+def test_compaction_keeps_the_latest_bars(store):
+    for i in range(6):
+        store.append("BTCUSDT", "5m", make_klines(2 * i, 3, close=100.0 * (i + 1)))
+    assert len(os.listdir(os.path.join(store.root, "5m", "BTCUSDT"))) <= store.max_segments
+    open_times, ohlcv = store.read("BTCUSDT", "5m")
+    assert_array_equal(open_times, np.arange(13) * BAR_MS)
+    # Every even bar was rewritten by the next segment, bar 12 only by the last one
+    assert_array_equal(ohlcv[3, ::2], [100.0, 200.0, 300.0, 400.0, 500.0, 600.0, 602.0])
+
+
+def test_fetch_start(store):
+    assert store.fetch_start("BTCUSDT", "5m", 0) == 0
+    store.append("BTCUSDT", "5m", make_klines(0, 10))
+    # Covered up to the last bar, which is fetched again
+    assert store.fetch_start("BTCUSDT", "5m", 2 * BAR_MS) == 9 * BAR_MS
+    # Nothing stored before the start or after the end of the window
+    store.append("ETHUSDT", "5m", make_klines(5, 5))
+    assert store.fetch_start("ETHUSDT", "5m", 0) == 0
+    assert store.fetch_start("BTCUSDT", "5m", 20 * BAR_MS) == 20 * BAR_MS
+
+
+def test_fetch_start_refills_gaps(store):
+    store.append("BTCUSDT", "5m", make_klines(0, 10))
+    store.append("BTCUSDT", "5m", make_klines(15, 5))
+    store.append("BTCUSDT", "5m", make_klines(25, 5))
+    assert store.fetch_start("BTCUSDT", "5m", 0) == 10 * BAR_MS
+    # A gap before the window doesn't matter
+    assert store.fetch_start("BTCUSDT", "5m", 16 * BAR_MS) == 20 * BAR_MS
+    store.append("BTCUSDT", "5m", make_klines(10, 15))
+    assert store.fetch_start("BTCUSDT", "5m", 0) == 29 * BAR_MS
+
+
+def test_fetch_start_skips_ranges_the_exchange_has_no_bars_for(store):
+    # Listed after the start of the window, with a maintenance window between bars 10 and 15
+    klines = make_klines(5, 5) + make_klines(15, 5)
+    store.append("BTCUSDT", "5m", klines, covered_from=0)
+    assert store.fetch_start("BTCUSDT", "5m", 0) == 19 * BAR_MS
+    assert store.fetch_start("BTCUSDT", "5m", 12 * BAR_MS) == 19 * BAR_MS
+    assert_array_equal(store.coverage("BTCUSDT", "5m"), [[0, 19 * BAR_MS]])
+    # Coverage survives compaction
+    store.compact("BTCUSDT", "5m")
+    assert store.fetch_start("BTCUSDT", "5m", 0) == 19 * BAR_MS
@@ -0,0 +1,35 @@
+import numpy as np
+from scripts.market_snapshot import MarketSnapshot
+
+
+def make_snapshot(bars, current_price=None):
+    timestamps = np.arange(bars, dtype=np.int64) * 300000
+    closing_prices = 100 + np.arange(bars, dtype=np.float64)
+    ohlcv = np.vstack([closing_prices - 0.5, closing_prices + 1, closing_prices - 1, closing_prices,
+                       np.ones(bars)])
+    return MarketSnapshot("BTCUSDT", "5m", timestamps, ohlcv, current_price=current_price)
+
+
+def test_latest_and_extreme_prices():
+    snapshot = make_snapshot(24)
+    assert len(snapshot) == 24
+    assert snapshot.current_price == snapshot.closing_price == 123
+    assert snapshot.opening_price == 99.5
+    assert snapshot.highest_price == 124
+    assert snapshot.lowest_price == 99
+
+
+def test_no_bars():
+    ohlcv = np.empty((5, 0), dtype=np.float64)
+    snapshot = MarketSnapshot("NEWUSDT", "5m", np.empty(0, dtype=np.int64), ohlcv)
+    assert len(snapshot) == 0
+    data = snapshot.as_dict()
+    for key in ("current_price", "opening_price", "highest_price", "lowest_price", "closing_price"):
+        assert np.isnan(data[key])
+    assert len(data["closing_prices"]) == 0
+    assert len(snapshot.timeframe("1h")) == 0
+
+
+def test_no_bars_keeps_the_ticker_price():
+    snapshot = MarketSnapshot("NEWUSDT", "5m", np.empty(0, dtype=np.int64), np.empty((5, 0)), current_price="0.25")
+    assert snapshot.current_price == 0.25
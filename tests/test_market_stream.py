@@ -0,0 +1,197 @@
+import json
+import asyncio
+import logging
+import numpy as np
+import websockets
+from numpy.testing import assert_array_equal
+from scripts.market_stream import OHLCVRingBuffer, MarketStream
+from scripts.replay_server import ReplayServer
+
+logger = logging.getLogger("test_market_stream")
+
+BAR_MS = 300000
+
+
+def kline_message(symbol, bar, closed=True, close=100.0):
+    return json.dumps({"stream": "{}@kline_5m".format(symbol.lower()),
+                       "data": {"e": "kline", "s": symbol,
+                                "k": {"t": bar * BAR_MS, "o": str(close - 0.5), "h": str(close + 1),
+                                      "l": str(close - 1), "c": str(close), "v": "10.0", "x": closed}}})
+
+
+def ticker_message(symbol, price):
+    return json.dumps({"stream": "{}@ticker".format(symbol.lower()), "data": {"e": "24hrTicker", "c": price}})
+
+
+def rest_klines(first, last):
+    """ Returns: Raw REST klines of bars first to last, as GET /api/v3/klines returns them """
+    return [[bar * BAR_MS, str(bar - 0.5), str(bar + 1), str(bar - 1), str(float(bar)), "10.0",
+             (bar + 1) * BAR_MS - 1] for bar in range(first, last + 1)]
+
+
+def test_ring_buffer_wraps_around():
+    buffer = OHLCVRingBuffer(capacity=3)
+    assert buffer.last_open_time() is None
+    assert buffer.view()[0].size == 0
+    for bar in range(5):
+        buffer.append(bar, (bar, bar + 1, bar - 1, bar, 10 * bar))
+    open_times, ohlcv = buffer.view()
+    assert buffer.size == 3
+    assert buffer.last_open_time() == 4
+    assert_array_equal(open_times, [2, 3, 4])
+    assert_array_equal(ohlcv[3], [2, 3, 4])
+    assert_array_equal(ohlcv[4], [20, 30, 40])
+    # A view into the buffer, not a copy
+    assert open_times.base is buffer.open_times
+
+    buffer.extend(np.arange(10, 20), np.tile(np.arange(10, 20, dtype=np.float64), (5, 1)))
+    open_times, ohlcv = buffer.view()
+    assert_array_equal(open_times, [17, 18, 19])
+    assert_array_equal(ohlcv[0], [17, 18, 19])
+
+
+def test_only_new_closed_klines_are_appended():
+    closes = []
+
+    async def on_bar_close(sym):
+        closes.append((sym, int(stream.buffers[sym].last_open_time())))
+
+    async def run():
+        await stream.handle_message(kline_message("BTCUSDT", 1))
+        await stream.handle_message(kline_message("BTCUSDT", 2, closed=False))
+        await stream.handle_message(kline_message("BTCUSDT", 1, close=200.0))
+        await stream.handle_message(kline_message("ETHUSDT", 1))
+        await stream.handle_message(ticker_message("BTCUSDT", "101.5"))
+        await asyncio.sleep(0)
+
+    stream = MarketStream(["BTCUSDT", "ETHUSDT"], "5m", on_bar_close, logger)
+    asyncio.run(run())
+    open_times, ohlcv = stream.buffers["BTCUSDT"].view()
+    assert_array_equal(open_times, [BAR_MS])
+    assert_array_equal(ohlcv[3], [100.0])
+    assert stream.current_prices == {"BTCUSDT": "101.5"}
+    assert sorted(closes) == [("BTCUSDT", BAR_MS), ("ETHUSDT", BAR_MS)]
+
+
+def test_bar_closes_do_not_block_the_stream():
+    release = {}
+    started = []
+
+    async def on_bar_close(sym):
+        started.append(sym)
+        release.setdefault(sym, asyncio.Event())
+        await release[sym].wait()
+
+    async def run():
+        # Both symbols are evaluated at once while the stream keeps being read
+        await stream.handle_message(kline_message("BTCUSDT", 1))
+        await stream.handle_message(kline_message("ETHUSDT", 1))
+        await asyncio.sleep(0)
+        await stream.handle_message(kline_message("BTCUSDT", 2))
+        await stream.handle_message(kline_message("BTCUSDT", 3))
+        await stream.handle_message(ticker_message("BTCUSDT", "99.0"))
+        assert started == ["BTCUSDT", "ETHUSDT"]
+        assert stream.buffers["BTCUSDT"].last_open_time() == 3 * BAR_MS
+        # Bar closes of a symbol still being evaluated are coalesced into one more evaluation
+        release["BTCUSDT"].set()
+        release["ETHUSDT"].set()
+        await asyncio.sleep(0.01)
+        return started
+
+    stream = MarketStream(["BTCUSDT", "ETHUSDT"], "5m", on_bar_close, logger)
+    assert asyncio.run(run()) == ["BTCUSDT", "ETHUSDT", "BTCUSDT"]
+    assert stream.current_prices["BTCUSDT"] == "99.0"
+
+
+def test_missed_klines_are_fetched_before_the_streamed_ones():
+    requests = []
+
+    def fetch_klines(sym, start_ms):
+        requests.append((sym, start_ms))
+        # Up to the bar that is still open
+        return rest_klines(start_ms // BAR_MS, 7)
+
+    async def on_bar_close(sym):
+        pass
+
+    async def run():
+        await stream.handle_message(kline_message("BTCUSDT", 1))
+        # Reconnected after bars 2 to 5 closed
+        await stream.handle_message(kline_message("BTCUSDT", 6))
+        await stream.handle_message(kline_message("BTCUSDT", 7))
+        await asyncio.sleep(0.05)
+
+    stream = MarketStream(["BTCUSDT"], "5m", on_bar_close, logger, fetch_klines=fetch_klines)
+    asyncio.run(run())
+    assert requests == [("BTCUSDT", 2 * BAR_MS)]
+    open_times, ohlcv = stream.buffers["BTCUSDT"].view()
+    assert_array_equal(open_times, np.arange(1, 8) * BAR_MS)
+    # Streamed bars, not the REST copy of the open bar
+    assert_array_equal(ohlcv[3], [100.0, 2.0, 3.0, 4.0, 5.0, 100.0, 100.0])
+
+
+def test_gap_longer_than_one_page_is_fetched_page_by_page():
+    requests = []
+
+    def fetch_klines(sym, start_ms):
+        requests.append(start_ms)
+        # Pages of at most 3 bars, up to the bar that is still open
+        first = -(-start_ms // BAR_MS)
+        return rest_klines(first, min(first + 2, 11))
+
+    async def on_bar_close(sym):
+        pass
+
+    async def run():
+        await stream.handle_message(kline_message("BTCUSDT", 1))
+        # Reconnected after bars 2 to 9 closed
+        await stream.handle_message(kline_message("BTCUSDT", 10))
+        await stream.handle_message(kline_message("BTCUSDT", 11))
+        await asyncio.sleep(0.05)
+
+    stream = MarketStream(["BTCUSDT"], "5m", on_bar_close, logger, fetch_klines=fetch_klines)
+    asyncio.run(run())
+    assert requests == [2 * BAR_MS, 4 * BAR_MS + 1, 7 * BAR_MS + 1]
+    open_times, ohlcv = stream.buffers["BTCUSDT"].view()
+    assert_array_equal(open_times, np.arange(1, 12) * BAR_MS)
+    assert_array_equal(ohlcv[3], [100.0] + list(range(2, 10)) + [100.0, 100.0])
+
+
+def test_recorded_stream_replays_into_the_same_buffers(tmp_path):
+    recording_path = str(tmp_path / "stream.jsonl")
+    messages = [kline_message("BTCUSDT", bar, close=100.0 + bar) for bar in range(5)]
+    messages += [kline_message("ETHUSDT", bar, closed=bar % 2 == 0, close=10.0 + bar) for bar in range(5)]
+    messages.append(ticker_message("BTCUSDT", "104.5"))
+
+    async def on_bar_close(sym):
+        pass
+
+    async def record():
+        for message in messages:
+            await recorder.handle_message(message)
+        recorder._record_file.close()
+
+    recorder = MarketStream(["BTCUSDT", "ETHUSDT"], "5m", on_bar_close, logger, record_path=recording_path)
+    asyncio.run(record())
+
+    async def replay():
+        server = ReplayServer(recording_path)
+        async with websockets.serve(server.handler, "localhost", 0) as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            replayed = MarketStream(["BTCUSDT", "ETHUSDT"], "5m", on_bar_close, logger,
+                                    url="ws://localhost:{}".format(port))
+            task = asyncio.ensure_future(replayed.run())
+            for _ in range(200):
+                if replayed.current_prices:
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+            return replayed
+
+    replayed = asyncio.run(replay())
+    assert len(ReplayServer(recording_path).messages) == len(messages)
+    assert replayed.current_prices == {"BTCUSDT": "104.5"}
+    for sym in ("BTCUSDT", "ETHUSDT"):
+        for recorded, streamed in zip(recorder.buffers[sym].view(), replayed.buffers[sym].view()):
+            assert_array_equal(recorded, streamed)
+    assert_array_equal(replayed.buffers["ETHUSDT"].view()[0], [0, 2 * BAR_MS, 4 * BAR_MS])
@@ -0,0 +1,89 @@
+import json
+import pytest
+from scripts.metrics import Metrics
+
+
+@pytest.fixture
+def metrics():
+    return Metrics(buckets=(0.1, 0.2, 0.5, 1.0), prefix="test_")
+
+
+def test_histogram_quantiles(metrics):
+    for _ in range(10):
+        metrics.observe("fetch_seconds", 0.05)
+        metrics.observe("fetch_seconds", 0.15)
+    counts, total, count = metrics.collect(reset=False)["histograms"][("fetch_seconds", ())]
+    assert counts == [10, 10, 0, 0, 0] and count == 20 and total == pytest.approx(2.0)
+    # Interpolated inside the bucket holding the rank
+    assert metrics.quantile(counts, 0.5) == pytest.approx(0.1)
+    assert metrics.quantile(counts, 0.9) == pytest.approx(0.18)
+    # Beyond the last bound only the bound is known
+    assert metrics.quantile([0, 0, 0, 0, 3], 0.99) == 1.0
+    assert metrics.quantile([0, 0, 0, 0, 0], 0.5) == 0.0
+
+
+def test_bucket_bounds_are_inclusive(metrics):
+    metrics.observe("fetch_seconds", 0.1)
+    metrics.observe("fetch_seconds", 0.1000001)
+    assert metrics.collect()["histograms"][("fetch_seconds", ())][0] == [1, 1, 0, 0, 0]
+
+
+def test_timer_counts_errors(metrics):
+    with metrics.timer("decision_seconds", source="gpt"):
+        pass
+    with pytest.raises(KeyError):
+        with metrics.timer("decision_seconds", source="gpt"):
+            raise KeyError("decision")
+    snapshot = metrics.collect()
+    assert snapshot["histograms"][("decision_seconds", (("source", "gpt"),))][2] == 2
+    assert snapshot["counters"] == {("errors_total", (("source", "gpt"), ("stage", "decision_seconds"))): 1}
+    assert metrics.collect() == {"histograms": {}, "counters": {}}
+
+
+def test_merge_adds_worker_snapshots(metrics):
+    worker = Metrics(buckets=metrics.buckets)
+    worker.observe("indicator_seconds", 0.3, indicator="RSI")
+    worker.increment("requests_total", endpoint="get_klines")
+    metrics.observe("indicator_seconds", 0.05, indicator="RSI")
+    metrics.merge(worker.collect())
+    metrics.merge({"histograms": {}, "counters": {("requests_total", (("endpoint", "get_klines"),)): 2}})
+    snapshot = metrics.collect()
+    assert snapshot["histograms"][("indicator_seconds", (("indicator", "RSI"),))][0] == [1, 0, 1, 0, 0]
+    assert snapshot["counters"][("requests_total", (("endpoint", "get_klines"),))] == 3
+
+
+def test_prometheus_export(metrics, tmp_path):
+    metrics.observe("fetch_seconds", 0.15, symbol="BTCUSDT")
+    metrics.observe("fetch_seconds", 2.0, symbol="BTCUSDT")
+    metrics.increment("orders_total", side="buy")
+    path = tmp_path / "metrics.prom"
+    metrics.export(str(path))
+    assert path.read_text() == "\n".join([
+        '# TYPE test_fetch_seconds histogram',
+        'test_fetch_seconds_bucket{symbol="BTCUSDT",le="0.1"} 0',
+        'test_fetch_seconds_bucket{symbol="BTCUSDT",le="0.2"} 1',
+        'test_fetch_seconds_bucket{symbol="BTCUSDT",le="0.5"} 1',
+        'test_fetch_seconds_bucket{symbol="BTCUSDT",le="1.0"} 1',
+        'test_fetch_seconds_bucket{symbol="BTCUSDT",le="+Inf"} 2',
+        'test_fetch_seconds_sum{symbol="BTCUSDT"} 2.15',
+        'test_fetch_seconds_count{symbol="BTCUSDT"} 2',
+        '# TYPE test_orders_total counter',
+        'test_orders_total{side="buy"} 1',
+    ]) + "\n"
+    # Exporting doesn't reset
+    assert metrics.collect()["counters"]
+
+
+def test_json_export(metrics, tmp_path):
+    for seconds in (0.05, 0.15, 0.15, 0.4):
+        metrics.observe("fetch_seconds", seconds, symbol="BTCUSDT")
+    metrics.increment("orders_total", 2, side="sell")
+    path = tmp_path / "metrics.json"
+    metrics.export(str(path), fmt="json")
+    exported = json.loads(path.read_text())
+    histogram, = exported["histograms"]["fetch_seconds"]
+    assert histogram["labels"] == {"symbol": "BTCUSDT"}
+    assert histogram["count"] == 4 and histogram["mean"] == pytest.approx(0.1875)
+    assert histogram["p50"] == pytest.approx(0.15) and histogram["p99"] == pytest.approx(0.5 - 0.3 * 0.04)
+    assert exported["counters"] == {"orders_total": [{"labels": {"side": "sell"}, "value": 2}]}
+    assert not (tmp_path / "metrics.json.tmp").exists()
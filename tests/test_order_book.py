@@ -0,0 +1,165 @@
+import os
+import json
+import asyncio
+import logging
+import time
+import numpy as np
+import pytest
+from indicators.order_book_analysis.oba import OBA
+from scripts.constants import Constants
+from scripts.market_stream import MarketStream
+from scripts.order_book import LocalOrderBook, OrderBookGapError, read_diff_file
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+@pytest.fixture
+def events():
+    """ Recorded BTCUSDT depth diffs: a stale event, two in order, a gap (105-109 missing), one after the gap """
+    return list(read_diff_file(os.path.join(DATA_DIR, 'depth_diffs.jsonl')))
+
+
+@pytest.fixture
+def snapshot():
+    with open(os.path.join(DATA_DIR, 'depth_snapshot.json'), 'r') as f:
+        return json.load(f)
+
+
+def levels(prices, quantities):
+    return np.column_stack((prices, quantities)).tolist()
+
+
+def test_read_diff_file_accepts_raw_and_combined_stream_events(events):
+    assert [(event["U"], event["u"]) for event in events] == [(95, 100), (99, 102), (103, 104), (110, 111), (112, 113)]
+
+
+def test_applies_events_in_order_and_drops_stale_ones(events, snapshot):
+    book = LocalOrderBook("BTCUSDT")
+    book.load_snapshot(snapshot)
+    assert book.apply_diff(events[0]) is False
+    assert book.apply_diff(events[1]) is True
+    assert book.apply_diff(events[2]) is True
+    assert book.apply_diff(events[1]) is False
+    assert book.last_update_id == 104
+    assert book.updates == 2
+    assert levels(*book.bids()) == [[100.0, 1.5], [99.75, 0.5], [99.5, 2.0], [99.0, 3.0]]
+    assert levels(*book.asks()) == [[101.0, 2.0], [101.5, 3.0], [102.0, 4.0]]
+
+
+def test_top_n_views(events, snapshot):
+    book = LocalOrderBook("BTCUSDT")
+    book.load_snapshot(snapshot)
+    for event in events[:3]:
+        book.process(event)
+    assert levels(*book.bids(2)) == [[100.0, 1.5], [99.75, 0.5]]
+    assert levels(*book.asks(2)) == [[101.0, 2.0], [101.5, 3.0]]
+    assert levels(*book.bids(10)) == levels(*book.bids())
+    top = book.copy(2)
+    assert levels(*top.bids()) == [[100.0, 1.5], [99.75, 0.5]]
+    assert levels(*top.asks()) == [[101.0, 2.0], [101.5, 3.0]]
+    assert top.last_update_id == 104
+    top.bid_quantities[:] = 0
+    assert book.bids(1)[1][0] == 1.5
+
+
+def test_gap_raises(events, snapshot):
+    book = LocalOrderBook("BTCUSDT")
+    book.load_snapshot(snapshot)
+    for event in events[:3]:
+        book.apply_diff(event)
+    with pytest.raises(OrderBookGapError):
+        book.apply_diff(events[3])
+
+
+def test_gap_resnapshots_and_applies_the_buffered_events(events, snapshot):
+    fetched = []
+
+    def fetch_snapshot(symbol):
+        fetched.append(symbol)
+        return {"lastUpdateId": 109, "bids": [["97.00000000", "1.00000000"]], "asks": [["103.00000000", "1.00000000"]]}
+
+    book = LocalOrderBook("BTCUSDT", fetch_snapshot)
+    book.load_snapshot(snapshot)
+    for event in events:
+        book.process(event)
+    assert fetched == ["BTCUSDT"]
+    assert book.resnapshots == 1
+    assert book.synced and book.last_update_id == 113
+    # Only the snapshot and the events after it, none of the levels from before the gap
+    assert levels(*book.bids()) == [[98.5, 0.75], [98.0, 1.0], [97.0, 1.0]]
+    assert levels(*book.asks()) == [[101.25, 2.5], [103.0, 1.0]]
+
+
+def test_snapshot_behind_the_stream_keeps_the_book_cleared(events, snapshot):
+    fetched = []
+
+    def fetch_snapshot(symbol):
+        fetched.append(symbol)
+        return {"lastUpdateId": 105, "bids": [["97.00000000", "1.00000000"]], "asks": []}
+
+    book = LocalOrderBook("BTCUSDT", fetch_snapshot)
+    book.load_snapshot(snapshot)
+    for event in events:
+        book.process(event)
+    assert not book.synced
+    assert len(book.bids()[0]) == 0 and len(book.asks()[0]) == 0
+    assert [event["U"] for event in book.pending] == [110, 112]
+    # The event after the gap came within ORDERBOOK_RESNAPSHOT_INTERVAL of the first attempt
+    assert fetched == ["BTCUSDT"]
+
+
+def test_gap_without_snapshot_source_starts_the_book_over(events, snapshot):
+    book = LocalOrderBook("BTCUSDT")
+    book.load_snapshot(snapshot)
+    for event in events:
+        book.process(event)
+    assert book.synced and book.last_update_id == 113
+    assert levels(*book.bids()) == [[98.5, 0.75], [98.0, 1.0]]
+    assert levels(*book.asks()) == [[101.25, 2.5]]
+
+
+def test_unsynced_copy_is_not_synced(events, snapshot):
+    book = LocalOrderBook("BTCUSDT", lambda symbol: {"lastUpdateId": 105, "bids": [], "asks": []})
+    book.load_snapshot(snapshot)
+    for event in events[:4]:
+        book.process(event)
+    assert not book.copy(5).synced
+
+
+def test_oba_uses_every_fetched_level_by_default():
+    # The 5 best bids outweigh the asks, all 10 levels don't
+    order_book = {"bids": levels(100 - np.arange(10), [3] * 5 + [1] * 5),
+                  "asks": levels(101 + np.arange(10), [2.5] * 10)}
+    assert OBA().decide_signal(order_book=order_book) == Constants.SELL_SIGNAL
+    assert OBA(depth=5).decide_signal(order_book=order_book) == Constants.BUY_SIGNAL
+
+    book = LocalOrderBook("BTCUSDT")
+    book.load_snapshot(dict(order_book, lastUpdateId=1))
+    assert OBA().decide_signal(order_book=book) == Constants.SELL_SIGNAL
+    assert OBA(depth=5).decide_signal(order_book=book) == Constants.BUY_SIGNAL
+
+
+def test_market_stream_fetches_snapshots_off_the_event_loop(events, snapshot):
+    fetch_seconds = 0.3
+
+    def fetch_snapshot(symbol):
+        time.sleep(fetch_seconds)
+        return snapshot
+
+    async def replay():
+        stream = MarketStream(["BTCUSDT"], "1m", None, logging.getLogger("test_order_book"),
+                              fetch_order_book=fetch_snapshot)
+        start_time = time.perf_counter()
+        for event in events[:3]:
+            await stream.handle_message(json.dumps({"stream": "btcusdt@depth@100ms", "data": event}))
+        handle_seconds = time.perf_counter() - start_time
+        book = stream.order_books["BTCUSDT"]
+        buffered = len(book.pending)
+        await asyncio.gather(*stream._snapshot_tasks.values())
+        return handle_seconds, buffered, book
+
+    handle_seconds, buffered, book = asyncio.run(replay())
+    assert handle_seconds < fetch_seconds
+    assert buffered == 3
+    assert book.synced and book.last_update_id == 104 and book.resnapshots == 1
+    assert levels(*book.bids(2)) == [[100.0, 1.5], [99.75, 0.5]]
@@ -0,0 +1,109 @@
+import numpy as np
+from indicators.double_top_bottom.dtb import DoubleTopBottom
+from indicators.head_and_shoulders.head_n_shoulders import HeadAndShoulders
+from indicators.intermediates import Intermediates
+from indicators.pivots import (HIGH, LOW, Pivot, find_pivots, zigzag, find_head_and_shoulders, find_double_extremes,
+                               neckline_break)
+from scripts.constants import Constants
+
+# Tops at bars 4 and 10 with the trough at bar 7 (the neckline, 2) between them, then a fall through the neckline
+DOUBLE_TOP = [1, 2, 3, 4, 5, 4, 3, 2, 3, 4, 5.05, 4, 3, 2.5, 1.5, 1, 0.5]
+# Shoulders at bars 4 and 16, head at bar 10, neckline troughs at bars 7 and 13
+HEAD_AND_SHOULDERS = [1, 2, 3, 4, 5, 4, 3, 2, 4, 6, 7, 6, 4, 2.2, 3, 4, 5.2, 4, 3, 2, 1]
+
+
+def test_find_pivots_uses_the_centered_window():
+    values = [3, 1, 2, 5, 2, 1, 0, 1, 2, 3, 4]
+    assert find_pivots(values, 3) == [Pivot(1, 1.0, LOW), Pivot(3, 5.0, HIGH), Pivot(6, 0.0, LOW)]
+    # Bar 6 needs two bars after it in a window of 5
+    assert find_pivots(values, 5) == [Pivot(3, 5.0, HIGH), Pivot(6, 0.0, LOW)]
+
+
+def test_find_pivots_skips_flat_windows():
+    assert find_pivots([2, 2, 2, 2, 2], 3) == []
+
+
+def test_zigzag_keeps_the_most_extreme_of_consecutive_pivots():
+    pivots = [Pivot(1, 5.0, HIGH), Pivot(3, 6.0, HIGH), Pivot(5, 2.0, LOW), Pivot(7, 2.0, LOW), Pivot(9, 4.0, HIGH)]
+    assert zigzag(pivots) == [Pivot(3, 6.0, HIGH), Pivot(5, 2.0, LOW), Pivot(9, 4.0, HIGH)]
+
+
+def test_swings_are_the_zigzag_of_the_pivots():
+    values = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, 500))
+    swings = Intermediates(values, values, values).swings(5)
+    assert swings == zigzag(find_pivots(values, 5))
+    assert all(a.kind != b.kind for a, b in zip(swings, swings[1:]))
+
+
+def test_find_double_extremes():
+    swings = zigzag(find_pivots(DOUBLE_TOP, 5))
+    tops = find_double_extremes(swings, 0.1, HIGH)
+    assert [(top.first.index, top.middle.index, top.second.index) for top in tops] == [(4, 7, 10)]
+    assert find_double_extremes(swings, 0.1, LOW) == []
+    # The tops differ by 0.05 of a swing height of 3
+    assert find_double_extremes(swings, 0.01, HIGH) == []
+    bottoms = find_double_extremes(zigzag(find_pivots(-np.array(DOUBLE_TOP), 5)), 0.1, LOW)
+    assert [bottom.second.index for bottom in bottoms] == [10]
+
+
+def test_neckline_break():
+    top, = find_double_extremes(zigzag(find_pivots(DOUBLE_TOP, 5)), 0.1, HIGH)
+    assert neckline_break(DOUBLE_TOP, top, HIGH) == 14
+    assert neckline_break(DOUBLE_TOP[:14], top, HIGH) == -1
+    bottom, = find_double_extremes(zigzag(find_pivots(-np.array(DOUBLE_TOP), 5)), 0.1, LOW)
+    assert neckline_break(-np.array(DOUBLE_TOP), bottom, LOW) == 14
+
+
+def test_find_head_and_shoulders():
+    swings = zigzag(find_pivots(HEAD_AND_SHOULDERS, 5))
+    assert find_head_and_shoulders(swings, 0.5, HIGH) == [10]
+    assert find_head_and_shoulders(swings, 0.5, LOW) == []
+    # The shoulders differ by 0.2 of a head height of 4.8 over the neckline
+    assert find_head_and_shoulders(swings, 0.01, HIGH) == []
+    inverted = zigzag(find_pivots(-np.array(HEAD_AND_SHOULDERS), 5))
+    assert find_head_and_shoulders(inverted, 0.5, LOW) == [10]
+
+
+def test_double_top_signals_only_when_recent_and_confirmed():
+    indicator = DoubleTopBottom(max_age=10)
+    calculations = indicator.calculate(closing_prices=np.array(DOUBLE_TOP))
+    assert calculations["double_top"] == 10 and calculations["double_bottom"] == -1
+    assert indicator.decide_signal(**calculations) == Constants.SELL_SIGNAL
+    # The neckline holds
+    unbroken = indicator.calculate(closing_prices=np.array(DOUBLE_TOP[:14] + [2.5, 3, 3.5]))
+    assert unbroken["double_tops"] == [10] and unbroken["double_top"] == -1
+    assert indicator.decide_signal(**unbroken) == Constants.HOLD_SIGNAL
+    # The pattern is too old
+    old = indicator.calculate(closing_prices=np.array(DOUBLE_TOP + [0.5] * 10))
+    assert old["double_tops"] == [10] and old["double_top"] == -1
+    bottom = indicator.calculate(closing_prices=200 - np.array(DOUBLE_TOP))
+    assert indicator.decide_signal(**bottom) == Constants.BUY_SIGNAL
+
+
+def test_head_and_shoulders_signals_only_when_recent_and_confirmed():
+    indicator = HeadAndShoulders(max_age=10)
+    calculations = indicator.calculate(closing_prices=np.array(HEAD_AND_SHOULDERS))
+    assert calculations["head_shoulders"] == 16 and calculations["inverted_head_shoulders"] == -1
+    assert indicator.decide_signal(**calculations) == Constants.SELL_SIGNAL
+    # The neckline at 2.2 holds
+    unbroken = indicator.calculate(closing_prices=np.array(HEAD_AND_SHOULDERS[:19]))
+    assert unbroken["heads"] == [10] and unbroken["head_shoulders"] == -1
+    assert indicator.decide_signal(**unbroken) == Constants.HOLD_SIGNAL
+    # The pattern is too old
+    old = indicator.calculate(closing_prices=np.array(HEAD_AND_SHOULDERS + [1] * 10))
+    assert old["heads"] == [10] and old["head_shoulders"] == -1
+    assert indicator.decide_signal(**old) == Constants.HOLD_SIGNAL
+    # An old top followed by a recent confirmed inverted head and shoulders
+    both = indicator.calculate(closing_prices=np.array(HEAD_AND_SHOULDERS + [0.5, 0.4] +
+                                                       list(10 - np.array(HEAD_AND_SHOULDERS))))
+    assert both["heads"] == [10] and both["inverted_heads"] == [33]
+    assert both["head_shoulders"] == -1 and both["inverted_head_shoulders"] == 39
+    assert indicator.decide_signal(**both) == Constants.BUY_SIGNAL
+
+
+def test_random_walks_rarely_signal():
+    rng = np.random.default_rng(0)
+    for indicator in (DoubleTopBottom(), HeadAndShoulders()):
+        signals = [indicator.decide_signal(**indicator.calculate(closing_prices=100 + np.cumsum(rng.normal(0, 1, 288))))
+                   for _ in range(200)]
+        assert signals.count(Constants.HOLD_SIGNAL) > 150
@@ -0,0 +1,227 @@
+import json
+import time
+import fcntl
+import asyncio
+import logging
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from binance import Client, AsyncClient
+from binance.exceptions import BinanceAPIException
+from scripts.rate_limiter import RateLimiter, BinanceScheduler, ORDER
+
+logger = logging.getLogger("test_rate_limiter")
+
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return RateLimiter(name="test_rate_limiter", weight_per_minute=1200, order_reserve=0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"value": 1000.0}
+    monkeypatch.setattr(time, "time", lambda: now["value"])
+    return now
+
+
+@pytest.fixture
+def reserved_limiter(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return RateLimiter(name="test_rate_limiter", weight_per_minute=600, order_reserve=100)
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.used_weights = []
+
+    def acquire(self, weight, priority=0):
+        pass
+
+    async def acquire_async(self, weight, priority=0):
+        pass
+
+    def update_used_weight(self, used_weight, blocking=True):
+        self.used_weights.append(used_weight)
+        return True
+
+
+class FakeResponse:
+    def __init__(self, used_weight, headers=None):
+        self.headers = dict(headers or {}, **{"X-MBX-USED-WEIGHT-1M": str(used_weight)})
+
+
+def test_acquire_async_does_not_block_the_event_loop_on_a_held_lock(limiter):
+    # flock locks belong to the open file, so a second open file stands in for another process
+    other_process = open(limiter._lock_path, 'a')
+    fcntl.flock(other_process, fcntl.LOCK_EX)
+
+    async def run():
+        ticks = 0
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.2, fcntl.flock, other_process, fcntl.LOCK_UN)
+        acquire = asyncio.ensure_future(limiter.acquire_async(1000))
+        while not acquire.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+
+    start_time = time.perf_counter()
+    ticks = asyncio.run(run())
+    other_process.close()
+    assert time.perf_counter() - start_time >= 0.2
+    assert ticks >= 10
+    # The weight was taken once the lock was free
+    assert limiter.try_acquire(1000) > 0
+
+
+def test_market_data_leaves_the_order_reserve_free(reserved_limiter):
+    assert reserved_limiter.try_acquire(500) == 0
+    assert reserved_limiter.try_acquire(1) > 0
+    assert reserved_limiter.try_acquire(100, priority=ORDER) == 0
+
+
+def test_weights_above_capacity_raise(reserved_limiter):
+    with pytest.raises(ValueError):
+        reserved_limiter.try_acquire(501)
+    with pytest.raises(ValueError):
+        reserved_limiter.acquire(601, priority=ORDER)
+    assert reserved_limiter.try_acquire(600, priority=ORDER) == 0
+
+
+def test_market_data_is_held_back_while_an_order_waits(reserved_limiter, clock):
+    assert reserved_limiter.try_acquire(600, priority=ORDER) == 0
+    # 10 weight per second refill, the order waits 30 seconds for its weight
+    assert reserved_limiter.try_acquire(300, priority=ORDER) == pytest.approx(30)
+    clock["value"] += 20
+    # Past the reserve there is weight for market data again, but the order goes first
+    assert reserved_limiter.try_acquire(10) > 0
+    clock["value"] += 10
+    assert reserved_limiter.try_acquire(300, priority=ORDER) == 0
+    clock["value"] += 15
+    assert reserved_limiter.try_acquire(10) == 0
+
+
+@pytest.mark.parametrize("status_code", [429, 418])
+def test_rate_limit_responses_block_every_limiter_for_retry_after(limiter, status_code):
+    other_process = RateLimiter(name="test_rate_limiter", weight_per_minute=1200, order_reserve=0)
+    calls = []
+
+    def get_klines(**params):
+        calls.append(time.time())
+        if len(calls) == 1:
+            raise BinanceAPIException(FakeResponse(0, {"Retry-After": "0.2"}), status_code, "{}")
+        return "klines"
+
+    scheduler = BinanceScheduler(limiter, logger)
+    with pytest.raises(BinanceAPIException):
+        BinanceScheduler(limiter, logger, retries=0).call(get_klines)
+    # The pause is kept in the shared state, other processes wait as well
+    assert 0 < other_process.try_acquire(1) <= 0.2
+    assert other_process.try_acquire(1, priority=ORDER) > 0
+
+    calls.clear()
+    assert scheduler.call(get_klines) == "klines"
+    assert calls[1] - calls[0] >= 0.2
+
+
+def test_update_and_block_without_blocking_skip_a_held_lock(limiter):
+    other_process = open(limiter._lock_path, 'a')
+    fcntl.flock(other_process, fcntl.LOCK_EX)
+    assert limiter.update_used_weight(100, blocking=False) is False
+    assert limiter.block(1, blocking=False) is False
+    fcntl.flock(other_process, fcntl.LOCK_UN)
+    other_process.close()
+    assert limiter.update_used_weight(100, blocking=False) is True
+    assert limiter.try_acquire(1200 - 100) == 0
+
+
+def test_each_call_records_its_own_used_weight():
+    recording = RecordingLimiter()
+    scheduler = BinanceScheduler(recording, logger)
+
+    def get_order_book(**params):
+        params["requests_params"]["hooks"]["response"](FakeResponse(params["symbol"] == "BTCUSDT" and 7 or 9))
+        return params["symbol"]
+
+    assert scheduler.call(get_order_book, symbol="BTCUSDT", weight=5) == "BTCUSDT"
+    assert scheduler.call(get_order_book, symbol="ETHUSDT", weight=5) == "ETHUSDT"
+    assert recording.used_weights == [7, 9]
+
+
+def test_concurrent_async_calls_record_their_own_used_weight():
+    recording = RecordingLimiter()
+    scheduler = BinanceScheduler(recording, logger)
+
+    async def get_klines(**params):
+        async def handler(request):
+            # The first call is answered last, with the lower used weight
+            await asyncio.sleep(params["delay"])
+            return FakeResponse(params["used_weight"])
+        middleware, = params["requests_params"]["middlewares"]
+        await middleware(None, handler)
+        return params["used_weight"]
+
+    async def run():
+        return await asyncio.gather(scheduler.call_async(get_klines, delay=0.05, used_weight=10),
+                                    scheduler.call_async(get_klines, delay=0, used_weight=20))
+
+    assert asyncio.run(run()) == [10, 20]
+    assert recording.used_weights == [20, 10]
+
+
+def test_methods_without_request_parameters_are_called_as_they_are():
+    recording = RecordingLimiter()
+    scheduler = BinanceScheduler(recording, logger)
+
+    def get_historical_klines(symbol, interval, start_str=None):
+        return symbol, interval, start_str
+
+    assert scheduler.call(get_historical_klines, "BTCUSDT", "1m", start_str=0) == ("BTCUSDT", "1m", 0)
+    assert recording.used_weights == []
+
+
+@pytest.fixture
+def exchange():
+    """ Local stand-in for the REST API answering every request with the next used weight """
+    used_weight = {"value": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            used_weight["value"] += 1
+            body = json.dumps({"lastUpdateId": 1, "bids": [], "asks": []}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("X-MBX-USED-WEIGHT-1M", str(used_weight["value"]))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{}/api".format(server.server_port)
+    server.shutdown()
+
+
+def test_binance_clients_pass_the_response_hooks_through(exchange):
+    recording = RecordingLimiter()
+    scheduler = BinanceScheduler(recording, logger)
+    client = Client(None, None, ping=False)
+    client.API_URL = exchange
+    scheduler.call(client.get_order_book, symbol="BTCUSDT", limit=5)
+
+    async def run():
+        async_client = AsyncClient(None, None)
+        async_client.API_URL = exchange
+        try:
+            await scheduler.call_async(async_client.get_order_book, symbol="BTCUSDT", limit=5)
+        finally:
+            await async_client.close_connection()
+
+    asyncio.run(run())
+    assert recording.used_weights == [1, 2]
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
+from scripts.resampler import TimeframeResampler, check_timeframe, resample
+
+BAR_MS = 300000
+
+
+@pytest.fixture
+def bars():
+    rng = np.random.default_rng(7)
+    n = 5000
+    # Starts mid-day and drops some bars, like a store with a few missing klines
+    open_times = (100 + np.arange(n, dtype=np.int64)) * BAR_MS
+    open_times = np.delete(open_times, rng.choice(n, 50, replace=False))
+    closing_prices = 100 + np.cumsum(rng.normal(0, 1, len(open_times)))
+    ohlcv = np.vstack((closing_prices + rng.normal(0, 0.5, len(open_times)),
+                       closing_prices + rng.uniform(0, 2, len(open_times)),
+                       closing_prices - rng.uniform(0, 2, len(open_times)),
+                       closing_prices, rng.uniform(0, 10, len(open_times))))
+    return open_times, ohlcv
+
+
+def pandas_resample(open_times, ohlcv, rule):
+    frame = pd.DataFrame(ohlcv.T, columns=['open', 'high', 'low', 'close', 'volume'],
+                         index=pd.to_datetime(open_times, unit='ms'))
+    resampled = frame.resample(rule, closed='left', label='left').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+    resampled = resampled.dropna()
+    return resampled.index.as_unit('ms').asi8, resampled.to_numpy().T
+
+
+@pytest.mark.parametrize("interval, rule", [("1h", "1h"), ("4h", "4h"), ("1d", "1D"), ("1w", "W-MON")])
+def test_resample_matches_pandas(bars, interval, rule):
+    open_times, ohlcv = bars
+    bar_open_times, resampled = resample(open_times, ohlcv, interval)
+    expected_open_times, expected = pandas_resample(open_times, ohlcv, rule)
+    assert_array_equal(bar_open_times, expected_open_times)
+    assert_allclose(resampled, expected)
+
+
+def test_incremental_resampler_matches_resample(bars):
+    open_times, ohlcv = bars
+    resampler = TimeframeResampler("5m", "1h", capacity=1000)
+    for start in range(0, len(open_times), 37):
+        # Overlapping batches, bars already seen are ignored
+        begin = max(start - 5, 0)
+        resampler.update(open_times[begin:start + 37], ohlcv[:, begin:start + 37])
+        expected_open_times, expected = resample(open_times[:start + 37], ohlcv[:, :start + 37], "1h")
+        view_open_times, view = resampler.view()
+        assert_array_equal(view_open_times, expected_open_times)
+        assert_allclose(view, expected)
+
+
+def test_check_timeframe():
+    check_timeframe("5m", "1h")
+    check_timeframe("1d", "1M")
+    with pytest.raises(ValueError):
+        check_timeframe("1h", "5m")
+    with pytest.raises(ValueError):
+        check_timeframe("3d", "1w")
+    with pytest.raises(ValueError):
+        check_timeframe("5m", "7m")
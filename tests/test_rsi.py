@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from indicators.incremental import IncrementalRSI
+from indicators.kernels import exponential_smooth, wilder_smooth
+from indicators.relative_strength_index.rsi import rsi_kernel, rsi_signals
+from indicators.relative_strength_index.rsi_benchmark import rsi_loop, signals_loop
+
+# Long enough to span several cumulative sum blocks of exponential_smooth for every period below
+BARS = 10000
+
+
+@pytest.fixture(scope="module")
+def closing_prices():
+    rng = np.random.default_rng(3)
+    return 1000 + np.cumsum(rng.normal(0, 1, (4, BARS)), axis=-1)
+
+
+def smooth_loop(values, initial, decay):
+    result = np.empty_like(values)
+    previous = initial
+    for i in range(values.shape[-1]):
+        previous = result[..., i] = decay * previous + (1 - decay) * values[..., i]
+    return result
+
+
+@pytest.mark.parametrize("decay", [0, 0.5, 0.9, 13 / 14])
+def test_exponential_smooth_matches_the_recurrence(decay):
+    rng = np.random.default_rng(1)
+    values = rng.random((3, BARS))
+    initial = rng.random(3)
+    np.testing.assert_allclose(exponential_smooth(values, initial, decay), smooth_loop(values, initial, decay),
+                               rtol=1e-9)
+    np.testing.assert_allclose(exponential_smooth(values[0], initial[0], decay),
+                               smooth_loop(values[0], initial[0], decay), rtol=1e-9)
+
+
+def test_wilder_smooth_matches_the_recurrence():
+    values = np.random.default_rng(2).random(BARS)
+    expected = np.empty_like(values)
+    previous = 0.5
+    for i, value in enumerate(values):
+        previous = expected[i] = (previous * 13 + value) / 14
+    np.testing.assert_allclose(wilder_smooth(values, 0.5, 14), expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize("period_length", [2, 14, 30])
+def test_kernel_matches_the_loop(closing_prices, period_length):
+    rsi = rsi_kernel(closing_prices, period_length)
+    assert rsi.shape == closing_prices.shape
+    for row, prices in zip(rsi, closing_prices):
+        np.testing.assert_allclose(row, rsi_loop(prices, period_length), rtol=1e-9)
+    np.testing.assert_allclose(rsi_kernel(closing_prices[0], period_length), rsi_loop(closing_prices[0], period_length),
+                               rtol=1e-9)
+
+
+def test_kernel_handles_flat_prices():
+    closing_prices = np.concatenate([np.full(20, 100.), 100. + np.arange(20)])
+    # No change at all gives 0 / 0, a NaN RSI, in both
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = rsi_loop(closing_prices, 14)
+    np.testing.assert_array_equal(rsi_kernel(closing_prices, 14), expected)
+
+
+def test_signals_match_the_loop(closing_prices):
+    rsi = rsi_kernel(closing_prices[0, :2000], 14)
+    assert rsi_signals(rsi).tolist() == signals_loop(rsi)
+
+
+def test_incremental_matches_the_kernel(closing_prices):
+    prices = closing_prices[0, :2000]
+    rsi = rsi_kernel(prices, 14)
+    incremental = IncrementalRSI(14)
+    values = [incremental.update(price) for price in prices.tolist()]
+    assert values[14] is None
+    np.testing.assert_allclose(values[15:], rsi[15:], rtol=1e-9)
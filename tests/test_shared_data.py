@@ -0,0 +1,109 @@
+import pickle
+import numpy as np
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from numpy.testing import assert_array_equal
+from scripts import shared_data
+from scripts.market_snapshot import MarketSnapshot
+from scripts.shared_data import SharedMarketData, attach, attach_all
+
+
+def make_snapshot(symbol, bars=48, offset=0.0):
+    timestamps = np.arange(bars, dtype=np.int64) * 300000
+    closing_prices = 100 + offset + np.arange(bars, dtype=np.float64)
+    ohlcv = np.vstack([closing_prices - 0.5, closing_prices + 1, closing_prices - 1, closing_prices,
+                       np.ones(bars)])
+    snapshot = MarketSnapshot(symbol, "5m", timestamps, ohlcv, order_book={"bids": [[1.0, 2.0]], "asks": []})
+    snapshot.timeframe("1h")
+    return snapshot
+
+
+def names(descriptor):
+    return shared_data._names(descriptor)
+
+
+def assert_same_snapshot(attached, snapshot):
+    assert attached.symbol == snapshot.symbol
+    assert attached.interval == snapshot.interval
+    assert attached.current_price == snapshot.current_price
+    assert attached.order_book == snapshot.order_book
+    assert_array_equal(attached.timestamps, snapshot.timestamps)
+    assert_array_equal(attached.ohlcv, snapshot.ohlcv)
+    assert attached.timeframes.keys() == snapshot.timeframes.keys()
+    for interval, timeframe in snapshot.timeframes.items():
+        assert_same_snapshot(attached.timeframes[interval], timeframe)
+
+
+def attached_closing_sum(descriptor):
+    snapshot = attach(descriptor)
+    return float(snapshot.closing_prices.sum()), float(snapshot.timeframe("1h").closing_prices.sum())
+
+
+@pytest.fixture
+def data():
+    with SharedMarketData() as data:
+        yield data
+    shared_data._release_attached(set())
+
+
+def test_attach_round_trip(data):
+    snapshot = make_snapshot("BTCUSDT")
+    descriptor = pickle.loads(pickle.dumps(data.publish(snapshot)))
+    attached = attach(descriptor)
+    assert_same_snapshot(attached, snapshot)
+    # Views into the shared blocks, not copies
+    assert not attached.ohlcv.flags.owndata
+    assert set(shared_data._attached) == names(descriptor)
+
+
+def test_attach_in_worker_process(data):
+    snapshot = make_snapshot("BTCUSDT")
+    descriptor = data.publish(snapshot)
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        closing_sum, hourly_sum = pool.submit(attached_closing_sum, descriptor).result()
+    assert closing_sum == snapshot.closing_prices.sum()
+    assert hourly_sum == snapshot.timeframe("1h").closing_prices.sum()
+
+
+def test_attach_releases_blocks_of_earlier_snapshots(data):
+    first = data.publish(make_snapshot("BTCUSDT"))
+    second = data.publish(make_snapshot("ETHUSDT", offset=50))
+    attached = attach(first)
+    # Arrays of the first snapshot are still alive, so its blocks stay open
+    attach(second)
+    assert set(shared_data._attached) == names(first) | names(second)
+    del attached
+    attach(second)
+    assert set(shared_data._attached) == names(second)
+
+    btc, eth = attach_all([first, second])
+    assert btc.closing_price == 147 and eth.closing_price == 197
+    assert set(shared_data._attached) == names(first) | names(second)
+
+
+def test_publish_again_unlinks_previous_blocks(data):
+    first = data.publish(make_snapshot("BTCUSDT"))
+    attached = attach(first)
+    second = data.publish(make_snapshot("BTCUSDT", offset=50))
+    assert not names(first) & names(second)
+    for name in names(first):
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+    # Already attached arrays keep their mapping
+    assert attached.closing_price == 147
+    assert attach(second).closing_price == 197
+
+    data.release("BTCUSDT")
+    for name in names(second):
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_close_unlinks_every_block():
+    with SharedMarketData() as data:
+        descriptors = [data.publish(make_snapshot(symbol)) for symbol in ("BTCUSDT", "ETHUSDT")]
+    for descriptor in descriptors:
+        for name in names(descriptor):
+            with pytest.raises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
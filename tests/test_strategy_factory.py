@@ -0,0 +1,49 @@
+import sys
+import pytest
+from scripts.strategy_factory import StrategyFactory
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch, tmp_path):
+    monkeypatch.setattr(StrategyFactory, "_registry", dict(StrategyFactory.registry()))
+    monkeypatch.setattr(StrategyFactory, "_classes", dict(StrategyFactory._classes))
+    (tmp_path / "needs_missing_package.py").write_text("import not_a_real_package\n\n\nclass Strategy:\n    pass\n")
+    (tmp_path / "plain_strategy.py").write_text("class Strategy:\n    def __init__(self, period=14):\n"
+                                                "        self.period = period\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    for module in ("needs_missing_package", "plain_strategy"):
+        sys.modules.pop(module, None)
+
+
+def test_create_strategy():
+    StrategyFactory.register("Plain", "plain_strategy:Strategy")
+    assert StrategyFactory.create_strategy("Plain", period=3).period == 3
+    assert "Plain" in StrategyFactory.import_times
+
+
+def test_unknown_strategy_names_the_config_entry():
+    with pytest.raises(ValueError, match="Unknown strategy 'SupertrendIndicator'.*Supertrend"):
+        StrategyFactory.load("SupertrendIndicator")
+
+
+def test_missing_dependency_names_the_package():
+    StrategyFactory.register("Broken", "needs_missing_package:Strategy")
+    with pytest.raises(ImportError, match="Strategy 'Broken' needs the missing package 'not_a_real_package'") as e:
+        StrategyFactory.load("Broken")
+    assert e.value.name == "not_a_real_package"
+
+
+def test_missing_module_or_class():
+    StrategyFactory.register("Moved", "not_a_real_module:Strategy")
+    with pytest.raises(ImportError, match="Cannot import strategy 'Moved' from not_a_real_module:Strategy"):
+        StrategyFactory.load("Moved")
+    StrategyFactory.register("Renamed", "plain_strategy:Renamed")
+    with pytest.raises(ImportError, match="plain_strategy has no class Renamed"):
+        StrategyFactory.load("Renamed")
+
+
+def test_invalid_parameters_name_the_strategy():
+    StrategyFactory.register("Plain", "plain_strategy:Strategy")
+    with pytest.raises(TypeError, match=r"Invalid parameters \['k_period'\] for strategy 'Plain'"):
+        StrategyFactory.create_strategy("Plain", k_period=14)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from indicators.incremental import IncrementalSupertrend
+from indicators.supertrend_indicator.supertrend import supertrend_kernel, VECTOR_MIN_PAIRS
+from indicators.supertrend_indicator.supertrend_benchmark import supertrend_pandas
+
+
+@pytest.fixture(scope="module")
+def prices():
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, 300))
+    return close + rng.random(300), close - rng.random(300), close
+
+
+def assert_matches_reference(result, expected):
+    np.testing.assert_allclose(result["atr"], expected["atr"].to_numpy(), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(result["upper_band"], expected["upper_band"].to_numpy(), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(result["lower_band"], expected["lower_band"].to_numpy(), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(result["in_uptrend"], expected["in_uptrend"].to_numpy(dtype=bool))
+
+
+def test_single_pair_matches_the_dataframe_loop(prices):
+    result = supertrend_kernel(*prices, 10, 3)
+    assert result["upper_band"].shape == (300,)
+    assert_matches_reference(result, supertrend_pandas(*prices, 10, 3))
+
+
+@pytest.mark.parametrize("pairs", [3, VECTOR_MIN_PAIRS + 4])
+def test_parameter_pairs_match_the_dataframe_loop(prices, pairs):
+    rng = np.random.default_rng(pairs)
+    lookbacks = rng.integers(5, 30, pairs)
+    multipliers = rng.uniform(1, 5, pairs)
+    result = supertrend_kernel(*prices, lookbacks, multipliers)
+    assert result["upper_band"].shape == (pairs, 300)
+    for i, (lookback, multiplier) in enumerate(zip(lookbacks.tolist(), multipliers.tolist())):
+        assert_matches_reference({key: value[i] for key, value in result.items()},
+                                 supertrend_pandas(*prices, lookback, multiplier))
+
+
+def test_incremental_matches_the_kernel(prices):
+    result = supertrend_kernel(*prices, 10, 3)
+    incremental = IncrementalSupertrend(10, 3)
+    for i, (high, low, close) in enumerate(zip(*prices)):
+        value = incremental.update(high, low, close)
+        np.testing.assert_allclose([value["upper_band"], value["lower_band"]],
+                                   [result["upper_band"][i], result["lower_band"][i]], rtol=1e-12)
+        assert value["in_uptrend"] == result["in_uptrend"][i]
+
+
+@pytest.mark.parametrize("lookback, multiplier, shape", [
+    (10, 3, (0,)),
+    ([10, 14], [3, 2], (2, 0)),
+    ([10] * VECTOR_MIN_PAIRS, [3] * VECTOR_MIN_PAIRS, (VECTOR_MIN_PAIRS, 0)),
+])
+def test_no_bars_give_empty_arrays(lookback, multiplier, shape):
+    result = supertrend_kernel([], [], [], lookback, multiplier)
+    assert set(result) == {"atr", "upper_band", "lower_band", "in_uptrend"}
+    for value in result.values():
+        assert value.shape == shape
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+from indicators.incremental import IncrementalVWAP
+from indicators.volume_weighted_average_price.vwap import vwap_kernel
+
+BARS = 1000
+HOUR_MS = 3600 * 1000
+
+
+@pytest.fixture(scope="module")
+def bars():
+    """ Hourly bars starting on a Wednesday afternoon, so sessions start mid-series """
+    rng = np.random.default_rng(11)
+    timestamps = pd.Timestamp("2024-01-03 13:00").value // 10 ** 6 + np.arange(BARS) * HOUR_MS
+    closing_prices = 100 + np.cumsum(rng.normal(0, 1, (2, BARS)), axis=-1)
+    volumes = rng.random((2, BARS)) * 10
+    # A session opening without volume has no VWAP until volume comes in
+    volumes[:, 35:37] = 0
+    return timestamps, closing_prices, volumes
+
+
+def session_starts(timestamps, session):
+    times = pd.Series(pd.to_datetime(timestamps, unit="ms"))
+    if session == "1w":
+        return times.dt.to_period("W-SUN").dt.start_time
+    if session == "1M":
+        return times.dt.to_period("M").dt.start_time
+    return times.dt.floor(session.replace("d", "D"))
+
+
+def vwap_pandas(timestamps, closing_prices, volumes, mode, session=None, window=None, anchor=None):
+    """ Reference: VWAP of each mode from pandas group, rolling and masked sums """
+    frame = pd.DataFrame({"value": closing_prices * volumes, "volume": volumes})
+    if mode == "session":
+        sums = frame.groupby(session_starts(timestamps, session).to_numpy()).cumsum()
+    elif mode == "rolling":
+        sums = frame.rolling(window).sum()
+    elif mode == "anchored":
+        # Bars before the anchor stay NaN, cumsum skips them
+        sums = frame.where(pd.Series(timestamps >= anchor), np.nan).cumsum()
+    else:
+        sums = frame.cumsum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (sums["value"] / sums["volume"]).to_numpy()
+
+
+MODES = [
+    ("session", {"session": "1d"}),
+    ("session", {"session": "4h"}),
+    ("session", {"session": "1w"}),
+    ("session", {"session": "1M"}),
+    ("rolling", {"window": 1}),
+    ("rolling", {"window": 24}),
+    ("anchored", {"anchor_bar": 0}),
+    ("anchored", {"anchor_bar": 100}),
+    ("anchored", {"anchor_bar": BARS + 10}),
+    ("cumulative", {}),
+]
+
+
+def parameters(timestamps, parameters):
+    parameters = dict(parameters)
+    if "anchor_bar" in parameters:
+        # Halfway into a bar, so the anchor has to be searched for
+        parameters["anchor"] = int(timestamps[0] + parameters.pop("anchor_bar") * HOUR_MS - HOUR_MS // 2)
+    return parameters
+
+
+@pytest.mark.parametrize("mode, mode_parameters", MODES)
+def test_kernel_matches_pandas(bars, mode, mode_parameters):
+    timestamps, closing_prices, volumes = bars
+    mode_parameters = parameters(timestamps, mode_parameters)
+    vwap = vwap_kernel(closing_prices, volumes, mode, timestamps=timestamps, **mode_parameters)
+    assert vwap.shape == closing_prices.shape
+    for i in range(len(closing_prices)):
+        expected = vwap_pandas(timestamps, closing_prices[i], volumes[i], mode, **mode_parameters)
+        np.testing.assert_allclose(vwap[i], expected, rtol=1e-9)
+        np.testing.assert_allclose(vwap_kernel(closing_prices[i], volumes[i], mode, timestamps=timestamps,
+                                               **mode_parameters), expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize("mode, mode_parameters", MODES)
+def test_incremental_matches_the_kernel(bars, mode, mode_parameters):
+    timestamps, closing_prices, volumes = bars
+    mode_parameters = parameters(timestamps, mode_parameters)
+    vwap = vwap_kernel(closing_prices[0], volumes[0], mode, timestamps=timestamps, **mode_parameters)
+    incremental = IncrementalVWAP(mode, **mode_parameters)
+    values = [incremental.update(close, volume, timestamp) for close, volume, timestamp in
+              zip(closing_prices[0].tolist(), volumes[0].tolist(), timestamps.tolist())]
+    np.testing.assert_allclose([np.nan if value is None else value for value in values], vwap, rtol=1e-9)
+
+
+def test_without_timestamps_the_series_is_one_session_and_the_anchor_a_bar_index(bars):
+    _, closing_prices, volumes = bars
+    np.testing.assert_array_equal(vwap_kernel(closing_prices, volumes, "session"),
+                                  vwap_kernel(closing_prices, volumes, "cumulative"))
+    anchored = vwap_kernel(closing_prices, volumes, "anchored", anchor=100)
+    assert np.isnan(anchored[:, :100]).all()
+    np.testing.assert_allclose(anchored[:, 100:], vwap_kernel(closing_prices[:, 100:], volumes[:, 100:],
+                                                              "cumulative"), rtol=1e-9)
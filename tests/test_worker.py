@@ -0,0 +1,77 @@
+import time
+import logging
+import numpy as np
+import pytest
+from multiprocessing import Pool
+from scripts import shared_data, worker
+from scripts.market_snapshot import MarketSnapshot
+from scripts.shared_data import SharedMarketData
+from scripts.worker import imap_indicators
+
+logger = logging.getLogger("test_worker")
+
+# Seconds the indicators of each symbol take
+DELAYS = {"SLOWUSDT": 0.6, "MIDUSDT": 0.2, "FASTUSDT": 0.0, "BADUSDT": 0.0}
+
+
+class SleepyGraph:
+    """ Stands in for IndicatorGraph: every symbol takes its DELAYS, BADUSDT fails """
+    def run(self, snapshot):
+        time.sleep(DELAYS[snapshot.symbol])
+        if snapshot.symbol == "BADUSDT":
+            raise ValueError("Corrupt market data")
+        return {"closing_sum": float(snapshot.closing_prices.sum())}
+
+    def run_batch(self, snapshots):
+        return [self.run(snapshot) for snapshot in snapshots]
+
+
+def init_test_worker():
+    worker._indicator_graph = SleepyGraph()
+    worker._logger = logger
+
+
+def make_snapshot(symbol, bars=24):
+    timestamps = np.arange(bars, dtype=np.int64) * 300000
+    closing_prices = 100 + np.arange(bars, dtype=np.float64)
+    ohlcv = np.vstack([closing_prices - 0.5, closing_prices + 1, closing_prices - 1, closing_prices, np.ones(bars)])
+    return MarketSnapshot(symbol, "5m", timestamps, ohlcv)
+
+
+@pytest.fixture
+def data():
+    with SharedMarketData() as data:
+        yield data
+    shared_data._release_attached(set())
+
+
+@pytest.fixture
+def pool():
+    with Pool(processes=2, initializer=init_test_worker) as pool:
+        yield pool
+
+
+def test_results_come_back_in_order_of_completion(data, pool, caplog):
+    descriptors = [data.publish(make_snapshot(sym)) for sym in ("SLOWUSDT", "MIDUSDT", "FASTUSDT", "BADUSDT")]
+    with caplog.at_level(logging.ERROR, logger="test_worker"):
+        results = list(imap_indicators(pool, descriptors, logger))
+    # One worker is busy with SLOWUSDT meanwhile, the other takes every task after MIDUSDT
+    assert [sym for sym, _ in results] == ["MIDUSDT", "FASTUSDT", "SLOWUSDT"]
+    closing_sum = float(make_snapshot("FASTUSDT").closing_prices.sum())
+    assert all(result == {"closing_sum": closing_sum} for _, result in results)
+    assert "Failed to calculate indicators for 'BADUSDT'. Skipping." in caplog.messages
+
+    # The failure did not take the pool down
+    assert list(imap_indicators(pool, [data.publish(make_snapshot("FASTUSDT"))], logger)) == \
+        [("FASTUSDT", {"closing_sum": closing_sum})]
+
+
+def test_failing_batch_skips_only_its_symbols(data, pool, caplog):
+    batches = [[data.publish(make_snapshot("SLOWUSDT"))],
+               [data.publish(make_snapshot(sym)) for sym in ("FASTUSDT", "BADUSDT")],
+               [data.publish(make_snapshot("MIDUSDT"))]]
+    with caplog.at_level(logging.ERROR, logger="test_worker"):
+        results = list(imap_indicators(pool, batches, logger, batched=True))
+    assert [sym for sym, _ in results] == ["MIDUSDT", "SLOWUSDT"]
+    assert "Failed to calculate indicators for 'FASTUSDT'. Skipping." in caplog.messages
+    assert "Failed to calculate indicators for 'BADUSDT'. Skipping." in caplog.messages